@@ -1,3 +1,9 @@
 from django.contrib import admin
+from core.models import OutboxEmail
 
 # Register your models here.
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('subject', 'recipients')
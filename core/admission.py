@@ -0,0 +1,271 @@
+import asyncio
+import logging
+import re
+import threading
+import time
+from collections import deque
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.http import HttpResponse
+from django.urls import Resolver404, resolve
+
+from core import metrics
+
+# Admission control.
+# Caps the requests in flight per URL group, so a rush on one page (a promotion going
+# live) can't tie up every worker and make all requests time out together. Groups are
+# set in ADMISSION_GROUPS:
+#
+#     ADMISSION_GROUPS = {
+#         "rsvp": {"urls": ["add-rsvp"], "anonymous": 2, "authenticated": 8, "queue": 16},
+#     }
+#
+# Anonymous and signed-in traffic have separate limits. The split is best effort: "signed
+# in" means the request carries a cookie shaped like a session key (32 lowercase letters
+# and digits), nothing is loaded before the request is let in. A made-up cookie gets the
+# signed-in limit, so those limits must also be safe for anonymous floods.
+#
+# A request over the limit waits in line, first come first served, for at most
+# ADMISSION_QUEUE_TIMEOUT seconds; when the line is full ("queue", twice the limit by
+# default) or the wait runs out, it gets a 503 with Retry-After instead. URLs outside the
+# groups aren't limited. Limits are per process, like the workers they protect.
+
+logger = logging.getLogger(__name__)
+
+ADMITTED, QUEUED, SHED = "admitted", "queued", "shed"
+
+# Seconds between two "shedding load" warnings of the same gate
+SHED_LOG_INTERVAL = 10
+
+# What Django's session keys look like (get_random_string(32, VALID_KEY_CHARS))
+SESSION_KEY = re.compile(r"[a-z0-9]{32}")
+
+
+class _Waiter:
+    def __init__(self, wake):
+        self.wake = wake
+        self.granted = False
+
+
+class Gate:
+    """A limit on requests in flight, with a bounded line of waiting requests."""
+
+    def __init__(self, limit, max_queue, labels=()):
+        self.limit = limit
+        # (group, visitor) for the metrics
+        self.labels = labels
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self.waiters = deque()
+        self.lock = threading.Lock()
+        self.counters = {ADMITTED: 0, QUEUED: 0, SHED: 0}
+        self.logged_at = None
+
+    def _enter(self, make_waiter, timeout):
+        """Take a free slot (ADMITTED), join the line (a _Waiter) or give up (SHED)."""
+        with self.lock:
+            if self.in_flight < self.limit and not self.waiters:
+                self.in_flight += 1
+                self.counters[ADMITTED] += 1
+                return ADMITTED
+            if len(self.waiters) >= self.max_queue or timeout <= 0:
+                self.counters[SHED] += 1
+                return SHED
+            waiter = make_waiter()
+            self.waiters.append(waiter)
+            self.counters[QUEUED] += 1
+            return waiter
+
+    def _give_up(self, waiter):
+        with self.lock:
+            # release() may have handed it a slot just as the wait ran out
+            if waiter.granted:
+                self.counters[ADMITTED] += 1
+                return QUEUED
+            self.waiters.remove(waiter)
+            self.counters[SHED] += 1
+            return SHED
+
+    def acquire(self, timeout):
+        """Wait up to `timeout` seconds for a slot. ADMITTED or QUEUED mean the caller must release()."""
+        waiter = self._enter(lambda: _Waiter(threading.Event()), timeout)
+        if not isinstance(waiter, _Waiter):
+            return waiter
+        waiter.wake.wait(timeout)
+        return self._give_up(waiter)
+
+    async def aacquire(self, timeout):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        waiter = self._enter(lambda: _Waiter(future), timeout)
+        if not isinstance(waiter, _Waiter):
+            return waiter
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            # The client went away while waiting, don't keep a slot it was handed
+            if self._give_up(waiter) != SHED:
+                self.release()
+            raise
+        return self._give_up(waiter)
+
+    def release(self):
+        with self.lock:
+            # The slot goes straight to the first waiter, so nobody can jump the line
+            while self.waiters:
+                waiter = self.waiters.popleft()
+                waiter.granted = True
+                if isinstance(waiter.wake, threading.Event):
+                    waiter.wake.set()
+                else:
+                    waiter.wake.get_loop().call_soon_threadsafe(_resolve, waiter.wake)
+                return
+            self.in_flight -= 1
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters, in_flight=self.in_flight, waiting=len(self.waiters), limit=self.limit)
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+# (group, "anonymous" | "authenticated") -> Gate, built from the settings on first use
+_gates = {}
+_gates_lock = threading.Lock()
+# URL name -> group
+_url_groups = None
+
+
+def reset():
+    """Forget the gates and their counters, e.g. after ADMISSION_GROUPS changed."""
+    global _url_groups
+    with _gates_lock:
+        _gates.clear()
+        _url_groups = None
+
+
+@receiver(setting_changed)
+def _settings_changed(setting, **kwargs):
+    if setting.startswith("ADMISSION_"):
+        reset()
+
+
+def group_for(url_name):
+    global _url_groups
+    if _url_groups is None:
+        _url_groups = {
+            name: group for group, config in getattr(settings, "ADMISSION_GROUPS", {}).items() for name in config["urls"]
+        }
+    return _url_groups.get(url_name)
+
+
+def get_gate(group, kind):
+    key = (group, kind)
+    gate = _gates.get(key)
+    if gate is None:
+        with _gates_lock:
+            gate = _gates.get(key)
+            if gate is None:
+                config = settings.ADMISSION_GROUPS[group]
+                limit = config[kind]
+                gate = _gates[key] = Gate(limit, config.get("queue", limit * 2), labels=key)
+    return gate
+
+
+def stats():
+    """{group: {kind: counters}} for the gates this process has used."""
+    result = {}
+    for (group, kind), gate in sorted(_gates.items()):
+        result.setdefault(group, {})[kind] = gate.stats()
+    return result
+
+
+def busy_response():
+    response = HttpResponse(
+        "The site is very busy right now, please try again in a few seconds.",
+        status=503,
+        content_type="text/plain; charset=utf-8",
+    )
+    response["Retry-After"] = str(getattr(settings, "ADMISSION_RETRY_AFTER", 5))
+    return response
+
+
+class AdmissionControlMiddleware:
+    """
+    Limits the requests in flight per URL group (ADMISSION_GROUPS) and answers 503 when
+    the line is too long. Goes first, so shed requests cost next to nothing.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        gate = self._gate_for(request)
+        if gate is None:
+            return self.get_response(request)
+        if self._admit(gate, gate.acquire(self._timeout())) == SHED:
+            return self._shed(request, gate)
+        try:
+            return self.get_response(request)
+        finally:
+            self._release(gate)
+
+    async def __acall__(self, request):
+        gate = self._gate_for(request)
+        if gate is None:
+            return await self.get_response(request)
+        if self._admit(gate, await gate.aacquire(self._timeout())) == SHED:
+            return self._shed(request, gate)
+        try:
+            return await self.get_response(request)
+        finally:
+            self._release(gate)
+
+    def _admit(self, gate, outcome):
+        metrics.ADMISSION.labels(*gate.labels, outcome).inc()
+        if outcome != SHED:
+            metrics.ADMISSION_IN_FLIGHT.labels(*gate.labels).inc()
+        return outcome
+
+    def _release(self, gate):
+        metrics.ADMISSION_IN_FLIGHT.labels(*gate.labels).dec()
+        gate.release()
+
+    def _timeout(self):
+        return getattr(settings, "ADMISSION_QUEUE_TIMEOUT", 1.0)
+
+    def _gate_for(self, request):
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return None
+        group = group_for(match.url_name)
+        if group is None:
+            return None
+        # So shed requests are counted under their view (core/metrics.py)
+        request.resolver_match = match
+        session_key = request.COOKIES.get(settings.SESSION_COOKIE_NAME, "")
+        kind = "authenticated" if SESSION_KEY.fullmatch(session_key) else "anonymous"
+        return get_gate(group, kind)
+
+    def _shed(self, request, gate):
+        now = time.monotonic()
+        if gate.logged_at is None or now - gate.logged_at >= SHED_LOG_INTERVAL:
+            gate.logged_at = now
+            logger.warning("Shedding load on %s: %s", request.path, gate.stats())
+        return busy_response()
@@ -0,0 +1,26 @@
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.shortcuts import render, resolve_url
+
+# Helpers for async views.
+# Django 4.2 has no async user_passes_test and no request.auser(), and templates (with
+# their context processors) are sync. The parts that touch the session, the user or
+# the template engine are handed to a thread with sync_to_async, the queries of the
+# view itself use the async ORM.
+
+arender = sync_to_async(render)
+
+
+def async_user_passes_test(test_func, login_url=None):
+    """user_passes_test for async views."""
+    def decorator(view_func):
+        @wraps(view_func)
+        async def inner(request, *args, **kwargs):
+            if await sync_to_async(test_func)(request.user):
+                return await view_func(request, *args, **kwargs)
+            return redirect_to_login(request.get_full_path(), resolve_url(login_url or settings.LOGIN_URL))
+        return inner
+    return decorator
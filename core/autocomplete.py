@@ -0,0 +1,133 @@
+from functools import reduce
+
+from django import forms
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group, Permission
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.http import JsonResponse
+from django.urls import reverse
+
+from core.pagination import KeysetPaginator
+from events.models import Event
+
+# Remote-search choice widgets.
+# A plain <select> for a foreign key lists every row of the related table, which for
+# users or permissions makes the form page megabytes big. RemoteSelect and
+# RemoteSelectMultiple render only the selected option(s) and let the browser search the
+# rest through /autocomplete/<source>/?q=..., a keyset-paginated JSON endpoint. The form
+# field stays a ModelChoiceField, which validates a submitted pk with a single get()
+# and never lists the choices.
+#
+# A source says which rows can be searched, on which columns, how they are labelled and
+# who may search them:
+#
+#     SOURCES["users"] = Source(User.objects.all(), ["username", "email"], ...)
+
+PER_PAGE = 20
+
+
+class Source:
+    def __init__(self, queryset, search_fields, label_fields, label, ordering, roles=("Admin",)):
+        self.queryset = queryset
+        self.search_fields = search_fields
+        # The columns label() reads from each values() row
+        self.label_fields = label_fields
+        self.label = label
+        self.ordering = ordering
+        self.roles = roles
+
+    def _rows(self, queryset):
+        # The ordering columns too, the paginator builds its cursors from them
+        columns = ["pk", *self.label_fields, *(name.lstrip("-") for name in self.ordering)]
+        return queryset.values(*dict.fromkeys(columns))
+
+    def search(self, term):
+        """Rows matching every word of `term` in one of the search fields."""
+        queryset = self.queryset.all()
+        for word in term.split():
+            matches = [Q(**{f"{field}__icontains": word}) for field in self.search_fields]
+            queryset = queryset.filter(reduce(lambda a, b: a | b, matches))
+        return self._rows(queryset)
+
+    def labels(self, pks):
+        """{pk as str: label} for the given pks, skipping ones that aren't valid pks."""
+        pk_field = self.queryset.model._meta.pk
+        valid = []
+        for pk in pks:
+            try:
+                valid.append(pk_field.to_python(pk))
+            except ValidationError:
+                continue
+        if not valid:
+            return {}
+        return {str(row["pk"]): self.label(row) for row in self._rows(self.queryset.filter(pk__in=valid))}
+
+
+SOURCES = {
+    "users": Source(
+        get_user_model().objects.all(),
+        ["username", "email", "first_name", "last_name"],
+        ["username", "email"],
+        lambda row: f"{row['username']} ({row['email']})" if row["email"] else row["username"],
+        ("username", "id"),
+    ),
+    "events": Source(
+        Event.objects.all(),
+        ["name", "location"],
+        ["name", "event_date"],
+        lambda row: f"{row['name']} ({row['event_date']:%b %d, %Y})",
+        ("-event_date", "id"),
+    ),
+    "groups": Source(Group.objects.all(), ["name"], ["name"], lambda row: row["name"], ("name", "id")),
+    "permissions": Source(
+        Permission.objects.all(),
+        ["name", "codename", "content_type__app_label"],
+        ["name", "content_type__app_label"],
+        lambda row: f"{row['content_type__app_label']} | {row['name']}",
+        ("name", "id"),
+    ),
+}
+
+
+def search_response(request, source):
+    """One page of `source`'s rows matching ?q=, as {"results": [{"id", "text"}], "next"}."""
+    paginator = KeysetPaginator(source.search(request.GET.get("q", "")), source.ordering, per_page=PER_PAGE)
+    page = paginator.get_page(after=request.GET.get("after"), querydict=request.GET)
+    return JsonResponse(
+        {
+            "results": [{"id": row["pk"], "text": source.label(row)} for row in page],
+            "next": f"{request.path}?{page.next_query}" if page.has_next else None,
+        },
+        json_dumps_params={"separators": (",", ":")},
+    )
+
+
+class RemoteSelect(forms.Select):
+    """A select that only holds the selected option and searches `source` for the others."""
+
+    template_name = "Widget/remote_select.html"
+
+    def __init__(self, source, attrs=None):
+        super().__init__(attrs)
+        self.source = source
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context["widget"]["attrs"]["data-remote-select"] = reverse("autocomplete", args=[self.source])
+        return context
+
+    def optgroups(self, name, value, attrs=None):
+        # Instead of iterating self.choices (every row), label just the selected pks
+        selected = [v for v in value if v not in ("", None)]
+        labels = SOURCES[self.source].labels(selected)
+        options = []
+        if not self.allow_multiple_selected:
+            options.append(self.create_option(name, "", "---------", not labels, 0))
+        for pk, label in labels.items():
+            options.append(self.create_option(name, pk, label, True, len(options)))
+        return [(None, options, 0)]
+
+
+class RemoteSelectMultiple(RemoteSelect, forms.SelectMultiple):
+    allow_multiple_selected = True
@@ -0,0 +1,307 @@
+import datetime
+import random
+import statistics
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group
+from django.contrib.auth.tokens import default_token_generator
+from django.db import connections
+from django.template.base import Template
+from django.test import Client
+from django.urls import URLResolver, get_resolver, reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+from django.utils.timezone import localdate
+
+from events import search
+from events.models import Category, Event, EventImage, RSVP
+
+# URL benchmark.
+# Seeds a data set, requests every named URL of the project as each role and records,
+# per view, the number of queries, the time spent in SQL, the time spent rendering
+# templates and the wall time of the whole request. Used by `manage.py benchmark_urls`,
+# which runs it against a throwaway test database.
+
+ROLES = ("anonymous", "User", "Organizer", "Admin")
+BENCH_PASSWORD = "benchmark-password"
+URLCONFS = ("event_management.urls", "events.urls", "users.urls")
+
+
+def bench_username(role):
+    return f"bench_{role.lower()}"
+
+
+def seed(users=100, events=200, rsvps=1000, images=2, seed_value=0):
+    """
+    Add the benchmark data set with bulk inserts. Signals are skipped, derived data is
+    rebuilt at the end. Calling it again adds more rows on top of the existing ones.
+    """
+    rng = random.Random(seed_value)
+    User = get_user_model()
+    groups = {name: Group.objects.get_or_create(name=name)[0] for name in ROLES[1:]}
+    password = make_password(BENCH_PASSWORD)
+    Membership = User.groups.through
+
+    if not is_seeded():
+        User.objects.bulk_create(
+            [
+                User(username=bench_username(role), email=f"{bench_username(role)}@example.com", password=password)
+                for role in ROLES[1:]
+            ]
+        )
+        Membership.objects.bulk_create(
+            [
+                Membership(customuser_id=User.objects.get(username=bench_username(role)).pk, group_id=groups[role].pk)
+                for role in ROLES[1:]
+            ]
+        )
+
+    offset = User.objects.filter(username__startswith="bench_user_").count()
+    User.objects.bulk_create(
+        [
+            User(username=f"bench_user_{i}", email=f"bench_user_{i}@example.com", password=password)
+            for i in range(offset, offset + users)
+        ],
+        batch_size=1000,
+    )
+    attendee_ids = list(
+        User.objects.filter(username__startswith="bench_user_").order_by("id").values_list("id", flat=True)[offset:]
+    )
+    Membership.objects.bulk_create(
+        [Membership(customuser_id=user_id, group_id=groups["User"].pk) for user_id in attendee_ids],
+        batch_size=1000,
+    )
+
+    categories = list(Category.objects.filter(name__startswith="Benchmark category"))
+    if not categories:
+        Category.objects.bulk_create(
+            [Category(name=f"Benchmark category {i}", description="Benchmark category") for i in range(5)]
+        )
+        categories = list(Category.objects.filter(name__startswith="Benchmark category"))
+
+    organizer = User.objects.get(username=bench_username("Organizer"))
+    first_new_event = Event.objects.order_by("-id").values_list("id", flat=True).first() or 0
+    today = localdate()
+    Event.objects.bulk_create(
+        [
+            Event(
+                name=f"Benchmark event {first_new_event + i}",
+                description="A benchmark event " * 10,
+                event_date=today + datetime.timedelta(days=rng.randint(-60, 60)),
+                event_time=datetime.time(rng.randint(8, 21), 0),
+                location=rng.choice(["Dhaka", "Chittagong", "Sylhet", "Khulna"]),
+                category=rng.choice(categories),
+                organizer=organizer,
+            )
+            for i in range(events)
+        ],
+        batch_size=1000,
+    )
+    event_ids = list(Event.objects.filter(pk__gt=first_new_event).values_list("id", flat=True))
+
+    EventImage.objects.bulk_create(
+        [
+            EventImage(event_id=event_id, image=f"occavue_images/benchmark_{n}.png")
+            for event_id in event_ids
+            for n in range(images)
+        ],
+        batch_size=1000,
+    )
+
+    # New RSVPs go to the new events, so they never collide with earlier ones
+    user_ids = attendee_ids + [User.objects.get(username=bench_username("User")).pk]
+    pairs = set()
+    rsvps = min(rsvps, len(user_ids) * len(event_ids))
+    while len(pairs) < rsvps:
+        pairs.add((rng.choice(event_ids), rng.choice(user_ids)))
+    RSVP.objects.bulk_create(
+        [RSVP(event_id=event_id, user_id=user_id) for event_id, user_id in pairs], batch_size=1000
+    )
+
+    Event.objects.all().refresh_rsvp_counts()
+    search.rebuild_index()
+
+
+def is_seeded():
+    return get_user_model().objects.filter(username=bench_username("Admin")).exists()
+
+
+def named_urls():
+    """(name, pattern) for every named URL declared in URLCONFS."""
+    def walk(patterns, urlconf):
+        for pattern in patterns:
+            if isinstance(pattern, URLResolver):
+                yield from walk(pattern.url_patterns, pattern.urlconf_name)
+            elif pattern.name and getattr(urlconf, "__name__", urlconf) in URLCONFS:
+                yield pattern.name, pattern
+
+    resolver = get_resolver()
+    return list(walk(resolver.url_patterns, resolver.urlconf_name))
+
+
+def _targets():
+    """Objects and query strings used to build the URLs that need arguments."""
+    User = get_user_model()
+    event = Event.objects.order_by("id").first()
+    rsvp = RSVP.objects.order_by("id").first()
+    member = User.objects.get(username=bench_username("User"))
+    kwargs = {
+        "update-event": {"id": event.pk},
+        "delete-event": {"pk": event.pk},
+        "export-event-rsvps": {"event_id": event.pk},
+        "update-user": {"id": member.pk},
+        "delete-user": {"id": member.pk},
+        "update-category": {"id": event.category_id},
+        "delete-category": {"id": event.category_id},
+        "update-rsvp": {"id": rsvp.pk},
+        "delete-rsvp": {"id": rsvp.pk},
+        # A group with members, so the GET doesn't delete it
+        "delete-group": {"group_id": Group.objects.get(name="Admin").pk},
+        "autocomplete": {"source": "users"},
+        "password_reset_confirm": {
+            "uidb64": urlsafe_base64_encode(force_bytes(member.pk)),
+            "token": default_token_generator.make_token(member),
+        },
+    }
+    query = {
+        "event-detail": f"id={event.pk}",
+        "autocomplete": "q=bench",
+    }
+    return kwargs, query
+
+
+def build_urls():
+    kwargs, query = _targets()
+    urls = []
+    for name, pattern in named_urls():
+        try:
+            path = reverse(name, kwargs=kwargs.get(name))
+        except Exception:
+            continue
+        if name in query:
+            path = f"{path}?{query[name]}"
+        urls.append((name, path))
+    return urls
+
+
+class _QueryRecorder:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.count += 1
+
+
+class _RenderRecorder:
+    def __init__(self):
+        self.seconds = 0.0
+        self.depth = 0
+
+
+@contextmanager
+def _record_renders():
+    recorder = _RenderRecorder()
+    original = Template.render
+
+    def render(self, context):
+        # Only time the outermost render, includes and extends run inside it
+        recorder.depth += 1
+        start = time.perf_counter()
+        try:
+            return original(self, context)
+        finally:
+            recorder.depth -= 1
+            if recorder.depth == 0:
+                recorder.seconds += time.perf_counter() - start
+
+    Template.render = render
+    try:
+        yield recorder
+    finally:
+        Template.render = original
+
+
+def measure(client, path):
+    queries = _QueryRecorder()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(queries))
+        renders = stack.enter_context(_record_renders())
+        start = time.perf_counter()
+        response = client.get(path)
+        if response.streaming:
+            size = sum(len(chunk) for chunk in response.streaming_content)
+        else:
+            size = len(response.content)
+        wall = time.perf_counter() - start
+    return {
+        "status": response.status_code,
+        "bytes": size,
+        "queries": queries.count,
+        "sql_ms": queries.seconds * 1000,
+        "render_ms": renders.seconds * 1000,
+        "wall_ms": wall * 1000,
+    }
+
+
+def client_for(role):
+    client = Client(raise_request_exception=False)
+    if role != "anonymous":
+        client.force_login(get_user_model().objects.get(username=bench_username(role)))
+    return client
+
+
+def run(repeat=5, warmup=1, roles=ROLES, only=None):
+    """Benchmark every URL as every role. Times are medians over `repeat` runs."""
+    urls = build_urls()
+    if only:
+        urls = [(name, path) for name, path in urls if name in only]
+    results = []
+    for role in roles:
+        client = client_for(role)
+        for name, path in urls:
+            for _ in range(warmup):
+                measure(client, path)
+            runs = [measure(client, path) for _ in range(repeat)]
+            results.append(
+                {
+                    "url_name": name,
+                    "path": path,
+                    "role": role,
+                    "status": runs[-1]["status"],
+                    "queries": max(run["queries"] for run in runs),
+                    "sql_ms": round(statistics.median(run["sql_ms"] for run in runs), 3),
+                    "render_ms": round(statistics.median(run["render_ms"] for run in runs), 3),
+                    "wall_ms": round(statistics.median(run["wall_ms"] for run in runs), 3),
+                }
+            )
+    return results
+
+
+def compare(baseline, results):
+    """Pair up rows of two reports by (url_name, role) and return the differences."""
+    previous = {(row["url_name"], row["role"]): row for row in baseline}
+    rows = []
+    for row in results:
+        before = previous.get((row["url_name"], row["role"]))
+        if before is None:
+            continue
+        rows.append(
+            {
+                "url_name": row["url_name"],
+                "role": row["role"],
+                "queries": row["queries"] - before["queries"],
+                "sql_ms": round(row["sql_ms"] - before["sql_ms"], 3),
+                "wall_ms": round(row["wall_ms"] - before["wall_ms"], 3),
+            }
+        )
+    return rows
@@ -1,6 +1,8 @@
+from users.roles import get_roles
+
 def user_groups(request):
     if not request.user.is_authenticated:
         return {"user_groups": []}
 
-    groups = list(request.user.groups.values_list("name", flat=True))
+    groups = sorted(get_roles(request.user))
     return {"user_groups": groups}
\ No newline at end of file
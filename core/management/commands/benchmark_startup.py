@@ -0,0 +1,134 @@
+import json
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter, so nothing is imported or cached yet. Prints the phase
+# timings as JSON on stdout; `-X importtime` writes the per-module import times to stderr.
+STARTUP_SCRIPT = """
+import json, sys, time
+from wsgiref.util import setup_testing_defaults
+
+start = time.perf_counter()
+phases = {}
+
+import django
+from django.conf import settings
+settings.INSTALLED_APPS
+phases["settings"] = time.perf_counter() - start
+
+django.setup(set_prefix=False)
+phases["setup"] = time.perf_counter() - start
+
+from django.core.handlers.wsgi import WSGIHandler
+application = WSGIHandler()
+phases["application"] = time.perf_counter() - start
+
+if settings.PREWARM:
+    from core.startup import prewarm
+    prewarm()
+phases["prewarm"] = time.perf_counter() - start
+
+environ = {"PATH_INFO": sys.argv[1], "REQUEST_METHOD": "GET"}
+setup_testing_defaults(environ)
+status = []
+b"".join(application(environ, lambda s, headers, exc_info=None: status.append(s)))
+phases["first_request"] = time.perf_counter() - start
+phases["status"] = status[0]
+print(json.dumps(phases))
+"""
+
+PHASES = ("settings", "setup", "application", "prewarm", "first_request")
+
+IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+class Command(BaseCommand):
+    help = (
+        "Start the app in fresh interpreters under each startup profile and report the "
+        "time to settings, app registry, WSGI handler, pre-warm and first response, and the "
+        "import time per package"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--profile", action="append", help="STARTUP_PROFILE values to compare (default: development and production)"
+        )
+        parser.add_argument("--repeat", type=int, default=3, help="Runs per profile, the median run is reported")
+        parser.add_argument("--path", default="/no-permission/", help="URL of the first request")
+        parser.add_argument("--top", type=int, default=15, help="Packages (and modules) to list")
+        parser.add_argument("--modules", action="store_true", help="Also list the slowest single modules")
+
+    def handle(self, *args, **options):
+        profiles = options["profile"] or ["development", "production"]
+        runs = {profile: self._median_run(profile, options) for profile in profiles}
+
+        self.stdout.write(f"{'phase (ms, cumulative)':<24}" + "".join(f"{profile:>14}" for profile in profiles))
+        for phase in PHASES:
+            self.stdout.write(
+                f"{phase:<24}" + "".join(f"{runs[profile]['phases'][phase] * 1000:>14.1f}" for profile in profiles)
+            )
+        self.stdout.write(f"{'first response':<24}" + "".join(f"{runs[p]['phases']['status']:>14}" for p in profiles))
+        self.stdout.write(
+            f"{'modules imported':<24}" + "".join(f"{len(runs[profile]['imports']):>14}" for profile in profiles)
+        )
+
+        self.stdout.write("")
+        packages = {profile: self._by_package(runs[profile]["imports"]) for profile in profiles}
+        names = sorted(set().union(*packages.values()), key=lambda name: -max(p.get(name, 0) for p in packages.values()))
+        self.stdout.write(f"{'package (self ms)':<24}" + "".join(f"{profile:>14}" for profile in profiles))
+        for name in names[: options["top"]]:
+            self.stdout.write(
+                f"{name:<24}"
+                + "".join(
+                    f"{packages[profile][name] / 1000:>14.1f}" if name in packages[profile] else f"{'-':>14}"
+                    for profile in profiles
+                )
+            )
+
+        if options["modules"]:
+            for profile in profiles:
+                self.stdout.write(f"\nSlowest modules, {profile} (cumulative ms, self ms):")
+                imports = sorted(runs[profile]["imports"], key=lambda row: -row[2])
+                for name, self_us, cumulative_us, _ in imports[: options["top"]]:
+                    self.stdout.write(f"  {name:<60} {cumulative_us / 1000:>8.1f} {self_us / 1000:>8.1f}")
+
+    def _median_run(self, profile, options):
+        results = [self._run(profile, options["path"]) for _ in range(max(1, options["repeat"]))]
+        results.sort(key=lambda run: run["phases"]["first_request"])
+        return results[len(results) // 2]
+
+    def _run(self, profile, path):
+        env = dict(os.environ, STARTUP_PROFILE=profile)
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", STARTUP_SCRIPT, path],
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        lines = completed.stdout.strip().splitlines()
+        if completed.returncode or not lines:
+            errors = [line for line in completed.stderr.splitlines() if not IMPORT_LINE.match(line)]
+            raise CommandError(f"Startup with STARTUP_PROFILE={profile} failed:\n" + "\n".join(errors[-20:]))
+        return {"phases": json.loads(lines[-1]), "imports": self._parse_imports(completed.stderr)}
+
+    def _parse_imports(self, stderr):
+        """(module, self us, cumulative us, nesting depth) for every import `-X importtime` logged."""
+        imports = []
+        for line in stderr.splitlines():
+            match = IMPORT_LINE.match(line)
+            if match:
+                self_us, cumulative_us, indent, name = match.groups()
+                imports.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+        return imports
+
+    def _by_package(self, imports):
+        """Self import time (us) summed per top-level package."""
+        totals = defaultdict(int)
+        for name, self_us, _, _ in imports:
+            totals[name.split(".")[0]] += self_us
+        return totals
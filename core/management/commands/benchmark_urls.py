@@ -0,0 +1,107 @@
+import json
+import platform
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from core import benchmark, replicas
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a test database and record query count, SQL time, render time and wall time "
+        "for every named URL as anonymous, User, Organizer and Admin"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument("--events", type=int, default=200)
+        parser.add_argument("--rsvps", type=int, default=1000)
+        parser.add_argument("--images", type=int, default=2, help="Images per event")
+        parser.add_argument("--seed", type=int, default=0, help="Random seed for the data set")
+        parser.add_argument("--repeat", type=int, default=5, help="Measured requests per URL and role")
+        parser.add_argument("--warmup", type=int, default=1, help="Unmeasured requests per URL and role")
+        parser.add_argument("--role", action="append", choices=benchmark.ROLES, help="Only these roles")
+        parser.add_argument("--url", action="append", help="Only these URL names")
+        parser.add_argument("--output", help="Write the JSON report to this file ('-' for stdout)")
+        parser.add_argument("--compare", help="Earlier JSON report to diff against")
+        parser.add_argument("--keepdb", action="store_true", help="Keep (and reuse) the test database")
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options["compare"]:
+            try:
+                with open(options["compare"]) as f:
+                    baseline = json.load(f)["results"]
+            except (OSError, ValueError, KeyError) as e:
+                raise CommandError(f"Could not read {options['compare']}: {e}")
+
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options["keepdb"])
+        replicas.mirror_test_databases()
+        try:
+            report = self._run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options["keepdb"])
+
+        if options["output"] == "-":
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self._print_table(report["results"])
+            if options["output"]:
+                with open(options["output"], "w") as f:
+                    json.dump(report, f, indent=2)
+                self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+        if baseline is not None:
+            self._print_comparison(benchmark.compare(baseline, report["results"]))
+
+    def _run(self, options):
+        dataset = {key: options[key] for key in ("users", "events", "rsvps", "images", "seed")}
+        if not (options["keepdb"] and benchmark.is_seeded()):
+            benchmark.seed(
+                users=options["users"],
+                events=options["events"],
+                rsvps=options["rsvps"],
+                images=options["images"],
+                seed_value=options["seed"],
+            )
+
+        # The debug toolbar adds its own queries and rendering to every response
+        middleware = [name for name in settings.MIDDLEWARE if not name.startswith("debug_toolbar")]
+        with override_settings(MIDDLEWARE=middleware, ALLOWED_HOSTS=["*"]):
+            results = benchmark.run(
+                repeat=options["repeat"],
+                warmup=options["warmup"],
+                roles=options["role"] or benchmark.ROLES,
+                only=options["url"],
+            )
+        return {
+            "created_at": timezone.now().isoformat(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+            "dataset": dataset,
+            "repeat": options["repeat"],
+            "results": results,
+        }
+
+    def _print_table(self, results):
+        self.stdout.write(f"{'url':<28} {'role':<10} {'status':>6} {'queries':>7} {'sql ms':>9} {'render ms':>9} {'wall ms':>9}")
+        for row in results:
+            self.stdout.write(
+                f"{row['url_name']:<28} {row['role']:<10} {row['status']:>6} {row['queries']:>7} "
+                f"{row['sql_ms']:>9.2f} {row['render_ms']:>9.2f} {row['wall_ms']:>9.2f}"
+            )
+
+    def _print_comparison(self, rows):
+        self.stdout.write("")
+        self.stdout.write(f"{'url':<28} {'role':<10} {'Δ queries':>9} {'Δ sql ms':>9} {'Δ wall ms':>9}")
+        for row in rows:
+            line = f"{row['url_name']:<28} {row['role']:<10} {row['queries']:>+9} {row['sql_ms']:>+9.2f} {row['wall_ms']:>+9.2f}"
+            if row["queries"] > 0:
+                line = self.style.WARNING(line)
+            self.stdout.write(line)
@@ -0,0 +1,92 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from django.urls import resolve
+
+from core import benchmark, replicas
+from core.querybudget import count_queries, get_query_budget
+from events import stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Request every URL that declares a query budget, as every role, on a small and on a "
+        "larger data set. Fails when a view errors, goes over its budget or its query count grows with the data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=20)
+        parser.add_argument("--events", type=int, default=30)
+        parser.add_argument("--rsvps", type=int, default=100)
+        parser.add_argument("--images", type=int, default=2)
+        parser.add_argument("--scale", type=int, default=4, help="How many times more rows the second pass adds")
+        parser.add_argument("--role", action="append", choices=benchmark.ROLES)
+        parser.add_argument("--url", action="append", help="Only these URL names")
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        replicas.mirror_test_databases()
+        try:
+            failures = self._check(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+        if failures:
+            raise CommandError(f"{failures} query budget check(s) failed.")
+        self.stdout.write(self.style.SUCCESS("All views are within their query budgets."))
+
+    def _measure(self, targets, roles):
+        # Every request starts cold: a fresh session (roles not cached yet) and no cached stats
+        counts = {}
+        for role in roles:
+            for name, path, _ in targets:
+                stats.invalidate()
+                response, log = count_queries(benchmark.client_for(role), path)
+                counts[(name, role)] = (response.status_code, log)
+        return counts
+
+    def _check(self, options):
+        size = {key: options[key] for key in ("users", "events", "rsvps", "images")}
+        benchmark.seed(**size)
+
+        targets = []
+        for name, path in benchmark.build_urls():
+            if options["url"] and name not in options["url"]:
+                continue
+            budget = get_query_budget(resolve(path.split("?", 1)[0]))
+            if budget is not None:
+                targets.append((name, path, budget))
+        roles = options["role"] or benchmark.ROLES
+
+        middleware = [
+            name for name in settings.MIDDLEWARE
+            if not name.startswith("debug_toolbar") and name != "core.querybudget.QueryBudgetMiddleware"
+        ]
+        with override_settings(MIDDLEWARE=middleware, ALLOWED_HOSTS=["*"]):
+            small = self._measure(targets, roles)
+            benchmark.seed(**{key: value * options["scale"] for key, value in size.items() if key != "images"},
+                           images=options["images"], seed_value=1)
+            large = self._measure(targets, roles)
+
+        failures = 0
+        self.stdout.write(f"{'url':<28} {'role':<10} {'budget':>6} {'small':>6} {'large':>6}")
+        for name, path, budget in targets:
+            for role in roles:
+                (status, before), (large_status, after) = small[(name, role)], large[(name, role)]
+                line = f"{name:<28} {role:<10} {budget:>6} {before.count:>6} {after.count:>6}"
+                # A view that crashed stopped early, its count says nothing
+                if max(status, large_status) >= 500:
+                    failures += 1
+                    self.stdout.write(self.style.ERROR(f"{line}  answered {max(status, large_status)}"))
+                elif max(before.count, after.count) > budget:
+                    failures += 1
+                    self.stdout.write(self.style.ERROR(f"{line}  over budget"))
+                    self.stdout.write(after.format() if after.count > budget else before.format())
+                elif after.count > before.count:
+                    failures += 1
+                    self.stdout.write(self.style.ERROR(f"{line}  grows with the data"))
+                    self.stdout.write(after.format())
+                else:
+                    self.stdout.write(line)
+        return failures
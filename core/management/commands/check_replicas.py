@@ -0,0 +1,186 @@
+import os
+import re
+import shutil
+from collections import Counter
+from contextlib import ExitStack
+from datetime import date
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.test.utils import override_settings
+
+from core import benchmark, replicas
+from events.models import Category, Event
+
+
+class Command(BaseCommand):
+    help = (
+        "Check the read replica routing on test databases: replica reads for @read_replica "
+        "views, the primary for everything else, after a user's own writes, and when the "
+        "replicas lag or are down. Needs DB_REPLICA_URLS (two local databases will do)."
+    )
+
+    def handle(self, *args, **options):
+        aliases = replicas.replica_aliases()
+        if not aliases:
+            raise CommandError("No replicas configured, set DB_REPLICA_URLS.")
+        self.aliases = aliases
+
+        # Separate test databases instead of mirrors, so it shows where every read went.
+        # Routers are off while they are built, replicas don't get migrations otherwise.
+        old_names = {}
+        with override_settings(DATABASE_ROUTERS=[]):
+            for alias in ["default"] + aliases:
+                connection = connections[alias]
+                old_names[alias] = connection.settings_dict["NAME"]
+                connection.settings_dict["TEST"]["MIRROR"] = None
+                if connection.vendor == "sqlite":
+                    connection.settings_dict["TEST"]["NAME"] = f"test_check_replicas_{alias}.sqlite3"
+                connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]):
+                failures = self._run()
+        finally:
+            connections.close_all()
+            for alias, name in old_names.items():
+                connections[alias].creation.destroy_test_db(name, verbosity=0)
+            replicas.reset_health()
+        if failures:
+            raise CommandError("\n".join(failures))
+        self.stdout.write(self.style.SUCCESS("Reads were routed as expected."))
+
+    def _replicate(self):
+        """Bring every replica up to date with the primary, by copying the whole database."""
+        connections.close_all()
+        primary = connections["default"]
+        for alias in self.aliases:
+            replica = connections[alias]
+            if primary.vendor == replica.vendor == "sqlite":
+                shutil.copyfile(primary.settings_dict["NAME"], replica.settings_dict["NAME"])
+            elif primary.vendor == replica.vendor == "postgresql":
+                # Both test databases have to live on the same server
+                quote = primary.ops.quote_name
+                with primary._nodb_cursor() as cursor:
+                    cursor.execute(f"DROP DATABASE IF EXISTS {quote(replica.settings_dict['NAME'])}")
+                    cursor.execute(
+                        f"CREATE DATABASE {quote(replica.settings_dict['NAME'])} "
+                        f"TEMPLATE {quote(primary.settings_dict['NAME'])}"
+                    )
+            else:
+                raise CommandError("Replication is only emulated for SQLite and PostgreSQL databases.")
+
+    def _get(self, client, path):
+        """
+        GET `path`, returning the response and the number of reads per database. Reads of
+        sessions and users are counted apart, under (alias, "auth").
+        """
+        queries = Counter()
+        auth_tables = {
+            model._meta.db_table for model in apps.get_models() if replicas._primary_only(model)
+        }
+
+        def counter(alias):
+            def wrapper(execute, sql, params, many, context):
+                if sql.lstrip().upper().startswith("SELECT"):
+                    table = re.search(r'FROM "?(\w+)', sql)
+                    if table and table.group(1) in auth_tables:
+                        queries[(alias, "auth")] += 1
+                    else:
+                        queries[alias] += 1
+                return execute(sql, params, many, context)
+            return wrapper
+
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(counter(alias)))
+            response = client.get(path)
+        return response, queries
+
+    def _expect(self, label, queries, replica):
+        on_replicas = sum(queries[alias] for alias in self.aliases)
+        self.stdout.write(
+            f"{label:<50} reads on the primary {queries['default']:>3}, on replicas {on_replicas:>3}, "
+            f"sessions and users on the primary {queries[('default', 'auth')]:>3}"
+        )
+        if any(queries[(alias, "auth")] for alias in self.aliases):
+            return [f"{label}: sessions or users were read from a replica"]
+        if replica and (not on_replicas or queries["default"]):
+            return [f"{label}: expected only replica reads"]
+        if not replica and on_replicas:
+            return [f"{label}: expected only primary reads"]
+        return []
+
+    def _run(self):
+        replicas.reset_health()
+        benchmark.seed(users=20, events=30, rsvps=40, images=0)
+        user = get_user_model().objects.get(username=benchmark.bench_username("User"))
+        client = Client()
+        client.force_login(user)
+        self._replicate()
+        failures = []
+
+        # Not replicated yet: the replicas lag behind by this event
+        event = Event.objects.create(
+            name="Only on the primary",
+            description="-",
+            event_date=date(2000, 1, 1),
+            event_time="10:00",
+            location="-",
+            category=Category.objects.first(),
+        )
+
+        response, queries = self._get(Client(), "/")
+        failures += self._expect("home (anonymous)", queries, replica=True)
+        if event.name.encode() in response.content:
+            failures.append("home: the event that isn't replicated yet was listed")
+
+        response, queries = self._get(client, "/users/user/dashboard/")
+        failures += self._expect("user dashboard", queries, replica=True)
+
+        _, queries = self._get(client, "/events/api/events/")
+        failures += self._expect("JSON API (not marked for replicas)", queries, replica=False)
+
+        response = client.post("/events/add_rsvp/", {"event": event.pk}, HTTP_REFERER="/users/user/dashboard/")
+        if replicas.PIN_COOKIE not in response.cookies:
+            failures.append("The RSVP POST didn't pin the user to the primary")
+        response, queries = self._get(client, "/users/user/dashboard/")
+        failures += self._expect("user dashboard right after an RSVP", queries, replica=False)
+        if event.name.encode() not in response.content:
+            failures.append("user dashboard: the fresh RSVP wasn't shown right after the POST")
+
+        # The stickiness window ran out
+        del client.cookies[replicas.PIN_COOKIE]
+        _, queries = self._get(client, "/users/user/dashboard/")
+        failures += self._expect("user dashboard after the sticky window", queries, replica=True)
+
+        with override_settings(REPLICA_MAX_LAG=-1):
+            replicas.reset_health()
+            _, queries = self._get(Client(), "/")
+            failures += self._expect("home with every replica lagging", queries, replica=False)
+
+        replicas.reset_health()
+        names = {}
+        for alias in self.aliases:
+            connection = connections[alias]
+            names[alias] = connection.settings_dict["NAME"]
+            connection.close()
+            connection.settings_dict["NAME"] = (
+                os.path.join(settings.BASE_DIR, "missing", "replica.sqlite3")
+                if connection.vendor == "sqlite"
+                else "check_replicas_missing_database"
+            )
+        try:
+            response, queries = self._get(Client(), "/")
+            failures += self._expect("home with every replica down", queries, replica=False)
+            if response.status_code != 200:
+                failures.append(f"home with every replica down answered {response.status_code}")
+        finally:
+            for alias, name in names.items():
+                connections[alias].close()
+                connections[alias].settings_dict["NAME"] = name
+            replicas.reset_health()
+        return failures
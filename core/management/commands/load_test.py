@@ -0,0 +1,158 @@
+import asyncio
+import importlib
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+from django.urls import clear_url_caches
+
+from core import benchmark, replicas
+from events.models import Event
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test the home, browse and event detail pages through the WSGI handler with a "
+        "pool of worker threads and through the ASGI handler with the async views, and "
+        "compare throughput and latency"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument("--events", type=int, default=200)
+        parser.add_argument("--rsvps", type=int, default=1000)
+        parser.add_argument("--requests", type=int, default=300, help="Requests per mode")
+        parser.add_argument("--workers", type=int, default=8, help="WSGI worker threads")
+        parser.add_argument("--concurrency", type=int, default=32, help="Requests in flight under ASGI")
+        parser.add_argument(
+            "--latency", type=float, default=2.0, help="Milliseconds added to every query, to stand in for a network hop"
+        )
+        parser.add_argument("--mode", choices=("wsgi", "asgi"), action="append", help="Only these modes")
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict["NAME"]
+        # A file database, so every worker thread gets its own connection to the same data
+        connection.settings_dict["TEST"]["NAME"] = connection.settings_dict["TEST"].get("NAME") or (
+            "test_load_test.sqlite3" if connection.vendor == "sqlite" else None
+        )
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        replicas.mirror_test_databases()
+        try:
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]):
+                results = self._run(options)
+        finally:
+            connections.close_all()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            self._use_async_views(settings.ASYNC_VIEWS)
+
+        self.stdout.write(f"{'mode':<6} {'requests':>9} {'errors':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+        for mode, result in results.items():
+            self.stdout.write(
+                f"{mode:<6} {result['requests']:>9} {result['errors']:>7} {result['rps']:>8.1f} "
+                f"{result['p50']:>8.1f} {result['p95']:>8.1f} {result['max']:>8.1f}"
+            )
+        if any(result["errors"] for result in results.values()):
+            raise CommandError("Some requests failed, see the errors column.")
+
+    # This measures the views, admission control would turn the burst into 503s
+    @override_settings(ADMISSION_GROUPS={})
+    def _run(self, options):
+        benchmark.seed(users=options["users"], events=options["events"], rsvps=options["rsvps"], images=2)
+        organizer = get_user_model().objects.get(username=benchmark.bench_username("Organizer"))
+        client = Client()
+        client.force_login(organizer)
+        self.cookies = client.cookies
+
+        event_ids = list(Event.objects.order_by("id").values_list("id", flat=True)[:20])
+        pages = ["/", "/events/browse_event/"] + [f"/events/event_detail/?id={id}" for id in event_ids]
+        paths = [pages[i % len(pages)] for i in range(options["requests"])]
+
+        delay = options["latency"] / 1000
+
+        def slow_query(execute, sql, params, many, context):
+            time.sleep(delay)
+            return execute(sql, params, many, context)
+
+        def add_latency(sender, connection, **kwargs):
+            if slow_query not in connection.execute_wrappers:
+                connection.execute_wrappers.append(slow_query)
+
+        results = {}
+        connections.close_all()
+        connection_created.connect(add_latency)
+        try:
+            for mode in options["mode"] or ("wsgi", "asgi"):
+                self._use_async_views(mode == "asgi")
+                run = self._wsgi if mode == "wsgi" else self._asgi
+                # One unmeasured pass over the pages, to warm up templates and connections
+                run(pages, options)
+                latencies, errors, seconds = run(paths, options)
+                results[mode] = self._summary(latencies, errors, seconds)
+                connections.close_all()
+        finally:
+            connection_created.disconnect(add_latency)
+        return results
+
+    def _use_async_views(self, enabled):
+        """Re-import the URL modules, which pick the sync or async views from ASYNC_VIEWS."""
+        with override_settings(ASYNC_VIEWS=enabled):
+            for urlconf in reversed(benchmark.URLCONFS):
+                importlib.reload(importlib.import_module(urlconf))
+        clear_url_caches()
+
+    def _wsgi(self, paths, options):
+        """Every request on a worker thread of the pool, like a threaded WSGI server."""
+        submitted = time.perf_counter()
+
+        def request(path):
+            client = Client()
+            client.cookies = self.cookies
+            try:
+                status = client.get(path).status_code
+            finally:
+                connection.close()
+            return status, time.perf_counter() - submitted
+
+        with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+            responses = list(pool.map(request, paths))
+        seconds = time.perf_counter() - submitted
+        return [latency for _, latency in responses], sum(status != 200 for status, _ in responses), seconds
+
+    def _asgi(self, paths, options):
+        """All requests on one event loop, at most `concurrency` in flight, like an ASGI server."""
+
+        async def main():
+            limit = asyncio.Semaphore(options["concurrency"])
+            submitted = time.perf_counter()
+
+            async def request(path):
+                async with limit:
+                    client = AsyncClient()
+                    client.cookies = self.cookies
+                    status = (await client.get(path)).status_code
+                return status, time.perf_counter() - submitted
+
+            responses = await asyncio.gather(*(request(path) for path in paths))
+            return responses, time.perf_counter() - submitted
+
+        responses, seconds = asyncio.run(main())
+        return [latency for _, latency in responses], sum(status != 200 for status, _ in responses), seconds
+
+    def _summary(self, latencies, errors, seconds):
+        ms = sorted(latency * 1000 for latency in latencies)
+        cuts = statistics.quantiles(ms, n=20) if len(ms) > 1 else ms * 19
+        return {
+            "requests": len(ms),
+            "errors": errors,
+            "rps": len(ms) / seconds,
+            "p50": statistics.median(ms),
+            "p95": cuts[18],
+            "max": ms[-1],
+        }
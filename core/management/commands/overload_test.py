@@ -0,0 +1,202 @@
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+from django.middleware.csrf import get_token
+from django.test import Client, RequestFactory
+from django.test.utils import override_settings
+
+from core import admission, benchmark, replicas
+from events.models import Event
+
+
+class Command(BaseCommand):
+    help = (
+        "Send more traffic than the database can take, at a fixed rate from many threads, "
+        "once without and once with admission control, and compare the latency of the "
+        "requests that were served and how many were shed"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument("--events", type=int, default=200)
+        parser.add_argument("--rsvps", type=int, default=1000)
+        parser.add_argument("--rate", type=float, default=150, help="Requests started per second")
+        parser.add_argument("--seconds", type=float, default=4, help="How long requests keep arriving")
+        parser.add_argument("--threads", type=int, default=256, help="Server threads, at most this many requests at once")
+        parser.add_argument("--latency", type=float, default=4.0, help="Milliseconds every query takes")
+        parser.add_argument(
+            "--db-slots", type=int, default=4, help="Queries the database runs at once, the rest wait for a slot"
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            help="Requests in flight per group and kind of visitor, instead of the ADMISSION_GROUPS limits",
+        )
+        parser.add_argument(
+            "--mode", choices=("off", "on"), action="append", help="Only without (off) or with (on) admission control"
+        )
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict["NAME"]
+        # A file database, so every thread gets its own connection to the same data
+        connection.settings_dict["TEST"]["NAME"] = connection.settings_dict["TEST"].get("NAME") or (
+            "test_overload_test.sqlite3" if connection.vendor == "sqlite" else None
+        )
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        replicas.mirror_test_databases()
+        try:
+            # As under the test runner, the debug toolbar and the query log stay out of the timings
+            with override_settings(DEBUG=False, ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]):
+                results = self._run(options)
+        finally:
+            connections.close_all()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        self.stdout.write(
+            f"{'admission':<10} {'requests':>9} {'served':>7} {'shed':>6} {'errors':>7} {'served/s':>9} "
+            f"{'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'shed p95':>9}"
+        )
+        for mode, result in results.items():
+            self.stdout.write(
+                f"{mode:<10} {result['requests']:>9} {result['served']:>7} {result['shed']:>6} {result['errors']:>7} "
+                f"{result['rps']:>9.1f} {result['p50']:>8.1f} {result['p95']:>8.1f} {result['max']:>8.1f} "
+                f"{result['shed_p95']:>9.1f}"
+            )
+        if "on" in results:
+            self.stdout.write("\nAdmission counters (admitted, queued, shed):")
+            for group, kinds in results["on"]["counters"].items():
+                for kind, counters in kinds.items():
+                    self.stdout.write(
+                        f"  {group:<12} {kind:<14} {counters['admitted']:>6} {counters['queued']:>6} {counters['shed']:>6}"
+                    )
+        # Without admission control, errors (timeouts, locked databases) are what overload looks like
+        if results.get("on", {}).get("errors"):
+            raise CommandError("Some requests failed with admission control on, see the errors column.")
+
+    def _run(self, options):
+        benchmark.seed(users=options["users"], events=options["events"], rsvps=options["rsvps"], images=2)
+        user = get_user_model().objects.get(username=benchmark.bench_username("User"))
+        client = Client()
+        client.force_login(user)
+        # The test client loads the middleware per instance and records every render, too
+        # slow to stand in for many visitors, so requests go to one WSGI handler as in a server
+        factory = RequestFactory()
+        token_request = factory.get("/")
+        csrf_token = get_token(token_request)
+        signed_in_headers = {
+            "HTTP_COOKIE": f"{client.cookies.output(attrs=[], header='', sep=';').strip()}; "
+            f"{settings.CSRF_COOKIE_NAME}={token_request.META['CSRF_COOKIE']}",
+            "HTTP_X_CSRFTOKEN": csrf_token,
+        }
+        handler = WSGIHandler()
+
+        event_ids = list(Event.objects.order_by("id").values_list("id", flat=True)[:20])
+        # (method, path, signed in): browsing, dashboards and RSVP clicks
+        mix = [("get", "/", False), ("get", "/events/browse_event/", False), ("get", "/events/browse_event/", True)]
+        mix += [("get", f"/events/event_detail/?id={id}", True) for id in event_ids[:3]]
+        mix += [("get", "/users/user/dashboard/", True)]
+        mix += [("post", "/events/add_rsvp/", True)] * 2
+        total = int(options["rate"] * options["seconds"])
+        plan = [(i / options["rate"], *mix[i % len(mix)], event_ids[i % len(event_ids)]) for i in range(total)]
+
+        slots = threading.BoundedSemaphore(options["db_slots"])
+        delay = options["latency"] / 1000
+
+        def busy_database(execute, sql, params, many, context):
+            with slots:
+                time.sleep(delay)
+                return execute(sql, params, many, context)
+
+        def add_latency(sender, connection, **kwargs):
+            if busy_database not in connection.execute_wrappers:
+                connection.execute_wrappers.append(busy_database)
+
+        def request(method, path, signed_in, event_id):
+            headers = signed_in_headers if signed_in else {}
+            if method == "post":
+                environ = factory.post(path, {"event": event_id}, HTTP_REFERER="/", **headers).environ
+            else:
+                environ = factory.get(path, **headers).environ
+            status = []
+            response = handler(environ, lambda line, response_headers, exc_info=None: status.append(line))
+            try:
+                b"".join(response)
+            finally:
+                # Fires request_finished, which closes this thread's database connection
+                response.close()
+            return int(status[0].split()[0])
+
+        results = {}
+        connections.close_all()
+        connection_created.connect(add_latency)
+        try:
+            for mode in options["mode"] or ("off", "on"):
+                groups = self._groups(options["limit"]) if mode == "on" else {}
+                with override_settings(ADMISSION_GROUPS=groups):
+                    # One unmeasured pass over the mix, to warm up templates and connections
+                    for method, path, signed_in in mix:
+                        request(method, path, signed_in, event_ids[0])
+                    admission.reset()
+                    results[mode] = self._fire(plan, request, options["threads"])
+                    results[mode]["counters"] = admission.stats()
+                connections.close_all()
+        finally:
+            connection_created.disconnect(add_latency)
+        return results
+
+    def _groups(self, limit):
+        if limit is None:
+            return settings.ADMISSION_GROUPS
+        return {
+            group: dict(config, anonymous=limit, authenticated=limit, queue=limit * 2)
+            for group, config in settings.ADMISSION_GROUPS.items()
+        }
+
+    def _fire(self, plan, request, threads):
+        """Start every request of the plan at its time (an open loop), latency counts from then."""
+        start = time.perf_counter()
+
+        def timed(at, *args):
+            status = request(*args)
+            return status, time.perf_counter() - start - at
+
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            futures = []
+            for at, *args in plan:
+                wait = start + at - time.perf_counter()
+                if wait > 0:
+                    time.sleep(wait)
+                futures.append(pool.submit(timed, at, *args))
+            responses = [future.result() for future in futures]
+        seconds = time.perf_counter() - start
+
+        served, shed = [], []
+        for status, latency in responses:
+            if status == 503:
+                shed.append(latency * 1000)
+            elif status < 400:
+                served.append(latency * 1000)
+        return {
+            "requests": len(responses),
+            "served": len(served),
+            "shed": len(shed),
+            "errors": len(responses) - len(served) - len(shed),
+            "rps": len(served) / seconds,
+            **self._percentiles(served),
+            "shed_p95": self._percentiles(shed)["p95"],
+        }
+
+    def _percentiles(self, ms):
+        if not ms:
+            return {"p50": 0.0, "p95": 0.0, "max": 0.0}
+        ms = sorted(ms)
+        cuts = statistics.quantiles(ms, n=20) if len(ms) > 1 else ms * 19
+        return {"p50": statistics.median(ms), "p95": cuts[18], "max": ms[-1]}
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import outbox
+
+
+class Command(BaseCommand):
+    help = "Send queued outbox emails in batches over a single mail connection"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument("--max-attempts", type=int, default=outbox.MAX_ATTEMPTS,
+                            help="Failed sends after which an email is dead-lettered")
+        parser.add_argument("--loop", action="store_true", help="Keep polling instead of exiting when the outbox is empty")
+        parser.add_argument("--interval", type=float, default=5.0, help="Seconds to sleep between polls with --loop")
+
+    def handle(self, *args, **options):
+        while True:
+            total_sent = total_failed = total_dead = 0
+            while True:
+                sent, failed, dead = outbox.send_pending(options["batch_size"], options["max_attempts"])
+                total_sent += sent
+                total_failed += failed
+                total_dead += dead
+                # A short batch means nothing else is due right now
+                if sent + failed + dead < options["batch_size"]:
+                    break
+
+            if total_sent or total_failed or total_dead:
+                self.stdout.write(f"Sent {total_sent}, will retry {total_failed}, dead-lettered {total_dead}.")
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,180 @@
+import os
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.template.backends.django import DjangoTemplates, Template, reraise
+from django.template.exceptions import TemplateDoesNotExist
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.multiprocess import MultiProcessCollector
+
+# Prometheus metrics, served at /metrics (core.views.metrics).
+# MetricsMiddleware times every request and adds up, per view (URL name), the SQL queries
+# it ran and the time spent in them and in rendering templates (through the
+# MetricsDjangoTemplates backend). Those are added to the metrics once per request, so a
+# query costs two additions. The SQL timer is installed on every database connection as
+# it opens (time_queries, connected in CoreConfig.ready) and finds the request through a
+# context variable: connections belong to threads, and async views run their ORM calls
+# in sync_to_async threads, which copy the context but not the connection. Cache lookups (sessions, signed-in user, dashboard figures),
+# outbox email sends and admission control (core/admission.py) report here too.
+#
+# Several worker processes: set PROMETHEUS_MULTIPROC_DIR to an empty directory shared by
+# the processes of a host (web workers and send_outbox_emails) before they start, and
+# every process writes its metrics there; /metrics adds them up. With gunicorn, call
+# prometheus_client.multiprocess.mark_process_dead(worker.pid) from its child_exit hook.
+
+REQUEST_LATENCY = Histogram(
+    "occavue_http_request_duration_seconds",
+    "Time to build the response, per view",
+    ["view", "method", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+SQL_QUERIES = Counter("occavue_db_queries", "SQL queries run, per view", ["view"])
+SQL_SECONDS = Counter("occavue_db_query_seconds", "Time spent in SQL queries, per view", ["view"])
+TEMPLATE_SECONDS = Counter("occavue_template_render_seconds", "Time spent rendering templates, per view", ["view"])
+CACHE_LOOKUPS = Counter("occavue_cache_lookups", "Cache lookups, by what was looked up", ["cache", "result"])
+EMAIL_SEND = Histogram(
+    "occavue_email_send_duration_seconds",
+    "Time to hand one outbox email to the mail server",
+    ["result"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+ADMISSION = Counter(
+    "occavue_admission_requests", "Requests to limited URL groups, by outcome", ["group", "visitor", "outcome"]
+)
+ADMISSION_IN_FLIGHT = Gauge(
+    "occavue_admission_in_flight",
+    "Requests being served per limited URL group",
+    ["group", "visitor"],
+    multiprocess_mode="livesum",
+)
+
+# Stands in for the URL name of requests that didn't match any URL (404s)
+UNMATCHED = "<unmatched>"
+# Anything else a client sends is counted as "other"
+METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
+
+
+class _RequestTimings:
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.template_seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.query_seconds += time.perf_counter() - start
+            self.queries += 1
+
+
+_current = ContextVar("request_timings", default=None)
+
+
+def _timed_execute(execute, sql, params, many, context):
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    return timings(execute, sql, params, many, context)
+
+
+def time_queries(sender, connection, **kwargs):
+    """connection_created receiver: time the connection's queries for the current request."""
+    if _timed_execute not in connection.execute_wrappers:
+        # First in line, so the execute_wrapper() blocks opened before it still pop their own
+        connection.execute_wrappers.insert(0, _timed_execute)
+
+
+def cache_lookup(cache, hit):
+    CACHE_LOOKUPS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def registry():
+    """The registry to export: every process's metrics when PROMETHEUS_MULTIPROC_DIR is set."""
+    if not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        return REGISTRY
+    collected = CollectorRegistry()
+    MultiProcessCollector(collected)
+    return collected
+
+
+def export():
+    return generate_latest(registry())
+
+
+class MetricsTemplate(Template):
+    def render(self, context=None, request=None):
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            # Includes and extends render inside this, so they aren't counted twice
+            timings = _current.get()
+            if timings is not None:
+                timings.template_seconds += time.perf_counter() - start
+
+
+class MetricsDjangoTemplates(DjangoTemplates):
+    """The Django template backend, with render times added to the current request's metrics."""
+
+    def from_string(self, template_code):
+        return MetricsTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return MetricsTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+class MetricsMiddleware:
+    """Records latency, SQL and template time per view. Goes first, to see shed requests too."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings = _RequestTimings()
+        token = _current.set(timings)
+        start = time.perf_counter()
+        response = None
+        try:
+            response = self.get_response(request)
+            return response
+        finally:
+            _current.reset(token)
+            self._record(request, response, timings, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        timings = _RequestTimings()
+        token = _current.set(timings)
+        start = time.perf_counter()
+        response = None
+        try:
+            response = await self.get_response(request)
+            return response
+        finally:
+            _current.reset(token)
+            self._record(request, response, timings, time.perf_counter() - start)
+
+    def _record(self, request, response, timings, seconds):
+        match = getattr(request, "resolver_match", None)
+        view = match.view_name if match is not None else UNMATCHED
+        # Status classes, exact codes would multiply the series for little gain
+        status = f"{response.status_code // 100}xx" if response is not None else "5xx"
+        method = request.method if request.method in METHODS else "other"
+        REQUEST_LATENCY.labels(view, method, status).observe(seconds)
+        if timings.queries:
+            SQL_QUERIES.labels(view).inc(timings.queries)
+            SQL_SECONDS.labels(view).inc(timings.query_seconds)
+        if timings.template_seconds:
+            TEMPLATE_SECONDS.labels(view).inc(timings.template_seconds)
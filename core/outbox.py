@@ -0,0 +1,127 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core import metrics
+from core.models import OutboxEmail
+
+# Transactional email outbox.
+# Code that wants to send mail writes an OutboxEmail row instead, inside the same
+# transaction as the change it is about, so a rolled back RSVP or sign-up never sends
+# anything and a slow SMTP server never holds up a request. The send_outbox_emails
+# command drains the table in batches over one reused mail connection. A batch is
+# claimed in a short transaction that marks its rows as sending and leases them until
+# next_attempt_at, the mail goes out with no transaction or lock held, and every result
+# is its own UPDATE. Rows of a worker that died mid-batch are picked up again once their
+# lease runs out, so an email can go out twice but is never lost.
+
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = timedelta(seconds=30)
+BACKOFF_MAX = timedelta(hours=1)
+LEASE = timedelta(minutes=10)
+
+
+def enqueue_email(subject, message, recipient_list, from_email=None):
+    return OutboxEmail.objects.create(
+        subject=subject,
+        body=message,
+        from_email=from_email or settings.EMAIL_HOST_USER,
+        recipients=list(recipient_list),
+    )
+
+
+def enqueue_emails(messages):
+    """Queue many (subject, message, recipient_list) tuples with a single INSERT."""
+    return OutboxEmail.objects.bulk_create(
+        [
+            OutboxEmail(
+                subject=subject,
+                body=message,
+                from_email=settings.EMAIL_HOST_USER,
+                recipients=list(recipient_list),
+            )
+            for subject, message, recipient_list in messages
+        ],
+        batch_size=500,
+    )
+
+
+def backoff(attempts):
+    return min(BACKOFF_BASE * (2 ** (attempts - 1)), BACKOFF_MAX)
+
+
+def _claim(batch_size, lease):
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            OutboxEmail.objects.select_for_update(skip_locked=True)
+            .filter(status__in=[OutboxEmail.PENDING, OutboxEmail.SENDING], next_attempt_at__lte=now)
+            .order_by("next_attempt_at", "id")[:batch_size]
+        )
+        if batch:
+            OutboxEmail.objects.filter(pk__in=[email.pk for email in batch]).update(
+                status=OutboxEmail.SENDING, next_attempt_at=now + lease
+            )
+    return batch
+
+
+def send_pending(batch_size=100, max_attempts=MAX_ATTEMPTS, connection=None, lease=LEASE):
+    """
+    Send one batch of due emails. Returns (sent, failed, dead) counts.
+    Rows are claimed with SKIP LOCKED where the database supports it and leased for
+    `lease`, so several workers can drain the outbox side by side.
+    """
+    sent = failed = dead = 0
+    batch = _claim(batch_size, lease)
+    if not batch:
+        return sent, failed, dead
+
+    connection = connection or get_connection()
+    try:
+        connection.open()
+    except Exception as e:
+        # Could not even reach the mail server, retry the whole batch later
+        for email in batch:
+            dead += _record_failure(email, e, max_attempts)
+        return sent, len(batch) - dead, dead
+
+    try:
+        for email in batch:
+            message = EmailMessage(
+                email.subject, email.body, email.from_email or None, email.recipients, connection=connection
+            )
+            start = time.perf_counter()
+            try:
+                message.send()
+            except Exception as e:
+                metrics.EMAIL_SEND.labels("failed").observe(time.perf_counter() - start)
+                if _record_failure(email, e, max_attempts):
+                    dead += 1
+                else:
+                    failed += 1
+                continue
+            metrics.EMAIL_SEND.labels("sent").observe(time.perf_counter() - start)
+            OutboxEmail.objects.filter(pk=email.pk).update(
+                status=OutboxEmail.SENT, attempts=F("attempts") + 1, sent_at=timezone.now(), last_error=""
+            )
+            sent += 1
+    finally:
+        connection.close()
+    return sent, failed, dead
+
+
+def _record_failure(email, error, max_attempts):
+    email.attempts += 1
+    email.last_error = str(error)
+    if email.attempts >= max_attempts:
+        email.status = OutboxEmail.DEAD
+    else:
+        email.status = OutboxEmail.PENDING
+        email.next_attempt_at = timezone.now() + backoff(email.attempts)
+    email.save(update_fields=["attempts", "last_error", "status", "next_attempt_at"])
+    return email.status == OutboxEmail.DEAD
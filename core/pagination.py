@@ -0,0 +1,200 @@
+import base64
+import json
+from functools import reduce
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Q
+from django.http import QueryDict
+
+# Keyset (cursor) pagination.
+# Instead of OFFSET, every page is fetched with a WHERE on the ordering columns of the
+# last row seen, so page N costs the same as page 1. The cursor is that row's ordering
+# values, JSON encoded and base64'd into the `after` / `before` query parameters.
+
+AFTER_PARAM = "after"
+BEFORE_PARAM = "before"
+
+
+def encode_cursor(values):
+    raw = json.dumps([str(value) for value in values]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        return None
+    return values if isinstance(values, list) else None
+
+
+class KeysetPage:
+    def __init__(self, object_list, has_next, has_previous, next_cursor, previous_cursor, querydict=None):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self._querydict = querydict
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def _query(self, param, cursor):
+        params = self._querydict.copy() if self._querydict is not None else QueryDict(mutable=True)
+        params.pop(AFTER_PARAM, None)
+        params.pop(BEFORE_PARAM, None)
+        params[param] = cursor
+        return params.urlencode()
+
+    @property
+    def next_query(self):
+        return self._query(AFTER_PARAM, self.next_cursor) if self.has_next else ""
+
+    @property
+    def previous_query(self):
+        return self._query(BEFORE_PARAM, self.previous_cursor) if self.has_previous else ""
+
+
+class KeysetPaginator:
+    """
+    Paginate `queryset` on `ordering`, a tuple of model field names that together are
+    unique (end it with "id"). Prefix a field with "-" for descending order.
+    """
+
+    def __init__(self, queryset, ordering, per_page=12):
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.per_page = per_page
+        self.fields = [name.lstrip("-") for name in self.ordering]
+        self.descending = [name.startswith("-") for name in self.ordering]
+
+    def _reversed_ordering(self):
+        return [name[1:] if name.startswith("-") else f"-{name}" for name in self.ordering]
+
+    def _values(self, obj):
+        # Model instances, or dicts from a values() queryset
+        if isinstance(obj, dict):
+            return [obj[field] for field in self.fields]
+        return [getattr(obj, field) for field in self.fields]
+
+    def _parse(self, cursor):
+        values = decode_cursor(cursor) if cursor else None
+        if values is None or len(values) != len(self.fields):
+            return None
+        try:
+            return [self._to_python(field, value) for field, value in zip(self.fields, values)]
+        except Exception:
+            return None
+
+    def _to_python(self, field, value):
+        opts = self.queryset.model._meta
+        if field == "pk":
+            return opts.pk.to_python(value)
+        try:
+            return opts.get_field(field).to_python(value)
+        except FieldDoesNotExist:
+            # An annotation, compared as the JSON value
+            if field not in self.queryset.query.annotations:
+                raise
+            return value
+
+    def _seek(self, values, forward):
+        # (a, b) > (x, y)  <=>  a > x OR (a = x AND b > y), with the comparison flipped
+        # per column for descending fields and for backwards pages.
+        clauses = []
+        for i, field in enumerate(self.fields):
+            greater = forward != self.descending[i]
+            lookup = f"{field}__gt" if greater else f"{field}__lt"
+            equal = {self.fields[j]: values[j] for j in range(i)}
+            clauses.append(Q(**equal, **{lookup: values[i]}))
+        return reduce(lambda a, b: a | b, clauses)
+
+    def _plan(self, after, before):
+        """The queryset to fetch (per_page + 1 rows) and the cursors it was built from."""
+        after_values = self._parse(after)
+        before_values = self._parse(before) if after_values is None else None
+
+        if before_values is not None:
+            queryset = self.queryset.filter(self._seek(before_values, forward=False)).order_by(*self._reversed_ordering())
+        else:
+            queryset = self.queryset
+            if after_values is not None:
+                queryset = queryset.filter(self._seek(after_values, forward=True))
+            queryset = queryset.order_by(*self.ordering)
+        return queryset[: self.per_page + 1], after_values, before_values
+
+    def _page(self, rows, after_values, before_values, querydict):
+        if before_values is not None:
+            has_previous = len(rows) > self.per_page
+            rows = rows[: self.per_page][::-1]
+            has_next = True
+        else:
+            has_next = len(rows) > self.per_page
+            rows = rows[: self.per_page]
+            has_previous = after_values is not None
+
+        next_cursor = encode_cursor(self._values(rows[-1])) if rows else None
+        previous_cursor = encode_cursor(self._values(rows[0])) if rows else None
+        return KeysetPage(
+            rows,
+            has_next=has_next and next_cursor is not None,
+            has_previous=has_previous and previous_cursor is not None,
+            next_cursor=next_cursor,
+            previous_cursor=previous_cursor,
+            querydict=querydict,
+        )
+
+    def page_queryset(self, after=None, before=None):
+        """The rows get_page() fetches for these cursors (one more than per_page, for has_next)."""
+        return self._plan(after, before)[0]
+
+    def get_page(self, after=None, before=None, querydict=None):
+        queryset, after_values, before_values = self._plan(after, before)
+        return self._page(list(queryset), after_values, before_values, querydict)
+
+    async def aget_page(self, after=None, before=None, querydict=None):
+        queryset, after_values, before_values = self._plan(after, before)
+        rows = [row async for row in queryset.aiterator()]
+        return self._page(rows, after_values, before_values, querydict)
+
+
+def paginate(request, queryset, ordering, per_page=12):
+    paginator = KeysetPaginator(queryset, ordering, per_page)
+    return paginator.get_page(
+        after=request.GET.get(AFTER_PARAM),
+        before=request.GET.get(BEFORE_PARAM),
+        querydict=request.GET,
+    )
+
+
+class KeysetPaginationMixin:
+    """
+    For ListViews: exposes the current KeysetPage as `page_obj` and only the rows of
+    that page as the object list.
+    """
+
+    paginate_by = 12
+    keyset_ordering = ("id",)
+
+    def get_keyset_ordering(self, queryset):
+        return self.keyset_ordering
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(queryset, self.get_keyset_ordering(queryset), page_size)
+        page = paginator.get_page(
+            after=self.request.GET.get(AFTER_PARAM),
+            before=self.request.GET.get(BEFORE_PARAM),
+            querydict=self.request.GET,
+        )
+        return paginator, page, page.object_list, page.has_other_pages()
@@ -0,0 +1,173 @@
+import logging
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.urls import resolve
+
+# Per-view query budgets.
+# A view declares the most queries a GET request to it may run, counting everything the
+# request does (session and user lookups included):
+#
+#     @query_budget(5)
+#     def my_view(request): ...
+#
+#     class MyListView(ListView):
+#         query_budget = 5
+#
+# QUERY_BUDGETS in settings ({"url-name": n}) overrides or adds budgets per URL name.
+# assert_query_budget() is the test side: it fails when a view goes over its budget, or
+# when its query count grows with the amount of data (an N+1). QueryBudgetMiddleware
+# is the runtime side: it logs every over-budget request together with its SQL.
+
+logger = logging.getLogger(__name__)
+
+MAX_LOGGED_QUERIES = 50
+
+# Transaction control isn't counted: whether a save runs in BEGIN or in a SAVEPOINT depends
+# on the caller (TestCase wraps everything in a transaction), not on the view
+TRANSACTION_STATEMENTS = ("BEGIN", "SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO SAVEPOINT")
+
+
+def query_budget(max_queries):
+    def decorator(view_func):
+        view_func.query_budget = max_queries
+        return view_func
+    return decorator
+
+
+def get_query_budget(match):
+    """Budget for a ResolverMatch, or None when the view doesn't declare one."""
+    overrides = getattr(settings, "QUERY_BUDGETS", {})
+    if match.url_name in overrides:
+        return overrides[match.url_name]
+    view = match.func
+    budget = getattr(view, "query_budget", None)
+    if budget is None and hasattr(view, "view_class"):
+        budget = getattr(view.view_class, "query_budget", None)
+    return budget
+
+
+class QueryLog:
+    def __init__(self, keep=MAX_LOGGED_QUERIES):
+        self.count = 0
+        self.statements = []
+        self.keep = keep
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql.lstrip().upper().startswith(TRANSACTION_STATEMENTS):
+            return execute(sql, params, many, context)
+        self.count += 1
+        if len(self.statements) < self.keep:
+            self.statements.append(sql)
+        return execute(sql, params, many, context)
+
+    def format(self):
+        lines = [f"  {i}. {sql}" for i, sql in enumerate(self.statements, start=1)]
+        if self.count > len(self.statements):
+            lines.append(f"  ... {self.count - len(self.statements)} more")
+        return "\n".join(lines)
+
+
+@contextmanager
+def capture_queries(keep=MAX_LOGGED_QUERIES):
+    log = QueryLog(keep)
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(log))
+        yield log
+
+
+def count_queries(client, path):
+    """GET `path` (draining streamed content too) and return (response, QueryLog)."""
+    with capture_queries() as log:
+        response = client.get(path)
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+    return response, log
+
+
+def _check_status(path, response):
+    # A view that crashed stopped early, its query count says nothing
+    if response.status_code >= 500:
+        raise AssertionError(f"{path} answered {response.status_code}")
+
+
+def assert_query_budget(client, path, budget=None, grow=None):
+    """
+    Request `path` with `client` and raise AssertionError when it runs more queries than
+    `budget` (by default the view's declared budget). When `grow` is given, it is called
+    to add data after the first request, and the request is repeated: the query count
+    must not go up, otherwise the view does work per row. A 5xx response fails too.
+    Returns the number of queries of the (last) request.
+    """
+    if budget is None:
+        match = resolve(path.split("?", 1)[0])
+        budget = get_query_budget(match)
+        if budget is None:
+            raise AssertionError(f"{path} ({match.view_name}) declares no query budget")
+
+    response, log = count_queries(client, path)
+    _check_status(path, response)
+    if log.count > budget:
+        raise AssertionError(f"{path} ran {log.count} queries, budget is {budget}:\n{log.format()}")
+
+    if grow is not None:
+        grow()
+        response, grown = count_queries(client, path)
+        _check_status(path, response)
+        if grown.count > log.count:
+            raise AssertionError(
+                f"{path} ran {log.count} queries, then {grown.count} with more data:\n{grown.format()}"
+            )
+        log = grown
+    return log.count
+
+
+class QueryBudgetMiddleware:
+    """Log requests that run more queries than their view's budget, with the SQL they ran."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        # Budgets cover page loads, form submissions legitimately write more
+        if request.method not in ("GET", "HEAD"):
+            return self.get_response(request)
+
+        with capture_queries() as log:
+            response = self.get_response(request)
+        self._check(request, log)
+        return response
+
+    async def __acall__(self, request):
+        if request.method not in ("GET", "HEAD"):
+            return await self.get_response(request)
+
+        # The wrappers sit on this context's connections, which are the ones sync_to_async uses
+        with capture_queries() as log:
+            response = await self.get_response(request)
+        self._check(request, log)
+        return response
+
+    def _check(self, request, log):
+        match = getattr(request, "resolver_match", None)
+        budget = get_query_budget(match) if match is not None else None
+        if budget is not None and log.count > budget:
+            logger.warning(
+                "Query budget exceeded on %s (%s): %d queries, budget %d\n%s",
+                request.path,
+                match.view_name,
+                log.count,
+                budget,
+                log.format(),
+            )
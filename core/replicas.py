@@ -0,0 +1,218 @@
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.urls import Resolver404, resolve
+
+# Read replicas.
+# Reads go to a replica only where they were asked for: in views marked with
+# @read_replica (or a `read_replica = True` attribute on class-based views) and in
+# `with replica_reads():` blocks. Everything else, all writes, and every read inside a
+# transaction on the primary stay on `default`.
+#
+# Read-your-writes: once a request writes (or is a POST/PUT/PATCH/DELETE), its later
+# reads go to the primary, and the response sets a cookie that keeps the user's next
+# requests on the primary for REPLICA_STICKY_SECONDS, so they see what they just did.
+#
+# Replicas that lag more than REPLICA_MAX_LAG seconds behind, or can't be reached, are
+# skipped until the next check (every REPLICA_CHECK_INTERVAL seconds, per process).
+#
+# Sessions, users and their groups and permissions are always read from the primary: they
+# are loaded inside the replica views, and a logout or a revoked role has to take effect
+# on the next request, not once the replica caught up.
+
+logger = logging.getLogger(__name__)
+
+PIN_COOKIE = "db_primary"
+
+
+class _ReadState:
+    def __init__(self, use_replica, pinned=False):
+        self.use_replica = use_replica
+        self.pinned = pinned
+        self.wrote = False
+
+
+_state = ContextVar("replica_read_state", default=None)
+
+# alias -> (checked at, healthy)
+_health = {}
+
+
+def replica_aliases():
+    return getattr(settings, "DATABASE_REPLICAS", [])
+
+
+def read_replica(view_func):
+    """Let the view's reads go to a replica."""
+    view_func.read_replica = True
+    return view_func
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """Let the reads in the block go to a replica (unless the current request wrote)."""
+    current = _state.get()
+    state = _ReadState(enabled, pinned=current.pinned if current else False)
+    if current is not None:
+        state.wrote = current.wrote
+    token = _state.set(state)
+    try:
+        yield state
+    finally:
+        _state.reset(token)
+        if current is not None and state.wrote:
+            current.wrote = True
+
+
+def replica_lag(alias):
+    """Seconds the replica is behind its primary."""
+    connection = connections[alias]
+    connection.ensure_connection()
+    if connection.vendor != "postgresql":
+        return 0.0
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT CASE WHEN NOT pg_is_in_recovery() "
+            "OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+            "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+        )
+        return float(cursor.fetchone()[0])
+
+
+def is_healthy(alias):
+    checked_at, healthy = _health.get(alias, (None, None))
+    now = time.monotonic()
+    if checked_at is not None and now - checked_at < getattr(settings, "REPLICA_CHECK_INTERVAL", 5):
+        return healthy
+    try:
+        lag = replica_lag(alias)
+        healthy = lag <= getattr(settings, "REPLICA_MAX_LAG", 10)
+        if not healthy:
+            logger.warning("Replica %s is %.1fs behind, reading from the primary", alias, lag)
+    except DatabaseError as e:
+        healthy = False
+        logger.warning("Replica %s is unavailable (%s), reading from the primary", alias, e)
+        connections[alias].close()
+    _health[alias] = (now, healthy)
+    return healthy
+
+
+def mirror_test_databases():
+    """Point the replicas at the primary's test database, as the test runner does for TEST MIRROR."""
+    for alias in replica_aliases():
+        connections[alias].close()
+        connections[alias].creation.set_as_test_mirror(connections[DEFAULT_DB_ALIAS].settings_dict)
+
+
+def reset_health():
+    _health.clear()
+
+
+def pick_replica():
+    """A healthy replica's alias, or None."""
+    healthy = [alias for alias in replica_aliases() if is_healthy(alias)]
+    return random.choice(healthy) if healthy else None
+
+
+# Apps whose models are only read from the primary, besides the user model
+PRIMARY_APPS = {"sessions", "auth"}
+
+
+def _primary_only(model):
+    return model._meta.app_label in PRIMARY_APPS or model._meta.label == settings.AUTH_USER_MODEL
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        # The primary is named explicitly, otherwise Django would follow the instance hint
+        # of related lookups, and a cached object loaded from a replica would drag reads there
+        state = _state.get()
+        if _primary_only(model):
+            return DEFAULT_DB_ALIAS
+        if state is None or not state.use_replica or state.pinned or state.wrote:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return pick_replica() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        # Session bookkeeping (e.g. the cached roles) doesn't change what the pages show
+        if state is not None and model._meta.app_label != "sessions":
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema through replication
+        return db not in replica_aliases()
+
+
+class ReplicaMiddleware:
+    """
+    Turns on replica reads for views marked with @read_replica and pins a user to the
+    primary for a while after they wrote.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = self._state_for(request)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self._finish(request, response, state)
+
+    async def __acall__(self, request):
+        # The state object (not just the variable) is shared with the threads sync_to_async uses
+        state = self._state_for(request)
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self._finish(request, response, state)
+
+    def _state_for(self, request):
+        use_replica = False
+        if replica_aliases() and request.method in ("GET", "HEAD"):
+            try:
+                match = resolve(request.path_info)
+            except Resolver404:
+                match = None
+            if match is not None:
+                view = match.func
+                use_replica = getattr(view, "read_replica", False) or getattr(
+                    getattr(view, "view_class", None), "read_replica", False
+                )
+        return _ReadState(use_replica, pinned=PIN_COOKIE in request.COOKIES)
+
+    def _finish(self, request, response, state):
+        if replica_aliases() and (state.wrote or request.method not in ("GET", "HEAD", "OPTIONS")):
+            response.set_cookie(
+                PIN_COOKIE,
+                "1",
+                max_age=getattr(settings, "REPLICA_STICKY_SECONDS", 15),
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
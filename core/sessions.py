@@ -0,0 +1,19 @@
+from django.contrib.sessions.backends import cached_db
+
+from core import metrics
+
+# Session engine: Django's cached_db (sessions read from the cache, written through to
+# the database), with its cache hits and misses counted in the metrics (core/metrics.py).
+
+
+class SessionStore(cached_db.SessionStore):
+    def load(self):
+        self._missed_cache = False
+        data = super().load()
+        metrics.cache_lookup("sessions", not self._missed_cache)
+        return data
+
+    def _get_session_from_db(self):
+        # Only called when the cache didn't have the session
+        self._missed_cache = True
+        return super()._get_session_from_db()
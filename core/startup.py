@@ -0,0 +1,47 @@
+from pathlib import Path
+
+from django.apps import apps
+from django.template import engines
+from django.urls import get_resolver, reverse
+
+# Pre-warming for cold starts.
+# Called by wsgi.py / asgi.py after the application is built when PREWARM is on, so the
+# work the first requests would otherwise do (importing every view module, building the
+# URL resolvers' lookup tables, parsing and compiling templates into the cached loader)
+# happens while the instance starts instead of while a user waits.
+
+
+def _project_templates():
+    """Names of the templates shipped by the project's own apps."""
+    base = Path(apps.get_app_config("core").path).parent
+    for app_config in apps.get_app_configs():
+        directory = Path(app_config.path) / "templates"
+        if base not in directory.parents or not directory.is_dir():
+            continue
+        for path in directory.rglob("*.html"):
+            yield path.relative_to(directory).as_posix()
+
+
+def warm_urls():
+    resolver = get_resolver()
+    # Imports the URLconfs (and through them the views) and fills the reverse lookup tables
+    resolver.url_patterns
+    reverse("home")
+    return len(resolver.reverse_dict)
+
+
+def warm_templates():
+    warmed = 0
+    for engine in engines.all():
+        for name in sorted(set(_project_templates())):
+            try:
+                engine.get_template(name)
+            except Exception:
+                # Partials that only work included from somewhere else, compiled on first use
+                continue
+            warmed += 1
+    return warmed
+
+
+def prewarm():
+    return {"urls": warm_urls(), "templates": warm_templates()}
@@ -1,7 +1,8 @@
 from django import template
+from users.roles import has_role
 
 register = template.Library()
 
 @register.filter
 def check_group(user, group_name):
-    return user.groups.filter(name=group_name).exists()
\ No newline at end of file
+    return has_role(user, group_name)
\ No newline at end of file
@@ -0,0 +1,49 @@
+from django.contrib.auth import get_user_model
+from django.test import Client
+
+from core import benchmark
+from core.querybudget import assert_query_budget
+from events import stats
+
+# Helpers for the apps' tests.
+# QueryBudgetMixin seeds the benchmark data set (core/benchmark.py) once per TestCase and
+# checks the pages an app lists in `budget_urls` against their query budgets, growing the
+# data between two requests so N+1s show up too:
+#
+#     class QueryBudgetTests(QueryBudgetMixin, TestCase):
+#         budget_urls = [("/events/browse_event/", benchmark.ROLES)]
+
+
+class QueryBudgetMixin:
+    # (path, roles) or (path, roles, budget), the budget defaults to the view's own
+    budget_urls = []
+    seed_size = {"users": 20, "events": 30, "rsvps": 100, "images": 2}
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        benchmark.seed(**cls.seed_size)
+
+    def setUp(self):
+        super().setUp()
+        # Cold dashboard figures, like after a deploy
+        stats.invalidate()
+
+    def client_for(self, role):
+        client = Client()
+        if role != "anonymous":
+            client.force_login(get_user_model().objects.get(username=benchmark.bench_username(role)))
+        return client
+
+    def grow(self):
+        benchmark.seed(
+            **{key: value * 2 for key, value in self.seed_size.items() if key != "images"},
+            images=self.seed_size["images"],
+            seed_value=1,
+        )
+
+    def test_query_budgets(self):
+        for path, roles, *budget in self.budget_urls:
+            for role in roles:
+                with self.subTest(path=path, role=role):
+                    assert_query_budget(self.client_for(role), path, *budget, grow=self.grow)
@@ -1,3 +1,305 @@
-from django.test import TestCase
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.sessions.backends.base import VALID_KEY_CHARS
+from django.core import mail
+from django.db import DatabaseError
+from django.http import HttpResponse
+from prometheus_client import REGISTRY
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+
+from core import admission, benchmark, metrics, outbox, replicas
+from core.models import OutboxEmail
+from core.querybudget import assert_query_budget
+from core.testing import QueryBudgetMixin
+from events.models import Event
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    budget_urls = [
+        ("/", benchmark.ROLES),
+        ("/autocomplete/users/?q=bench", ["Admin"]),
+    ]
+
+    def test_over_budget_fails(self):
+        with self.assertRaises(AssertionError):
+            assert_query_budget(self.client_for("User"), "/", budget=0)
+
+
+class GateTests(SimpleTestCase):
+    def test_admit_queue_shed(self):
+        gate = admission.Gate(limit=1, max_queue=1)
+        self.assertEqual(gate.acquire(timeout=0), admission.ADMITTED)
+        # Full and no time to wait
+        self.assertEqual(gate.acquire(timeout=0), admission.SHED)
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            waiting = pool.submit(gate.acquire, 5)
+            while not gate.stats()["waiting"]:
+                time.sleep(0.001)
+            # The line is full too
+            self.assertEqual(gate.acquire(timeout=5), admission.SHED)
+            gate.release()
+            self.assertEqual(waiting.result(), admission.QUEUED)
+
+        self.assertEqual(gate.stats()["in_flight"], 1)
+        gate.release()
+        self.assertEqual(
+            gate.stats(),
+            {admission.ADMITTED: 2, admission.QUEUED: 1, admission.SHED: 2, "in_flight": 0, "waiting": 0, "limit": 1},
+        )
+
+    def test_wait_runs_out(self):
+        gate = admission.Gate(limit=1, max_queue=1)
+        gate.acquire(timeout=0)
+        self.assertEqual(gate.acquire(timeout=0.01), admission.SHED)
+        self.assertEqual(gate.stats()["waiting"], 0)
+
+    def test_async_queue(self):
+        async def run():
+            gate = admission.Gate(limit=1, max_queue=1)
+            self.assertEqual(await gate.aacquire(0), admission.ADMITTED)
+            waiting = asyncio.ensure_future(gate.aacquire(5))
+            await asyncio.sleep(0)
+            gate.release()
+            return await waiting
+
+        self.assertEqual(asyncio.run(run()), admission.QUEUED)
+
+
+@override_settings(
+    ADMISSION_GROUPS={"api": {"urls": ["api-categories"], "anonymous": 1, "authenticated": 2, "queue": 0}},
+    ADMISSION_QUEUE_TIMEOUT=0,
+    ADMISSION_RETRY_AFTER=7,
+)
+class AdmissionControlTests(TestCase):
+    def test_busy_gate_answers_503(self):
+        gate = admission.get_gate("api", "anonymous")
+        gate.acquire(timeout=0)
+        with self.assertLogs("core.admission", "WARNING"):
+            response = self.client.get("/events/api/categories/")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "7")
+
+        gate.release()
+        self.assertEqual(self.client.get("/events/api/categories/").status_code, 200)
+        self.assertEqual(gate.stats()["in_flight"], 0)
+
+    def test_other_urls_are_not_limited(self):
+        admission.get_gate("api", "anonymous").acquire(timeout=0)
+        self.assertEqual(self.client.get("/events/api/events/").status_code, 200)
+
+    def test_session_cookie_must_look_like_a_session_key(self):
+        middleware = admission.AdmissionControlMiddleware(lambda request: None)
+        factory = RequestFactory()
+        for cookie, kind in [
+            (None, "anonymous"),
+            ("x", "anonymous"),
+            ("A" * 32, "anonymous"),
+            ("abc123" * 6, "anonymous"),
+            (get_random_string(32, VALID_KEY_CHARS), "authenticated"),
+        ]:
+            with self.subTest(cookie=cookie):
+                request = factory.get("/events/api/categories/")
+                if cookie is not None:
+                    request.COOKIES[settings.SESSION_COOKIE_NAME] = cookie
+                self.assertEqual(middleware._gate_for(request).labels, ("api", kind))
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        outbox.enqueue_emails([("Hi", "First", ["a@example.com"]), ("Hi", "Second", ["b@example.com"])])
+
+    def test_send(self):
+        self.assertEqual(outbox.send_pending(), (2, 0, 0))
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(set(OutboxEmail.objects.values_list("status", "attempts")), {(OutboxEmail.SENT, 1)})
+        self.assertEqual(outbox.send_pending(), (0, 0, 0))
+
+    def test_failure_backs_off_then_dies(self):
+        with mock.patch("core.outbox.EmailMessage.send", side_effect=OSError("refused")):
+            self.assertEqual(outbox.send_pending(max_attempts=2), (0, 2, 0))
+            email = OutboxEmail.objects.first()
+            self.assertEqual((email.status, email.attempts, email.last_error), (OutboxEmail.PENDING, 1, "refused"))
+            self.assertGreater(email.next_attempt_at, timezone.now())
+
+            OutboxEmail.objects.update(next_attempt_at=timezone.now())
+            self.assertEqual(outbox.send_pending(max_attempts=2), (0, 0, 2))
+        self.assertEqual(set(OutboxEmail.objects.values_list("status", flat=True)), {OutboxEmail.DEAD})
+
+    def test_claimed_rows_are_leased(self):
+        # Claimed by a worker that dies before sending
+        self.assertEqual(len(outbox._claim(10, outbox.LEASE)), 2)
+        self.assertEqual(set(OutboxEmail.objects.values_list("status", flat=True)), {OutboxEmail.SENDING})
+        self.assertEqual(outbox.send_pending(), (0, 0, 0))
+
+        OutboxEmail.objects.update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(outbox.send_pending(), (2, 0, 0))
+
+
+@override_settings(DATABASE_REPLICAS=["replica_1"], REPLICA_CHECK_INTERVAL=60, REPLICA_MAX_LAG=10)
+class ReplicaRoutingTests(SimpleTestCase):
+    def setUp(self):
+        replicas.reset_health()
+        self.addCleanup(replicas.reset_health)
+        self.router = replicas.ReplicaRouter()
+        self.healthy = mock.patch("core.replicas.is_healthy", return_value=True)
+
+    def test_reads_stay_on_the_primary_unless_asked(self):
+        with self.healthy:
+            self.assertEqual(self.router.db_for_read(Event), "default")
+            with replicas.replica_reads():
+                self.assertEqual(self.router.db_for_read(Event), "replica_1")
+                # Users, sessions and groups are always read from the primary
+                self.assertEqual(self.router.db_for_read(get_user_model()), "default")
+            with replicas.replica_reads(enabled=False):
+                self.assertEqual(self.router.db_for_read(Event), "default")
+
+    def test_a_write_moves_later_reads_to_the_primary(self):
+        with self.healthy, replicas.replica_reads() as outer:
+            with replicas.replica_reads():
+                self.assertEqual(self.router.db_for_write(Event), "default")
+                self.assertEqual(self.router.db_for_read(Event), "default")
+            self.assertTrue(outer.wrote)
+            self.assertEqual(self.router.db_for_read(Event), "default")
+
+    def test_unhealthy_replica_falls_back_to_the_primary(self):
+        with mock.patch("core.replicas.is_healthy", return_value=False), replicas.replica_reads():
+            self.assertEqual(self.router.db_for_read(Event), "default")
+
+    def test_health_checks(self):
+        with mock.patch("core.replicas.replica_lag", return_value=30.0) as lag:
+            with self.assertLogs("core.replicas", "WARNING"):
+                self.assertFalse(replicas.is_healthy("replica_1"))
+            # Remembered until the next check
+            self.assertFalse(replicas.is_healthy("replica_1"))
+            self.assertEqual(lag.call_count, 1)
+
+        replicas.reset_health()
+        with mock.patch("core.replicas.replica_lag", return_value=1.0):
+            self.assertTrue(replicas.is_healthy("replica_1"))
+
+        replicas.reset_health()
+        with mock.patch("core.replicas.replica_lag", side_effect=DatabaseError("refused")), mock.patch(
+            "core.replicas.connections"
+        ) as connections:
+            with self.assertLogs("core.replicas", "WARNING"):
+                self.assertFalse(replicas.is_healthy("replica_1"))
+            connections.__getitem__.return_value.close.assert_called_once()
+
+
+@override_settings(DATABASE_REPLICAS=["replica_1"])
+class ReplicaMiddlewareTests(TransactionTestCase):
+    # Not TestCase: reads inside its transaction stay on the primary
+    def setUp(self):
+        # Stands in for the replica, every read it is asked for stays on the test database
+        patcher = mock.patch("core.replicas.pick_replica", return_value=None)
+        self.pick_replica = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_marked_views_read_from_a_replica(self):
+        self.client.get("/")
+        self.assertTrue(self.pick_replica.called)
+
+    def test_other_views_read_from_the_primary(self):
+        self.client.get("/no-permission/")
+        self.assertFalse(self.pick_replica.called)
+
+    def test_pinned_to_the_primary_after_a_write(self):
+        response = self.client.post("/users/sign-in/", {"username": "nobody", "password": "x"})
+        self.assertIn(replicas.PIN_COOKIE, response.cookies)
+        # The test client sends the cookie back
+        self.client.get("/")
+        self.assertFalse(self.pick_replica.called)
+
+        del self.client.cookies[replicas.PIN_COOKIE]
+        self.client.get("/")
+        self.assertTrue(self.pick_replica.called)
+
+    def test_a_get_that_writes_pins_too(self):
+        def view(request):
+            replicas.ReplicaRouter().db_for_write(Event)
+            return HttpResponse()
+
+        response = replicas.ReplicaMiddleware(view)(RequestFactory().get("/"))
+        self.assertIn(replicas.PIN_COOKIE, response.cookies)
+        response = replicas.ReplicaMiddleware(lambda request: HttpResponse())(RequestFactory().get("/"))
+        self.assertNotIn(replicas.PIN_COOKIE, response.cookies)
+
+    def test_async_views_share_the_request_state(self):
+        async def view(request):
+            # ORM calls of async views run in sync_to_async threads
+            await sync_to_async(replicas.ReplicaRouter().db_for_write)(Event)
+            return HttpResponse()
+
+        response = asyncio.run(replicas.ReplicaMiddleware(view)(RequestFactory().get("/")))
+        self.assertIn(replicas.PIN_COOKIE, response.cookies)
+
+
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        benchmark.seed(users=1, events=2, rsvps=0, images=0)
+
+    def sample(self, name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def client_for(self, role):
+        self.client.force_login(get_user_model().objects.get(username=benchmark.bench_username(role)))
+
+    @override_settings(METRICS_TOKEN="s3cret")
+    def test_token_or_admin(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 404)
+        self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer wrong").status_code, 404)
+        response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer s3cret")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"occavue_http_request_duration_seconds", response.content)
+
+        self.client_for("User")
+        self.assertEqual(self.client.get("/metrics").status_code, 404)
+        self.client_for("Admin")
+        self.assertEqual(self.client.get("/metrics").status_code, 200)
+
+    @override_settings(METRICS_TOKEN="")
+    def test_empty_token_matches_nothing(self):
+        self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer ").status_code, 404)
+
+    def test_request_and_sql_counters(self):
+        requests = self.sample("occavue_http_request_duration_seconds_count", view="home", method="GET", status="2xx")
+        queries = self.sample("occavue_db_queries_total", view="home")
+        self.client.get("/")
+        self.assertEqual(
+            self.sample("occavue_http_request_duration_seconds_count", view="home", method="GET", status="2xx"),
+            requests + 1,
+        )
+        self.assertGreater(self.sample("occavue_db_queries_total", view="home"), queries)
+        self.assertGreater(self.sample("occavue_template_render_seconds_total", view="home"), 0)
+
+
+class AsyncMetricsTests(SimpleTestCase):
+    # Not TestCase: the sync_to_async threads can't read tables its transaction wrote to
+    databases = {"default"}
+
+    def test_sql_counters_under_asgi(self):
+        class Match:
+            view_name = "async-test"
+
+        async def view(request):
+            request.resolver_match = Match()
+            # Async views run their ORM calls in sync_to_async threads, with their own connections
+            await ContentType.objects.acount()
+            await sync_to_async(lambda: list(ContentType.objects.all()))()
+            return HttpResponse()
+
+        before = REGISTRY.get_sample_value("occavue_db_queries_total", {"view": "async-test"}) or 0
+        asyncio.run(metrics.MetricsMiddleware(view)(RequestFactory().get("/")))
+        self.assertEqual(REGISTRY.get_sample_value("occavue_db_queries_total", {"view": "async-test"}), before + 2)
@@ -1,24 +1,73 @@
+from django.conf import settings
+from django.http import Http404, HttpResponse, JsonResponse
 from django.shortcuts import render
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.cache import never_cache
+from prometheus_client import CONTENT_TYPE_LATEST
 from events.models import Event
-from django.db.models import Q
+from events.search import search_events
+from events.conditional import conditional_page, event_list_validators
+from core.querybudget import query_budget
+from core.replicas import read_replica
+from core.asyncviews import arender
+from core.metrics import export
+from core.autocomplete import SOURCES, search_response
+from users.roles import has_role
 
 # Create your views here.
+RECENT_EVENTS = 10
+
+def home_events(request):
+    """The events the home page lists, before annotations."""
+    if request.GET.get('type', 'recents') == "search":
+        return search_events(Event.objects.all(), request.GET.get("keyword"))
+    return Event.objects.order_by("event_date")[:RECENT_EVENTS]
+
+def home_validators(request):
+    return event_list_validators(request, home_events(request))
+
+@query_budget(8)
+@read_replica
+@conditional_page(home_validators)
 def home(request):
     type = request.GET.get('type', 'recents')
-    base_query = Event.objects.select_related('category').prefetch_related('images')
     # events
-    if type=="search":
-        keyword = request.GET.get("keyword")
-        events = base_query.filter(Q(name__icontains=keyword)|Q(location__icontains=keyword)).only("name", "description", "location", "event_date", "event_time", "category")
-        title="Search result"
-    else:
-        events = base_query.order_by("event_date").only("name", "description", "location", "event_date", "event_time", "category")[:10]
-        title="Most Recent"
-
-    for event in events:
-        event.first_image = event.images.all()[0] if event.images.all() else None
+    events = home_events(request).select_related('category').with_cover_image().only("name", "description", "location", "event_date", "event_time", "category")
+    title = "Search result" if type=="search" else "Most Recent"
 
     return render(request, "Home/hero_section.html", {"events":events, "title":title})
 
+@query_budget(8)
+@read_replica
+@conditional_page(home_validators)
+async def ahome(request):
+    """Async version of home, served when ASYNC_VIEWS is on."""
+    type = request.GET.get('type', 'recents')
+    queryset = home_events(request).select_related('category').with_cover_image().only("name", "description", "location", "event_date", "event_time", "category")
+    events = [event async for event in queryset.aiterator()]
+    title = "Search result" if type=="search" else "Most Recent"
+
+    return await arender(request, "Home/hero_section.html", {"events":events, "title":title})
+
+@query_budget(6)
 def no_permission(request):
-    return render(request, 'no_permission.html')
\ No newline at end of file
+    return render(request, 'no_permission.html')
+
+@query_budget(5)
+@never_cache
+def metrics(request):
+    """Prometheus metrics, for scrapers sending METRICS_TOKEN as a bearer token, and for admins."""
+    token = settings.METRICS_TOKEN
+    scraper = bool(token) and constant_time_compare(request.headers.get("Authorization", ""), f"Bearer {token}")
+    if not scraper and not has_role(request.user, 'Admin'):
+        raise Http404
+    return HttpResponse(export(), content_type=CONTENT_TYPE_LATEST)
+
+@query_budget(6)
+def autocomplete(request, source):
+    """Search for the remote-select widgets (core/autocomplete.py)."""
+    if source not in SOURCES:
+        raise Http404
+    if not has_role(request.user, *SOURCES[source].roles):
+        return JsonResponse({"error": "You don't have permission to search these."}, status=403)
+    return search_response(request, SOURCES[source])
@@ -14,3 +14,11 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "event_management.settings")
 
 application = get_asgi_application()
+
+# Production startup profile: do the first requests' warm-up work while starting
+from django.conf import settings  # noqa: E402
+
+if settings.PREWARM:
+    from core.startup import prewarm
+
+    prewarm()
@@ -10,8 +10,9 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import math
 from pathlib import Path
-from decouple import config 
+from decouple import config, Csv
 import dj_database_url 
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -55,12 +56,22 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "debug_toolbar.middleware.DebugToolbarMiddleware",
+    # Request latency, SQL and template time per view for /metrics (core/metrics.py)
+    "core.metrics.MetricsMiddleware",
+    # Caps the requests in flight per URL group, sheds the rest with a 503 (core/admission.py)
+    "core.admission.AdmissionControlMiddleware",
+    # Logs requests that run more queries than their view's budget (core/querybudget.py)
+    "core.querybudget.QueryBudgetMiddleware",
+    # Sends the reads of @read_replica views to the replicas (core/replicas.py)
+    "core.replicas.ReplicaMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
-    "django.contrib.auth.middleware.AuthenticationMiddleware",
+    # AuthenticationMiddleware with the signed-in user cached (users/auth_cache.py)
+    "users.middleware.CachedAuthenticationMiddleware",
+    "users.middleware.RoleCacheMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -69,7 +80,8 @@ ROOT_URLCONF = "event_management.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        # DjangoTemplates, timing renders for the metrics (core/metrics.py)
+        "BACKEND": "core.metrics.MetricsDjangoTemplates",
         "DIRS": [],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -86,6 +98,19 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "event_management.wsgi.app"
 
+# Startup profile. "production" is for cold-started deployments (vercel.json): debug
+# tooling is left out, and so are the cloudinary apps (template tags and management
+# commands only, the storage imports the SDK on first use). wsgi.py and asgi.py then
+# compile the templates and URL resolvers at import time (core/startup.py).
+STARTUP_PROFILE = config('STARTUP_PROFILE', default='development')
+PREWARM = STARTUP_PROFILE == 'production'
+
+if STARTUP_PROFILE == 'production':
+    DEFERRED_APPS = ["whitenoise.runserver_nostatic", "cloudinary", "cloudinary_storage", "debug_toolbar"]
+    INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in DEFERRED_APPS]
+    MIDDLEWARE = [name for name in MIDDLEWARE if not name.startswith("debug_toolbar.")]
+    TEMPLATES[0]["OPTIONS"]["context_processors"].remove("django.template.context_processors.debug")
+
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
@@ -109,6 +134,24 @@ DATABASES = {
     }
 }
 
+# Read replicas, as comma separated database URLs (postgres://..., sqlite:////path/to/db).
+# Views marked with @read_replica read from them, see core/replicas.py
+DATABASE_REPLICAS = []
+for number, url in enumerate(config('DB_REPLICA_URLS', default='', cast=Csv()), start=1):
+    DATABASES[f'replica_{number}'] = dict(dj_database_url.parse(url), TEST={'MIRROR': 'default'})
+    DATABASE_REPLICAS.append(f'replica_{number}')
+
+DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+# Replicas further behind than this (seconds) are skipped, checked every REPLICA_CHECK_INTERVAL seconds
+REPLICA_MAX_LAG = config('REPLICA_MAX_LAG', default=10, cast=float)
+REPLICA_CHECK_INTERVAL = 5
+# How long a user reads from the primary after they wrote something. A replica in use can
+# be up to REPLICA_MAX_LAG behind, plus the time until its next check, so by default the
+# window covers both
+REPLICA_STICKY_SECONDS = config(
+    'REPLICA_STICKY_SECONDS', default=math.ceil(REPLICA_MAX_LAG) + REPLICA_CHECK_INTERVAL, cast=int
+)
+
 # Render POSTGRES settings
 # DATABASES = {
 #     'default': dj_database_url.config(
@@ -163,7 +206,9 @@ CLOUDINARY_STORAGE = {
     'API_KEY': config('CLOUDINARY_API_KEY'),
     'API_SECRET': config('CLOUDINARY_API_SECRET')
 }
-DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
+# Set DEFAULT_FILE_STORAGE=django.core.files.storage.FileSystemStorage to keep uploads
+# (and their resized variants) under MEDIA_ROOT instead
+DEFAULT_FILE_STORAGE = config('DEFAULT_FILE_STORAGE', default='cloudinary_storage.storage.MediaCloudinaryStorage')
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
@@ -176,7 +221,11 @@ INTERNAL_IPS = [
     # ...
 ]
 
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+# Outbox emails are sent by `manage.py send_outbox_emails`. For local runs and tests set
+# EMAIL_BACKEND to django.core.mail.backends.console.EmailBackend, or to the filebased
+# backend together with EMAIL_FILE_PATH.
+EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.smtp.EmailBackend')
+EMAIL_FILE_PATH = config('EMAIL_FILE_PATH', default=str(BASE_DIR / 'sent_emails'))
 EMAIL_HOST = config('EMAIL_HOST')
 EMAIL_USE_TLS = config('EMAIL_USE_TLS', cast=bool)
 EMAIL_PORT = config('EMAIL_PORT')
@@ -188,4 +237,63 @@ EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD')
 FRONTEND_URL = 'https://occavue.vercel.app'
 LOGIN_URL = '/users/sign-in/'
 LOGOUT_REDIRECT_URL = '/'
-LOGIN_REDIRECT_URL = '/events/dashboard/'
\ No newline at end of file
+LOGIN_REDIRECT_URL = '/events/dashboard/'
+
+# Upload limits for event images (events/uploads.py)
+EVENT_IMAGE_MAX_COUNT = 10
+EVENT_IMAGE_MAX_SIZE = 10 * 1024 * 1024
+
+# How long a direct upload ticket stays valid, in seconds (events/direct_uploads.py)
+DIRECT_UPLOAD_TICKET_AGE = 600
+
+# Serve the async versions of the home, browse and event detail pages (run under ASGI)
+ASYNC_VIEWS = config('ASYNC_VIEWS', default=False, cast=bool)
+
+# Per URL name query budgets, override the ones declared on the views ({"home": 4})
+QUERY_BUDGETS = {}
+
+# Cache shared by every worker (sessions, the signed-in user, dashboard figures). Without
+# REDIS_URL each process has its own local-memory cache, which can't be trusted with
+# sessions or users: a logout or a role change would only reach the process that handled it.
+REDIS_URL = config('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": REDIS_URL}}
+else:
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+# With a shared cache, sessions are read from it and written through to the database
+# (cached_db, core/sessions.py); otherwise straight from the database
+SESSION_ENGINE = 'core.sessions' if REDIS_URL else 'django.contrib.sessions.backends.db'
+
+# Seconds the signed-in user is kept in the cache, when it is shared (users/auth_cache.py)
+AUTH_USER_CACHE_TIMEOUT = 300
+
+# Seconds a cached dashboard figure may be served before it is recomputed (events/stats.py)
+DASHBOARD_STATS_TIMEOUT = 300
+
+# Requests in flight per URL group and per process, for anonymous and signed-in visitors.
+# Over the limit a request waits up to ADMISSION_QUEUE_TIMEOUT seconds in a line of at most
+# "queue" requests, then gets a 503 with Retry-After (core/admission.py)
+ADMISSION_GROUPS = {
+    "rsvp": {
+        "urls": ["add-rsvp", "add-participant", "update-rsvp", "delete-rsvp"],
+        "anonymous": 2,
+        "authenticated": 8,
+    },
+    "browse": {
+        "urls": ["home", "browse-event", "event-detail", "api-events", "api-event", "api-categories"],
+        "anonymous": 8,
+        "authenticated": 8,
+    },
+    "dashboards": {
+        "urls": ["organizer-dashboard", "user-dashboard", "admin-dashboard", "participants", "events-list"],
+        "anonymous": 2,
+        "authenticated": 4,
+    },
+}
+ADMISSION_QUEUE_TIMEOUT = config('ADMISSION_QUEUE_TIMEOUT', default=1.0, cast=float)
+ADMISSION_RETRY_AFTER = 5
+
+# Bearer token Prometheus sends to scrape /metrics (admins can open it signed in). For
+# several worker processes also set PROMETHEUS_MULTIPROC_DIR, see core/metrics.py
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
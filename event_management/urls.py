@@ -16,17 +16,23 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from debug_toolbar.toolbar import debug_toolbar_urls
 from django.conf.urls.static import static
 from django.conf import settings
-from core.views import home, no_permission
+from core.views import home, ahome, no_permission, metrics, autocomplete
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("events/", include("events.urls")),
     path("users/", include("users.urls")),
-    path('', home, name="home"),
-    path('no-permission/', no_permission, name='no-permission')
-]+ debug_toolbar_urls()
+    path('', ahome if settings.ASYNC_VIEWS else home, name="home"),
+    path('no-permission/', no_permission, name='no-permission'),
+    path('metrics', metrics, name='metrics'),
+    path('autocomplete/<str:source>/', autocomplete, name='autocomplete'),
+]
+
+# Left out of the production startup profile
+if "debug_toolbar" in settings.INSTALLED_APPS:
+    from debug_toolbar.toolbar import debug_toolbar_urls
+    urlpatterns += debug_toolbar_urls()
 
 urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -14,3 +14,11 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "event_management.settings")
 
 app = get_wsgi_application()
+
+# Production startup profile: do the first requests' warm-up work while starting
+from django.conf import settings  # noqa: E402
+
+if settings.PREWARM:
+    from core.startup import prewarm
+
+    prewarm()
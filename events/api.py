@@ -0,0 +1,119 @@
+from django.db.models import Count, Sum
+from django.db.models.functions import Coalesce
+from django.http import JsonResponse
+
+from core.pagination import KeysetPaginator
+from events.models import EventImage
+
+# Read-only JSON API.
+# Every resource has a map of public field names to ORM lookups. `?fields=a,b` picks a
+# subset, which becomes the column list of a values() query, so rows come back as dicts
+# and are renamed into the response without ever building model instances. Lists use
+# the same keyset cursors (`after` / `before`) as the HTML pages.
+
+PER_PAGE = 50
+MAX_PER_PAGE = 200
+
+EVENT_FIELDS = {
+    "id": "id",
+    "name": "name",
+    "description": "description",
+    "date": "event_date",
+    "time": "event_time",
+    "location": "location",
+    "category_id": "category_id",
+    "category": "category__name",
+    "rsvp_count": "rsvp_count",
+    "capacity": "capacity",
+    "waitlist": "waitlist",
+    "cover_image": "cover_image",
+}
+EVENT_DEFAULT_FIELDS = ("id", "name", "date", "time", "location", "category", "rsvp_count")
+
+CATEGORY_FIELDS = {
+    "id": "id",
+    "name": "name",
+    "description": "description",
+    "event_count": "event_count",
+    "rsvp_count": "total_rsvps",
+}
+CATEGORY_DEFAULT_FIELDS = ("id", "name", "event_count")
+
+
+class FieldError(ValueError):
+    pass
+
+
+def parse_fields(params, available, default):
+    """The field names asked for with `fields=`, in order, or `default`."""
+    raw = params.get("fields")
+    if not raw:
+        return list(default)
+    fields = list(dict.fromkeys(name.strip() for name in raw.split(",") if name.strip()))
+    unknown = [name for name in fields if name not in available]
+    if unknown or not fields:
+        raise FieldError(f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(available)}")
+    return fields
+
+
+def _rows(queryset, fields, available, always=()):
+    """values() over the lookups of `fields` (plus `always`, needed for the cursors)."""
+    lookups = list(dict.fromkeys([available[name] for name in fields] + [name.lstrip("-") for name in always]))
+    return queryset.values(*lookups)
+
+
+def _serialize(row, fields, available):
+    data = {name: row[available[name]] for name in fields}
+    if data.get("cover_image"):
+        data["cover_image"] = EventImage._meta.get_field("image").storage.url(data["cover_image"])
+    return data
+
+
+def event_queryset(queryset, fields):
+    if "cover_image" in fields:
+        queryset = queryset.with_cover_image()
+    return queryset
+
+
+def category_queryset(queryset, fields):
+    if "event_count" in fields:
+        queryset = queryset.annotate(event_count=Count("events"))
+    if "rsvp_count" in fields:
+        queryset = queryset.annotate(total_rsvps=Coalesce(Sum("events__rsvp_count"), 0))
+    return queryset
+
+
+def per_page(params):
+    try:
+        return max(1, min(int(params.get("limit", PER_PAGE)), MAX_PER_PAGE))
+    except ValueError:
+        return PER_PAGE
+
+
+def list_response(request, queryset, fields, available, ordering):
+    paginator = KeysetPaginator(
+        _rows(queryset, fields, available, always=ordering), ordering, per_page=per_page(request.GET)
+    )
+    page = paginator.get_page(after=request.GET.get("after"), before=request.GET.get("before"), querydict=request.GET)
+    return json_response(
+        {
+            "results": [_serialize(row, fields, available) for row in page],
+            "next": f"{request.path}?{page.next_query}" if page.has_next else None,
+            "previous": f"{request.path}?{page.previous_query}" if page.has_previous else None,
+        }
+    )
+
+
+def detail_response(queryset, fields, available):
+    row = _rows(queryset, fields, available).first()
+    if row is None:
+        return error_response("Not found.", status=404)
+    return json_response(_serialize(row, fields, available))
+
+
+def json_response(data, status=200):
+    return JsonResponse(data, status=status, safe=False, json_dumps_params={"separators": (",", ":")})
+
+
+def error_response(message, status=400):
+    return json_response({"error": message}, status=status)
@@ -0,0 +1,122 @@
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+
+from django.contrib.messages import get_messages
+from django.db.models import Count, Max, Sum
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+from core.pagination import AFTER_PARAM, BEFORE_PARAM, KeysetPaginator
+from events.models import Event, RSVP
+
+# Conditional GET for the event pages.
+# A page's validators are built from the max(updated_at) and the row count of what it
+# shows: the events of the page and their categories, and for the detail page the
+# RSVPs. Paginated lists only look at the rows of the current page, the same keyset slice
+# the view fetches. Adding or removing an image bumps its event's updated_at
+# (EventQuerySet.touch), so images aren't joined. Counts and id sums catch deletions,
+# timestamps catch everything else. Both come from one or two aggregate queries, much
+# cheaper than running the page's own queries and rendering it. The ETag also covers the
+# URL and the signed-in user, whose roles change the navigation and the buttons on the page.
+
+
+def _latest(*values):
+    values = [value for value in values if value is not None]
+    return max(values) if values else None
+
+
+def _event_state(events):
+    return events.aggregate(
+        event_count=Count("id"),
+        # Catches a different set of the same size, e.g. a page slice moving along
+        event_ids=Sum("id"),
+        events_updated=Max("updated_at"),
+        categories_updated=Max("category__updated_at"),
+    )
+
+
+def _validators(request, state, last_modified):
+    user = request.user
+    key = [request.get_full_path(), user.pk, getattr(user, "role_version", None), *state]
+    etag = 'W/"%s"' % hashlib.md5(repr(key).encode()).hexdigest()
+    return etag, last_modified
+
+
+def event_list_validators(request, events):
+    """(etag, last_modified) for a page listing the events of the queryset `events`."""
+    state = _event_state(Event.objects.filter(pk__in=events.values("pk")))
+    last_modified = _latest(state["events_updated"], state["categories_updated"])
+    return _validators(request, sorted(state.items()), last_modified)
+
+
+def event_page_validators(request, events, ordering, per_page):
+    """Like event_list_validators, for the keyset-paginated page of `events` the request asks for."""
+    paginator = KeysetPaginator(events, ordering, per_page)
+    rows = paginator.page_queryset(after=request.GET.get(AFTER_PARAM), before=request.GET.get(BEFORE_PARAM))
+    return event_list_validators(request, rows)
+
+
+def event_detail_validators(request, event_id):
+    """(etag, last_modified) for the detail page of one event, None when it doesn't exist."""
+    state = _event_state(Event.objects.filter(pk=event_id))
+    if not state["event_count"]:
+        return None
+    # Kept out of the query above, joining the RSVPs would multiply the rows
+    state.update(RSVP.objects.filter(event_id=event_id).aggregate(rsvp_total=Count("id"), rsvps_updated=Max("updated_at")))
+    last_modified = _latest(state["events_updated"], state["categories_updated"], state["rsvps_updated"])
+    return _validators(request, sorted(state.items()), last_modified)
+
+
+def _precondition(request, validators, args, kwargs):
+    """
+    (response, etag, timestamp). `response` is the 304 to send when the client's copy is
+    current, etag and timestamp are None when the page isn't validated.
+    """
+    # Pending messages are rendered into the page, it has to be built fresh
+    if request.method not in ("GET", "HEAD") or len(get_messages(request)):
+        return None, None, None
+    pair = validators(request, *args, **kwargs)
+    if pair is None:
+        return None, None, None
+    etag, last_modified = pair
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    return get_conditional_response(request, etag=etag, last_modified=timestamp), etag, timestamp
+
+
+def _finish(response, etag, timestamp):
+    if etag is None:
+        return response
+    if response.status_code in (200, 304):
+        response.headers.setdefault("ETag", etag)
+        if timestamp is not None:
+            response.headers.setdefault("Last-Modified", http_date(timestamp))
+    patch_vary_headers(response, ("Cookie",))
+    return response
+
+
+def conditional_page(validators):
+    """
+    Answer GET/HEAD requests with 304 Not Modified, without running the view, when the
+    client's copy is current. `validators(request, *args, **kwargs)` returns an
+    (etag, last_modified) pair, or None to skip the check. Works on sync and async views.
+    """
+    def decorator(view_func):
+        if iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def async_inner(request, *args, **kwargs):
+                response, etag, timestamp = await sync_to_async(_precondition)(request, validators, args, kwargs)
+                if response is None:
+                    response = await view_func(request, *args, **kwargs)
+                return _finish(response, etag, timestamp)
+            return async_inner
+
+        @wraps(view_func)
+        def inner(request, *args, **kwargs):
+            response, etag, timestamp = _precondition(request, validators, args, kwargs)
+            if response is None:
+                response = view_func(request, *args, **kwargs)
+            return _finish(response, etag, timestamp)
+        return inner
+    return decorator
@@ -0,0 +1,218 @@
+import os
+import time
+import uuid
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.db import transaction
+from django.urls import reverse
+
+from events import images
+from events.models import Event, EventImage
+from events.uploads import max_image_size, max_images
+
+# Direct-to-storage uploads.
+# Instead of streaming image bytes through a Django worker, the browser asks for an
+# upload ticket (a signed, short-lived description of one file: who uploads it, for
+# what, under which storage name), sends the file straight to the storage with it, and
+# then calls back with the ticket so the EventImage row (or profile image) is recorded.
+# With Cloudinary the browser posts to Cloudinary's signed upload API; with any other
+# storage it posts to a local emulator view that writes the file through the storage.
+# The callback reads the stored file back once: it must open as an image, and event
+# images get their resized variants (events.images) before their row is created.
+
+TICKET_SALT = "events.direct_uploads"
+
+EVENT_IMAGE = "event_image"
+PROFILE_IMAGE = "profile_image"
+
+CONTENT_TYPES = {
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "image/webp": ".webp",
+    "image/gif": ".gif",
+}
+
+
+NOT_AN_IMAGE = "The file is not a JPEG, PNG, WebP or GIF image."
+
+
+class UploadError(Exception):
+    pass
+
+
+def ticket_max_age():
+    return getattr(settings, "DIRECT_UPLOAD_TICKET_AGE", 600)
+
+
+def _field(kind):
+    if kind == EVENT_IMAGE:
+        return EventImage._meta.get_field("image")
+    if kind == PROFILE_IMAGE:
+        return get_user_model()._meta.get_field("profile_image")
+    raise UploadError("Unknown upload kind.")
+
+
+class LocalBackend:
+    """Uploads go to the direct-upload-local view, which writes them through the storage."""
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    def storage_name(self, name):
+        return name
+
+    def upload_target(self, name, ticket, content_type):
+        return {"url": reverse("direct-upload-local"), "fields": {"ticket": ticket}, "file_field": "file"}
+
+    def verify(self, data, response):
+        pass
+
+    def store(self, data, upload):
+        if upload.size > data["size"]:
+            raise UploadError("The file is larger than announced.")
+        if self.storage.exists(data["name"]):
+            raise UploadError("This ticket has already been used.")
+        if not images.is_image(upload):
+            raise UploadError(NOT_AN_IMAGE)
+        stored = self.storage.save(data["name"], upload)
+        if stored != data["name"]:
+            self.storage.delete(stored)
+            raise UploadError("The file could not be stored under its ticket name.")
+        return stored
+
+
+class CloudinaryBackend:
+    """Uploads go to Cloudinary's signed upload API under a public id fixed by the ticket."""
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    def storage_name(self, name):
+        # MediaCloudinaryStorage stores the public id: prefixed, without extension
+        return self.storage._prepend_prefix(os.path.splitext(name)[0])
+
+    def upload_target(self, name, ticket, content_type):
+        import cloudinary.utils
+
+        config = cloudinary.config()
+        params = {"public_id": name, "tags": self.storage.TAG, "timestamp": int(time.time())}
+        params["signature"] = cloudinary.utils.api_sign_request(params, config.api_secret)
+        params["api_key"] = config.api_key
+        url = f"https://api.cloudinary.com/v1_1/{config.cloud_name}/{self.storage.RESOURCE_TYPE}/upload"
+        return {"url": url, "fields": params, "file_field": "file"}
+
+    def verify(self, data, response):
+        import cloudinary.utils
+
+        public_id = response.get("public_id")
+        if public_id != data["name"] or not cloudinary.utils.verify_api_response_signature(
+            public_id, response.get("version"), response.get("signature")
+        ):
+            raise UploadError("The storage response could not be verified.")
+
+    def store(self, data, upload):
+        raise UploadError("Uploads go directly to Cloudinary.")
+
+
+def backend_for(kind):
+    storage = _field(kind).storage
+    # By class path, so the Cloudinary SDK is only imported when it is the storage in use
+    if storage.__class__.__module__.startswith("cloudinary_storage."):
+        return CloudinaryBackend(storage)
+    return LocalBackend(storage)
+
+
+def issue_ticket(user, kind, content_type, size, event=None):
+    """Validate an announced upload and return the ticket plus where and how to send the file."""
+    field = _field(kind)
+    if content_type not in CONTENT_TYPES:
+        raise UploadError("Only JPEG, PNG, WebP and GIF images can be uploaded.")
+    if size <= 0 or size > max_image_size():
+        raise UploadError(f"Images must be smaller than {max_image_size() // (1024 * 1024)} MB.")
+    if kind == EVENT_IMAGE:
+        if event is None:
+            raise UploadError("Event images need an event.")
+        if event.images.count() >= max_images():
+            raise UploadError(f"An event can have at most {max_images()} images.")
+
+    backend = backend_for(kind)
+    filename = f"{uuid.uuid4().hex}{CONTENT_TYPES[content_type]}"
+    name = backend.storage_name(field.generate_filename(None, filename))
+    ticket = signing.dumps(
+        {"user": user.pk, "kind": kind, "event": event.pk if event else None, "name": name, "size": size},
+        salt=TICKET_SALT,
+    )
+    return {"ticket": ticket, "name": name, **backend.upload_target(name, ticket, content_type)}
+
+
+def read_ticket(ticket, user):
+    try:
+        data = signing.loads(ticket, salt=TICKET_SALT, max_age=ticket_max_age())
+    except signing.SignatureExpired:
+        raise UploadError("The upload ticket has expired.")
+    except signing.BadSignature:
+        raise UploadError("Invalid upload ticket.")
+    if data["user"] != user.pk:
+        raise UploadError("This upload ticket belongs to another user.")
+    return data
+
+
+def store_local_upload(ticket, user, upload):
+    """Emulator side: write a file posted with a ticket (local storage only)."""
+    data = read_ticket(ticket, user)
+    backend = backend_for(data["kind"])
+    return {"public_id": backend.store(data, upload)}
+
+
+def _discard(storage, name, variants):
+    for stored in ([name] if name else []) + images.variant_names(variants):
+        storage.delete(stored)
+
+
+def complete_upload(ticket, user, response=None):
+    """Record a finished upload. Returns the EventImage, or the user for profile images."""
+    data = read_ticket(ticket, user)
+    backend = backend_for(data["kind"])
+    backend.verify(data, response or {})
+    storage = _field(data["kind"]).storage
+    if not storage.exists(data["name"]):
+        raise UploadError("The file was not uploaded.")
+    size = storage.size(data["name"])
+    if size is None or size > max_image_size():
+        storage.delete(data["name"])
+        raise UploadError("The uploaded file is too large.")
+
+    with storage.open(data["name"], "rb") as f:
+        content = BytesIO(f.read())
+    if not images.is_image(content):
+        storage.delete(data["name"])
+        raise UploadError(NOT_AN_IMAGE)
+
+    if data["kind"] == EVENT_IMAGE:
+        # A replayed callback finds the row it created the first time
+        image = EventImage.objects.filter(event_id=data["event"], image=data["name"]).first()
+        if image is not None:
+            return image
+        # Resized outside the transaction, so the event isn't locked while it runs
+        variants = images.generate_variants(data["name"], content, storage)
+        with transaction.atomic():
+            # Several tickets can be out at once, so the image limit is checked again here.
+            # Locking the event makes concurrent callbacks for it count one after another.
+            if not Event.objects.select_for_update().filter(pk=data["event"]).exists():
+                _discard(storage, data["name"], variants)
+                raise UploadError("This event doesn't exist anymore.")
+            image = EventImage.objects.filter(event_id=data["event"], image=data["name"]).first()
+            if image is not None:
+                # Replayed while this callback was resizing
+                _discard(storage, None, variants)
+                return image
+            if EventImage.objects.filter(event_id=data["event"]).count() >= max_images():
+                _discard(storage, data["name"], variants)
+                raise UploadError(f"An event can have at most {max_images()} images.")
+            return EventImage.objects.create(event_id=data["event"], image=data["name"], variants=variants)
+    user.profile_image = data["name"]
+    user.save(update_fields=["profile_image"])
+    return user
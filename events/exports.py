@@ -0,0 +1,66 @@
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+# Streaming exports.
+# Rows are pulled with values_list() through QuerySet.iterator(), so no model instances
+# are built and only one chunk of rows is in memory at a time however big the table is.
+
+CHUNK_SIZE = 2000
+
+EVENT_COLUMNS = [
+    ("id", "id"),
+    ("name", "name"),
+    ("event_date", "event_date"),
+    ("event_time", "event_time"),
+    ("location", "location"),
+    ("category", "category__name"),
+    ("organizer", "organizer__username"),
+    ("rsvp_count", "rsvp_count"),
+]
+
+RSVP_COLUMNS = [
+    ("id", "id"),
+    ("event_id", "event_id"),
+    ("event", "event__name"),
+    ("event_date", "event__event_date"),
+    ("user_id", "user_id"),
+    ("username", "user__username"),
+    ("email", "user__email"),
+    ("first_name", "user__first_name"),
+    ("last_name", "user__last_name"),
+]
+
+
+class _Echo:
+    """File-like object for csv.writer that hands each line back instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+def _csv_lines(headers, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(headers)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def _ndjson_lines(headers, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(headers, row)), cls=DjangoJSONEncoder) + "\n"
+
+
+def stream_export(queryset, columns, filename, fmt="csv"):
+    headers = [header for header, _ in columns]
+    rows = queryset.order_by("id").values_list(*[field for _, field in columns]).iterator(chunk_size=CHUNK_SIZE)
+    if fmt == "ndjson":
+        response = StreamingHttpResponse(_ndjson_lines(headers, rows), content_type="application/x-ndjson")
+        extension = "ndjson"
+    else:
+        response = StreamingHttpResponse(_csv_lines(headers, rows), content_type="text/csv")
+        extension = "csv"
+    response["Content-Disposition"] = f'attachment; filename="{filename}.{extension}"'
+    return response
@@ -0,0 +1,23 @@
+from django.db.models import Q
+
+
+def event_filters(params, prefix=""):
+    """The search filters of the event lists (type=search), as a Q on `prefix` + event fields."""
+    filters = Q()
+    if params.get("type") != "search":
+        return filters
+    category = params.get("category")
+    start_date = params.get("start_date")
+    end_date = params.get("end_date")
+    location = params.get("location")
+    if category:
+        filters &= Q(**{f"{prefix}category__name__icontains": category})
+    if location:
+        filters &= Q(**{f"{prefix}location__icontains": location})
+    if start_date and end_date:
+        filters &= Q(**{f"{prefix}event_date__range": [start_date, end_date]})
+    elif start_date:
+        filters &= Q(**{f"{prefix}event_date__gt": start_date})
+    elif end_date:
+        filters &= Q(**{f"{prefix}event_date__lt": end_date})
+    return filters
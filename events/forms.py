@@ -1,5 +1,7 @@
 from django import forms
 from events.models import Event, Category, EventImage, RSVP
+from events.uploads import upload_errors
+from core.autocomplete import RemoteSelect
 
 class StyledFormMixin:
     """ Mixing to apply style to form field"""
@@ -59,7 +61,7 @@ class StyledFormMixin:
 class EventModelForm(StyledFormMixin, forms.ModelForm):
     class Meta:
         model = Event
-        fields = ['name', 'description', 'event_date', 'event_time', 'location', 'category']
+        fields = ['name', 'description', 'event_date', 'event_time', 'location', 'category', 'capacity', 'waitlist']
         widgets = {
             # 'event_time': forms.SplitDateTimeWidget,
             'event_date': forms.SelectDateWidget,
@@ -69,13 +71,33 @@ class EventModelForm(StyledFormMixin, forms.ModelForm):
 class MultipleFileInput(forms.ClearableFileInput):
     allow_multiple_selected = True
 
-class EventImageForm(forms.ModelForm):
-    class Meta:
-        model = EventImage
-        fields = ["image"]
-        widgets = {
-            "image": MultipleFileInput(),
-        }
+class MultipleImageField(forms.ImageField):
+    """ImageField that accepts several files and cleans to a list"""
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault("widget", MultipleFileInput())
+        super().__init__(*args, **kwargs)
+
+    def clean(self, data, initial=None):
+        if isinstance(data, (list, tuple)):
+            return [super(MultipleImageField, self).clean(item, initial) for item in data]
+        image = super().clean(data, initial)
+        return [image] if image else []
+
+class EventImageForm(forms.Form):
+    image = MultipleImageField(required=False)
+
+    def __init__(self, *args, event=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.event = event
+
+    def clean_image(self):
+        images = self.cleaned_data["image"]
+        existing = self.event.images.count() if self.event is not None and self.event.pk else 0
+        errors = upload_errors(images, existing)
+        if errors:
+            raise forms.ValidationError(errors)
+        return images
 
 class CategoryModelForm(StyledFormMixin, forms.ModelForm):
     class Meta:
@@ -86,8 +108,15 @@ class RSVPModelForm(StyledFormMixin, forms.ModelForm):
     class Meta:
         model = RSVP
         fields = ['user', 'event']
-        
+        # Searched on the server, a <select> of every user and event doesn't scale
+        widgets = {
+            'user': RemoteSelect('users'),
+            'event': RemoteSelect('events'),
+        }
+
     # def __init__(self, *args, **kwargs):
     #     super().__init__(*args, **kwargs)
     #     self.fields["user"].queryset = User.objects.all()
-    #     self.fields["event"].queryset = Event.objects.all()
\ No newline at end of file
+    #     self.fields["event"].queryset = Event.objects.all()
+class RSVPImportForm(StyledFormMixin, forms.Form):
+    file = forms.FileField(label="CSV file", help_text="One RSVP per line: username or email, event id")
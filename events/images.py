@@ -0,0 +1,111 @@
+import logging
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+# Responsive variants for event images.
+# Every uploaded EventImage gets a few downscaled copies (VARIANT_WIDTHS, in WebP and
+# JPEG), written next to the original through the image field's storage, so it works the
+# same with Cloudinary and with FileSystemStorage. Their storage names are kept on
+# EventImage.variants as {"webp": {"320": name, ...}, "jpeg": {...}} and turned into
+# srcset strings for the templates.
+
+logger = logging.getLogger(__name__)
+
+VARIANT_WIDTHS = (320, 640, 1280)
+VARIANT_FORMATS = {
+    "webp": {"format": "WEBP", "quality": 80, "method": 4},
+    "jpeg": {"format": "JPEG", "quality": 82, "optimize": True, "progressive": True},
+}
+VARIANT_DIR = "occavue_images/variants"
+
+
+def _widths(original_width):
+    # Never upscale, but always keep the smallest variant as a thumbnail
+    widths = [width for width in VARIANT_WIDTHS if width < original_width]
+    return widths or [VARIANT_WIDTHS[0]]
+
+
+def is_image(fileobj):
+    """True when Pillow can read `fileobj` as an image. Leaves the file at its start."""
+    try:
+        fileobj.seek(0)
+        with Image.open(fileobj) as image:
+            image.verify()
+    except (OSError, ValueError, SyntaxError, Image.DecompressionBombError):
+        return False
+    finally:
+        fileobj.seek(0)
+    return True
+
+
+def render_variants(name, fileobj):
+    """
+    Resize the image in `fileobj` (stored as `name`). Returns a list of
+    (format, width, target name, bytes), empty when the file can't be read as an image.
+    """
+    try:
+        fileobj.seek(0)
+        with Image.open(fileobj) as source:
+            source = ImageOps.exif_transpose(source)
+            image = source.convert("RGB")
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        logger.warning("Could not create variants for %s: %s", name, e)
+        return []
+    finally:
+        fileobj.seek(0)
+
+    stem = os.path.splitext(os.path.basename(name))[0]
+    rendered = []
+    for width in _widths(image.width):
+        height = max(round(image.height * width / image.width), 1)
+        resized = image.resize((width, height), Image.LANCZOS) if width < image.width else image
+        for fmt, options in VARIANT_FORMATS.items():
+            buffer = BytesIO()
+            resized.save(buffer, **options)
+            rendered.append((fmt, width, f"{VARIANT_DIR}/{stem}_{width}.{fmt}", buffer.getvalue()))
+    return rendered
+
+
+def collect_variants(saved):
+    """Build the EventImage.variants value from (format, width, stored name) tuples."""
+    variants = {}
+    for fmt, width, name in saved:
+        variants.setdefault(fmt, {})[str(width)] = name
+    return variants
+
+
+def generate_variants(name, fileobj, storage):
+    """Write the variants of the image in `fileobj` to `storage` and return their names."""
+    return collect_variants(
+        (fmt, width, storage.save(target, ContentFile(data)))
+        for fmt, width, target, data in render_variants(name, fileobj)
+    )
+
+
+def variant_names(variants):
+    return [name for names in (variants or {}).values() for name in names.values()]
+
+
+def generate_variants_from_storage(name, storage):
+    with storage.open(name, "rb") as f:
+        return generate_variants(name, BytesIO(f.read()), storage)
+
+
+def variant_url(variants, storage, fmt="jpeg", width=None):
+    """URL of the smallest variant at least `width` wide (the smallest one without a width)."""
+    names = (variants or {}).get(fmt)
+    if not names:
+        return None
+    widths = sorted(int(w) for w in names)
+    chosen = next((w for w in widths if width is None or w >= width), widths[-1])
+    return storage.url(names[str(chosen)])
+
+
+def srcset(variants, storage, fmt):
+    names = (variants or {}).get(fmt) or {}
+    return ", ".join(
+        f"{storage.url(names[width])} {width}w" for width in sorted(names, key=int)
+    )
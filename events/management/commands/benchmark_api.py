@@ -0,0 +1,78 @@
+import statistics
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from core import benchmark, replicas
+from events.models import Event
+
+
+class Command(BaseCommand):
+    help = "Compare payload size, queries and latency of the JSON API against the HTML pages it replaces"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument("--events", type=int, default=500)
+        parser.add_argument("--rsvps", type=int, default=2000)
+        parser.add_argument("--repeat", type=int, default=10)
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        replicas.mirror_test_databases()
+        try:
+            benchmark.seed(users=options["users"], events=options["events"], rsvps=options["rsvps"])
+            middleware = [name for name in settings.MIDDLEWARE if not name.startswith("debug_toolbar")]
+            with override_settings(MIDDLEWARE=middleware, ALLOWED_HOSTS=["*"]):
+                self._run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def _pairs(self):
+        event = Event.objects.order_by("id").first()
+        browse, api = reverse("browse-event"), reverse("api-events")
+        search = "type=search&location=dhaka"
+        return [
+            ("list (12 events)", f"{browse}", f"{api}?limit=12"),
+            ("list, sparse fields", f"{browse}", f"{api}?limit=12&fields=id,name,date"),
+            ("search", f"{browse}?{search}", f"{api}?limit=12&{search}"),
+            (
+                "event detail",
+                f"{reverse('event-detail')}?id={event.pk}",
+                reverse("api-event", kwargs={"id": event.pk}) + "?fields=id,name,description,date,time,location,category,rsvp_count,capacity,cover_image",
+            ),
+        ]
+
+    def _measure(self, client, path, repeat):
+        measure = benchmark.measure
+        measure(client, path)
+        runs = [measure(client, path) for _ in range(repeat)]
+        return {
+            "status": runs[-1]["status"],
+            "bytes": runs[-1]["bytes"],
+            "queries": max(run["queries"] for run in runs),
+            "wall_ms": statistics.median(run["wall_ms"] for run in runs),
+        }
+
+    def _run(self, options):
+        # The detail page needs an organizer, the API doesn't care
+        client = benchmark.client_for("Organizer")
+        self.stdout.write(
+            f"{'page':<22} {'':<5} {'status':>6} {'bytes':>9} {'queries':>7} {'wall ms':>9}"
+        )
+        for label, html_path, api_path in self._pairs():
+            html = self._measure(client, html_path, options["repeat"])
+            api = self._measure(client, api_path, options["repeat"])
+            for kind, row in (("html", html), ("api", api)):
+                self.stdout.write(
+                    f"{label:<22} {kind:<5} {row['status']:>6} {row['bytes']:>9} {row['queries']:>7} {row['wall_ms']:>9.2f}"
+                )
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"{'':<22} {'':<5} {'':>6} {html['bytes'] / max(api['bytes'], 1):>8.1f}x "
+                    f"{'':>7} {html['wall_ms'] / max(api['wall_ms'], 0.001):>8.1f}x"
+                )
+            )
@@ -0,0 +1,79 @@
+import tempfile
+import time
+from io import BytesIO
+
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from django.db import connection
+from PIL import Image
+
+from core import benchmark, replicas
+from events.models import Event, EventImage
+from events.uploads import UPLOAD_WORKERS, save_event_images
+
+
+class LatencyStorage(FileSystemStorage):
+    """Local storage that waits `latency` seconds per file, standing in for a remote one."""
+
+    def __init__(self, latency, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency
+
+    def _save(self, name, content):
+        time.sleep(self.latency)
+        return super()._save(name, content)
+
+
+class Command(BaseCommand):
+    help = "Compare serial and concurrent event image uploads against a storage with simulated latency"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--files", type=int, default=10, help="Images per submission")
+        parser.add_argument("--latency", type=float, default=0.1, help="Seconds per stored file")
+        parser.add_argument("--width", type=int, default=1600, help="Width of the test images")
+        parser.add_argument("--workers", type=int, default=UPLOAD_WORKERS)
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        replicas.mirror_test_databases()
+        field = EventImage._meta.get_field("image")
+        original_storage = field.storage
+        try:
+            with tempfile.TemporaryDirectory() as media_root:
+                field.storage = LatencyStorage(options["latency"], location=media_root, base_url="/media/")
+                benchmark.seed(users=0, events=1, rsvps=0, images=0)
+                event = Event.objects.get()
+                self._run(event, options)
+        finally:
+            field.storage = original_storage
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def _uploads(self, options):
+        buffer = BytesIO()
+        Image.new("RGB", (options["width"], options["width"] * 2 // 3), (180, 120, 40)).save(buffer, "JPEG")
+        return [
+            SimpleUploadedFile(f"photo_{i}.jpg", buffer.getvalue(), content_type="image/jpeg")
+            for i in range(options["files"])
+        ]
+
+    def _run(self, event, options):
+        files = self._uploads(options)
+        start = time.perf_counter()
+        for upload in files:
+            EventImage(image=upload, event=event).save()
+        serial = time.perf_counter() - start
+
+        files = self._uploads(options)
+        start = time.perf_counter()
+        save_event_images(event, files, workers=options["workers"])
+        concurrent = time.perf_counter() - start
+
+        self.stdout.write(
+            f"{options['files']} image(s), {options['latency'] * 1000:.0f} ms per stored file, "
+            f"{options['workers']} worker(s)"
+        )
+        self.stdout.write(f"serial:     {serial * 1000:8.1f} ms")
+        self.stdout.write(f"concurrent: {concurrent * 1000:8.1f} ms")
+        self.stdout.write(self.style.SUCCESS(f"speedup:    {serial / concurrent:8.2f}x"))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db.models.functions import Now
+
+from events.images import generate_variants_from_storage
+from events.models import Event, EventImage
+
+
+class Command(BaseCommand):
+    help = "Create the resized variants of event images that don't have them yet"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="Regenerate variants that already exist")
+
+    def handle(self, *args, **options):
+        done = failed = 0
+        for image in EventImage.objects.only("id", "event_id", "image", "variants").iterator(chunk_size=200):
+            if image.variants and not options["force"]:
+                continue
+            try:
+                variants = generate_variants_from_storage(image.image.name, image.image.storage)
+            except OSError as e:
+                # Missing original
+                self.stderr.write(f"EventImage {image.pk}: {e}")
+                variants = {}
+            if variants:
+                EventImage.objects.filter(pk=image.pk).update(variants=variants, updated_at=Now())
+                Event.objects.filter(pk=image.event_id).touch()
+                done += 1
+            else:
+                failed += 1
+        self.stdout.write(self.style.SUCCESS(f"Created variants for {done} image(s), {failed} failed."))
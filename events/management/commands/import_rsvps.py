@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from events.rsvp_import import BATCH_SIZE, import_rsvps_csv
+
+
+class Command(BaseCommand):
+    help = "Import RSVPs from a CSV of (username or email, event id) rows"
+
+    def add_arguments(self, parser):
+        parser.add_argument("csv_path")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            with open(options["csv_path"], newline="", encoding="utf-8-sig") as f:
+                result = import_rsvps_csv(f, options["batch_size"])
+        except OSError as e:
+            raise CommandError(e)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Inserted {result['inserted']} RSVP(s) ({result['waitlisted']} waitlisted), "
+                f"{result['duplicates']} duplicate(s), {result['full']} for full events, "
+                f"{result['invalid']} invalid row(s)."
+            )
+        )
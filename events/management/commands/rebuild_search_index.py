@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from events import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index for all events"
+
+    def handle(self, *args, **options):
+        backend = search.rebuild_index()
+        if backend is None:
+            self.stdout.write(self.style.WARNING("No full-text index on this database, search uses icontains."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Search index rebuilt ({backend})."))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from events.models import Event
+
+
+class Command(BaseCommand):
+    help = "Compare Event.rsvp_count with the RSVP table and fix events that drifted"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Only report drifted events")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        drifted = (
+            Event.objects.with_actual_rsvp_count()
+            .exclude(rsvp_count=F("actual_rsvp_count"))
+            .values_list("id", "rsvp_count", "actual_rsvp_count")
+        )
+
+        ids = []
+        for event_id, stored, actual in drifted.iterator(chunk_size=options["batch_size"]):
+            self.stdout.write(f"Event {event_id}: stored {stored}, actual {actual}")
+            ids.append(event_id)
+
+        if options["dry_run"]:
+            self.stdout.write(f"{len(ids)} event(s) drifted.")
+            return
+
+        batch_size = options["batch_size"]
+        for start in range(0, len(ids), batch_size):
+            Event.objects.filter(pk__in=ids[start:start + batch_size]).refresh_rsvp_counts()
+        self.stdout.write(self.style.SUCCESS(f"Reconciled {len(ids)} event(s)."))
@@ -0,0 +1,120 @@
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from core import benchmark, replicas
+from events import rsvps
+from events.models import Event, RSVP
+
+
+class Command(BaseCommand):
+    help = (
+        "Fire RSVPs for one event from many threads at once (with duplicate clicks), then "
+        "cancel some, and check the event was never overbooked and the waitlist moved up"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=200)
+        parser.add_argument("--capacity", type=int, default=50)
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument("--clicks", type=int, default=2, help="RSVP attempts per user")
+        parser.add_argument("--cancel", type=int, default=10, help="Confirmed RSVPs to cancel afterwards")
+        parser.add_argument("--no-waitlist", action="store_true", help="Turn away RSVPs once the event is full")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict["NAME"]
+        # A file database, so every thread gets its own connection to the same data
+        connection.settings_dict["TEST"]["NAME"] = connection.settings_dict["TEST"].get("NAME") or (
+            "test_stress_rsvps.sqlite3" if connection.vendor == "sqlite" else None
+        )
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        replicas.mirror_test_databases()
+        try:
+            failures = self._run(options)
+        finally:
+            connections.close_all()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+        if failures:
+            raise CommandError("\n".join(failures))
+        self.stdout.write(self.style.SUCCESS("No overbooking, counters and waitlist are consistent."))
+
+    def _in_threads(self, func, items, threads):
+        """Run func(item) for every item on `threads` threads released at the same moment."""
+        results = Counter()
+        errors = []
+        start = threading.Barrier(threads)
+        chunks = [items[i::threads] for i in range(threads)]
+
+        def worker(chunk):
+            start.wait()
+            try:
+                for item in chunk:
+                    try:
+                        results[func(item)] += 1
+                    except Exception as e:
+                        errors.append(f"{type(e).__name__}: {e}")
+            finally:
+                connection.close()
+
+        began = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(worker, chunks))
+        return results, errors, time.perf_counter() - began
+
+    def _run(self, options):
+        rng = random.Random(options["seed"])
+        benchmark.seed(users=options["users"], events=1, rsvps=0, images=0)
+        event = Event.objects.get()
+        Event.objects.filter(pk=event.pk).update(capacity=options["capacity"], waitlist=not options["no_waitlist"])
+        users = list(get_user_model().objects.filter(username__startswith="bench_user_"))
+        clicks = users * options["clicks"]
+        rng.shuffle(clicks)
+
+        claimed, errors, seconds = self._in_threads(
+            lambda user: rsvps.claim_seat(event.pk, user), clicks, options["threads"]
+        )
+        self.stdout.write(
+            f"{len(clicks)} RSVP clicks on {options['threads']} threads in {seconds:.2f}s "
+            f"({len(clicks) / seconds:.0f}/s): " + ", ".join(f"{k} {v}" for k, v in sorted(claimed.items()))
+        )
+        failures = [f"RSVP error: {error}" for error in errors[:10]]
+        failures += self._check(event, claimed[RSVP.CONFIRMED], errors=bool(errors))
+        if not errors and claimed[RSVP.CONFIRMED] != min(options["capacity"], len(users)):
+            failures.append(f"Only {claimed[RSVP.CONFIRMED]} seats were given out")
+
+        confirmed = list(RSVP.objects.filter(event=event, status=RSVP.CONFIRMED))
+        cancelled = rng.sample(confirmed, min(options["cancel"], len(confirmed)))
+        waiting = RSVP.objects.filter(event=event, status=RSVP.WAITLISTED).count()
+        _, errors, seconds = self._in_threads(
+            lambda rsvp: rsvp.delete()[0], cancelled, min(options["threads"], len(cancelled) or 1)
+        )
+        self.stdout.write(f"Cancelled {len(cancelled)} RSVPs in {seconds:.2f}s")
+        failures += [f"Cancel error: {error}" for error in errors[:10]]
+        promoted = min(len(cancelled), waiting)
+        failures += self._check(event, len(confirmed) - len(cancelled) + promoted, errors=bool(errors))
+        return failures
+
+    def _check(self, event, expected_confirmed, errors):
+        event.refresh_from_db()
+        counts = Counter(RSVP.objects.filter(event=event).values_list("status", flat=True))
+        confirmed, waitlisted = counts[RSVP.CONFIRMED], counts[RSVP.WAITLISTED]
+        self.stdout.write(
+            f"  confirmed {confirmed}, waitlisted {waitlisted}, rsvp_count {event.rsvp_count}, capacity {event.capacity}"
+        )
+        failures = []
+        if confirmed > event.capacity:
+            failures.append(f"Overbooked: {confirmed} confirmed RSVPs for {event.capacity} seats")
+        if event.rsvp_count != confirmed:
+            failures.append(f"rsvp_count is {event.rsvp_count}, {confirmed} RSVPs are confirmed")
+        if confirmed != expected_confirmed:
+            failures.append(f"Expected {expected_confirmed} confirmed RSVPs, found {confirmed}")
+        if not errors and confirmed < event.capacity and waitlisted:
+            failures.append(f"{waitlisted} RSVPs wait while {event.capacity - confirmed} seats are free")
+        return failures
@@ -0,0 +1,64 @@
+# Generated by Django 4.2.23 on 2026-10-18 19:25
+
+import django.contrib.postgres.search
+from django.db import migrations, OperationalError
+
+
+POSTGRES_POPULATE = """
+UPDATE events_event SET search_vector =
+    setweight(to_tsvector('english', COALESCE(events_event.name, '')), 'A')
+    || setweight(to_tsvector('english', COALESCE((SELECT c.name FROM events_category c WHERE c.id = events_event.category_id), '')), 'B')
+    || setweight(to_tsvector('english', COALESCE(events_event.location, '')), 'B')
+    || setweight(to_tsvector('english', COALESCE(events_event.description, '')), 'C')
+"""
+
+SQLITE_POPULATE = """
+INSERT INTO events_event_fts (rowid, name, description, location, category)
+SELECT e.id, e.name, e.description, e.location, COALESCE(c.name, '')
+FROM events_event e LEFT JOIN events_category c ON c.id = e.category_id
+"""
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        schema_editor.execute(
+            "CREATE INDEX event_search_vector_gin ON events_event USING gin (search_vector)"
+        )
+        schema_editor.execute(POSTGRES_POPULATE)
+    elif vendor == "sqlite":
+        try:
+            schema_editor.execute(
+                "CREATE VIRTUAL TABLE events_event_fts USING fts5("
+                "name, description, location, category, tokenize='porter unicode61')"
+            )
+        except OperationalError:
+            # SQLite built without FTS5, events.search falls back to icontains
+            return
+        schema_editor.execute(SQLITE_POPULATE)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS event_search_vector_gin")
+    elif vendor == "sqlite":
+        schema_editor.execute("DROP TABLE IF EXISTS events_event_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("events", "0002_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="event",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
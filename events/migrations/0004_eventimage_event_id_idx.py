@@ -0,0 +1,17 @@
+# Generated by Django 4.2.23 on 2026-10-18 19:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("events", "0003_event_search_vector"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="eventimage",
+            index=models.Index(fields=["event", "id"], name="eventimage_event_id_idx"),
+        ),
+    ]
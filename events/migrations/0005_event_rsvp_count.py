@@ -0,0 +1,34 @@
+# Generated by Django 4.2.23 on 2026-10-18 19:29
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_rsvp_count(apps, schema_editor):
+    Event = apps.get_model("events", "Event")
+    RSVP = apps.get_model("events", "RSVP")
+    actual = (
+        RSVP.objects.filter(event=OuterRef("pk"))
+        .order_by()
+        .values("event")
+        .annotate(total=Count("id"))
+        .values("total")
+    )
+    Event.objects.update(rsvp_count=Coalesce(Subquery(actual), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("events", "0004_eventimage_event_id_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="event",
+            name="rsvp_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_rsvp_count, migrations.RunPython.noop),
+    ]
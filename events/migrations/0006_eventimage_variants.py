@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-18 19:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("events", "0005_event_rsvp_count"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="eventimage",
+            name="variants",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
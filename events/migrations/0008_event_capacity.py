@@ -0,0 +1,44 @@
+# Generated by Django 4.2.23 on 2026-10-18 19:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("events", "0007_updated_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="event",
+            name="capacity",
+            field=models.PositiveIntegerField(
+                blank=True, help_text="Leave empty for unlimited seats", null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="event",
+            name="waitlist",
+            field=models.BooleanField(
+                default=False,
+                help_text="Put RSVPs on a waitlist once the event is full",
+            ),
+        ),
+        migrations.AddField(
+            model_name="rsvp",
+            name="status",
+            field=models.CharField(
+                choices=[("confirmed", "Confirmed"), ("waitlisted", "Waitlisted")],
+                default="confirmed",
+                editable=False,
+                max_length=10,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="rsvp",
+            index=models.Index(
+                fields=["event", "status", "id"], name="rsvp_event_status_idx"
+            ),
+        ),
+    ]
@@ -1,5 +1,9 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Now
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.auth import get_user_model
+from events import images
 
 User = get_user_model()
 
@@ -8,10 +12,42 @@ User = get_user_model()
 class Category(models.Model):
     name = models.CharField(max_length=250)
     description = models.TextField()
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return self.name
     
+class EventQuerySet(models.QuerySet):
+    def with_cover_image(self):
+        """Annotate each event with the file name and variants of its first image as `cover_image` / `cover_variants`."""
+        first_image = EventImage.objects.filter(event=OuterRef("pk")).order_by("id")
+        return self.annotate(
+            cover_image=Subquery(first_image.values("image")[:1]),
+            cover_variants=Subquery(first_image.values("variants")[:1], output_field=models.JSONField()),
+        )
+
+    def with_actual_rsvp_count(self):
+        """Annotate `actual_rsvp_count`, the RSVP total counted from the RSVP table."""
+        return self.annotate(actual_rsvp_count=_actual_rsvp_count())
+
+    def touch(self):
+        """Bump updated_at, e.g. when the event's images changed (events/conditional.py reads it)."""
+        return self.update(updated_at=Now())
+
+    def refresh_rsvp_counts(self):
+        """Recompute the denormalized rsvp_count of every event in the queryset."""
+        return self.update(rsvp_count=_actual_rsvp_count(), updated_at=Now())
+
+def _actual_rsvp_count():
+    actual = (
+        RSVP.objects.filter(event=OuterRef("pk"), status=RSVP.CONFIRMED)
+        .order_by()
+        .values("event")
+        .annotate(total=Count("id"))
+        .values("total")
+    )
+    return Coalesce(Subquery(actual), 0)
+
 class Event(models.Model):
     name = models.CharField(max_length=250)
     description = models.TextField()
@@ -21,13 +57,63 @@ class Event(models.Model):
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name="events", blank=True, null=True)
     organizer = models.ForeignKey(User, on_delete=models.CASCADE, related_name="organized_events", default=1)
     participants = models.ManyToManyField(User, through="RSVP", related_name="rsvp_events")
+    # Maintained by events.search; the GIN index (or SQLite FTS5 table) is created in migration 0003
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Denormalized number of confirmed RSVPs (taken seats), kept in sync by events.rsvps
+    # and the RSVP signals in events.signals
+    rsvp_count = models.PositiveIntegerField(default=0, editable=False)
+    capacity = models.PositiveIntegerField(null=True, blank=True, help_text="Leave empty for unlimited seats")
+    waitlist = models.BooleanField(default=False, help_text="Put RSVPs on a waitlist once the event is full")
+    # Bumped by every save, and by the queryset updates that change what the pages show
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = EventQuerySet.as_manager()
 
     def __str__(self):
         return self.name
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and not args and kwargs.get("update_fields") is None:
+            # rsvp_count and search_vector are maintained with UPDATE statements, writing back
+            # the copy loaded with the instance would undo concurrent changes
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in ("rsvp_count", "search_vector")
+            ]
+        super().save(*args, **kwargs)
+
+    @property
+    def cover_image_url(self):
+        # Only available on querysets built with .with_cover_image()
+        name = getattr(self, "cover_image", None)
+        if not name:
+            return None
+        return EventImage._meta.get_field("image").storage.url(name)
+
+    @property
+    def cover_srcset_webp(self):
+        return images.srcset(getattr(self, "cover_variants", None), EventImage._meta.get_field("image").storage, "webp")
+
+    @property
+    def cover_srcset_jpeg(self):
+        return images.srcset(getattr(self, "cover_variants", None), EventImage._meta.get_field("image").storage, "jpeg")
+
+    @property
+    def seats_left(self):
+        if self.capacity is None:
+            return None
+        return max(self.capacity - self.rsvp_count, 0)
     
 class RSVP(models.Model):
+    CONFIRMED = "confirmed"
+    WAITLISTED = "waitlisted"
+    STATUS_CHOICES = [(CONFIRMED, "Confirmed"), (WAITLISTED, "Waitlisted")]
+
     event = models.ForeignKey(Event, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=CONFIRMED, editable=False)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
     class Meta:
         constraints = [
@@ -35,10 +121,53 @@ class RSVP(models.Model):
                 fields=["event", "user"], name="unique_rsvp_pairs"
             )
         ]
+        indexes = [
+            # Next in line on an event's waitlist, see events.rsvps.promote_waitlist()
+            models.Index(fields=["event", "status", "id"], name="rsvp_event_status_idx"),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded event so a save that moves the RSVP can fix both counters
+        instance._loaded_event_id = instance.__dict__.get("event_id")
+        return instance
+
+    def save(self, *args, **kwargs):
+        # The counter update runs in the post_save signal, keep it in the same transaction
+        with transaction.atomic(using=kwargs.get("using")):
+            super().save(*args, **kwargs)
 
 class EventImage(models.Model):
     event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name="images")
     image = models.ImageField(upload_to="occavue_images/", blank=True, default='event_images/default.png')
+    # Storage names of the resized copies, see events.images
+    variants = models.JSONField(default=dict, blank=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # Serves the cover image subquery in EventQuerySet.with_cover_image()
+            models.Index(fields=["event", "id"], name="eventimage_event_id_idx"),
+        ]
 
     def __str__(self):
-        return f"Image for {self.event.name}"
\ No newline at end of file
+        return f"Image for {self.event.name}"
+
+    def save(self, *args, **kwargs):
+        if self.image and not self.image._committed:
+            # A new upload, resize it while its bytes are still in memory
+            self.variants = images.generate_variants(self.image.name, self.image.file, self.image.storage)
+        super().save(*args, **kwargs)
+
+    @property
+    def srcset_webp(self):
+        return images.srcset(self.variants, self.image.storage, "webp")
+
+    @property
+    def srcset_jpeg(self):
+        return images.srcset(self.variants, self.image.storage, "jpeg")
+
+    @property
+    def thumbnail_url(self):
+        return images.variant_url(self.variants, self.image.storage) or self.image.url
\ No newline at end of file
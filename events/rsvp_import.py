@@ -0,0 +1,161 @@
+import csv
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core.outbox import enqueue_emails
+from events import rsvps, stats
+from events.models import Event, RSVP
+
+# Bulk RSVP import.
+# Reads (username or email, event id) rows and handles them a batch at a time: users and
+# events are resolved with one query each, new pairs go in with one multi-row
+# INSERT ... ON CONFLICT DO NOTHING against unique_rsvp_pairs, and the emails are queued
+# in one INSERT. Seats follow the same rules as events.rsvps.claim_seat(): the batch's
+# events are locked (so seat claims and other imports queue behind it), new RSVPs get
+# the free seats in file order and the rest go on the waitlist, or are counted as full
+# when the event has none. The raw INSERT skips the RSVP signals, so the event counters
+# and dashboard stats are refreshed here once per batch instead.
+
+BATCH_SIZE = 1000
+
+
+def _rows(reader):
+    for line_number, row in enumerate(reader, start=1):
+        row = [value.strip() for value in row]
+        if not any(row):
+            continue
+        if line_number == 1 and len(row) >= 2 and not row[1].isdigit():
+            # Header row
+            continue
+        yield row
+
+
+def import_rsvps(rows, batch_size=BATCH_SIZE):
+    """
+    Import RSVPs from an iterable of (user, event_id) rows, where user is a username or
+    an email address. Returns a dict of inserted (of which waitlisted), duplicate, full
+    and invalid row counts.
+    """
+    result = {"inserted": 0, "waitlisted": 0, "duplicates": 0, "full": 0, "invalid": 0}
+    rows = _rows(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        for key, count in _import_batch(batch).items():
+            result[key] += count
+    return result
+
+
+def import_rsvps_csv(fileobj, batch_size=BATCH_SIZE):
+    return import_rsvps(csv.reader(fileobj), batch_size)
+
+
+def _insert_rsvps(rows):
+    """INSERT the (event_id, user_id, status) rows, skipping pairs that exist. Returns the inserted pairs."""
+    table = connection.ops.quote_name(RSVP._meta.db_table)
+    now = timezone.now()
+    inserted = set()
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), BATCH_SIZE):
+            chunk = rows[start : start + BATCH_SIZE]
+            cursor.execute(
+                f"INSERT INTO {table} (event_id, user_id, status, updated_at) VALUES "
+                + ", ".join(["(%s, %s, %s, %s)"] * len(chunk))
+                + " ON CONFLICT (event_id, user_id) DO NOTHING RETURNING event_id, user_id",
+                [value for row in chunk for value in (*row, now)],
+            )
+            inserted.update(cursor.fetchall())
+    return inserted
+
+
+def _import_batch(batch):
+    result = {"inserted": 0, "waitlisted": 0, "duplicates": 0, "full": 0, "invalid": 0}
+
+    wanted = []
+    for row in batch:
+        if len(row) < 2 or not row[0] or not row[1].isdigit():
+            result["invalid"] += 1
+            continue
+        wanted.append((row[0], int(row[1])))
+
+    identifiers = {identifier for identifier, _ in wanted}
+    users = {}
+    for user in get_user_model().objects.filter(Q(username__in=identifiers) | Q(email__in=identifiers)).only(
+        "id", "username", "email"
+    ):
+        users.setdefault(user.username, user)
+        if user.email:
+            users.setdefault(user.email, user)
+    events = dict(Event.objects.filter(pk__in={event_id for _, event_id in wanted}).values_list("id", "name"))
+
+    pairs = {}
+    for identifier, event_id in wanted:
+        user = users.get(identifier)
+        if user is None or event_id not in events:
+            result["invalid"] += 1
+        elif (event_id, user.pk) in pairs:
+            result["duplicates"] += 1
+        else:
+            pairs[(event_id, user.pk)] = user
+    if not pairs:
+        return result
+
+    with transaction.atomic():
+        # In id order, so two imports touching the same events can't deadlock
+        seats = {
+            event["id"]: event
+            for event in Event.objects.select_for_update()
+            .filter(pk__in={event_id for event_id, _ in pairs})
+            .order_by("id")
+            .values("id", "capacity", "waitlist", "rsvp_count")
+        }
+        existing = set(
+            RSVP.objects.filter(
+                event_id__in={event_id for event_id, _ in pairs},
+                user_id__in={user_id for _, user_id in pairs},
+            ).values_list("event_id", "user_id")
+        )
+
+        rows = []
+        for event_id, user_id in pairs:
+            event = seats.get(event_id)
+            if event is None:
+                # Deleted since it was resolved above
+                result["invalid"] += 1
+            elif (event_id, user_id) in existing:
+                result["duplicates"] += 1
+            elif event["capacity"] is None or event["rsvp_count"] < event["capacity"]:
+                event["rsvp_count"] += 1
+                rows.append((event_id, user_id, RSVP.CONFIRMED))
+            elif event["waitlist"]:
+                rows.append((event_id, user_id, RSVP.WAITLISTED))
+            else:
+                result["full"] += 1
+        if not rows:
+            return result
+
+        inserted = _insert_rsvps(rows)
+        # A pair claimed through the site since `existing` was read is a duplicate too, and
+        # leaves its seat to the waitlist
+        skipped = [row for row in rows if row[:2] not in inserted]
+        rows = [row for row in rows if row[:2] in inserted]
+        result["duplicates"] += len(skipped)
+        result["inserted"] += len(rows)
+        result["waitlisted"] += sum(1 for _, _, status in rows if status == RSVP.WAITLISTED)
+        if not rows:
+            return result
+
+        Event.objects.filter(pk__in={event_id for event_id, _, _ in rows}).refresh_rsvp_counts()
+        stats.invalidate(stats.RSVP_STATS)
+        for event_id in {event_id for event_id, _, status in skipped if status == RSVP.CONFIRMED}:
+            rsvps.promote_waitlist(event_id)
+        emails = (
+            rsvps.rsvp_email(pairs[(event_id, user_id)], events[event_id], status) for event_id, user_id, status in rows
+        )
+        enqueue_emails([email for email in emails if email])
+    return result
@@ -0,0 +1,108 @@
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.db.models.functions import Now
+from django.utils import timezone
+
+from core.outbox import enqueue_email
+from events import stats
+from events.models import Event, RSVP
+
+# Claiming seats.
+# Built for bursts of clicks on the same event. Every RSVP is one INSERT ... ON CONFLICT
+# DO NOTHING (a duplicate click inserts nothing and takes no lock) followed by one
+# conditional UPDATE that takes a seat only while rsvp_count < capacity. The UPDATE
+# locks the event row, so concurrent claims queue on it and re-check the condition,
+# and the event can never be overbooked. When no seat is left the RSVP goes on the
+# waitlist (if the event has one) or is rolled back. Freed seats go to the oldest
+# waitlisted RSVPs, see promote_waitlist().
+
+DUPLICATE = "duplicate"
+FULL = "full"
+MISSING = "missing"
+
+
+def _insert_rsvp(event_id, user_id):
+    """INSERT the RSVP unless the pair exists already. True when a row was inserted."""
+    table = connection.ops.quote_name(RSVP._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (event_id, user_id, status, updated_at) VALUES (%s, %s, %s, %s) "
+            f"ON CONFLICT (event_id, user_id) DO NOTHING",
+            [event_id, user_id, RSVP.CONFIRMED, timezone.now()],
+        )
+        return cursor.rowcount == 1
+
+
+def _take_seat(event_id):
+    return Event.objects.filter(Q(capacity__isnull=True) | Q(rsvp_count__lt=F("capacity")), pk=event_id).update(
+        rsvp_count=F("rsvp_count") + 1, updated_at=Now()
+    )
+
+
+def rsvp_email(user, event_name, status):
+    """The (subject, message, recipients) telling `user` how their RSVP went, None without an email."""
+    if not user.email:
+        return None
+    if status == RSVP.CONFIRMED:
+        message = f"Hi {user.username},\n\nYou have created a new rsvp for the event {event_name}"
+    else:
+        message = (
+            f"Hi {user.username},\n\n{event_name} is full, you are on its waitlist. "
+            f"We will email you when a seat frees up."
+        )
+    return "New RSVP Added", message, [user.email]
+
+
+def claim_seat(event_id, user):
+    """
+    RSVP `user` to the event. Returns RSVP.CONFIRMED, RSVP.WAITLISTED, DUPLICATE when the
+    user already has an RSVP for it, FULL when there is no seat and no waitlist, or
+    MISSING when the event doesn't exist.
+    """
+    event = Event.objects.filter(pk=event_id).values("name", "waitlist").first()
+    if event is None:
+        return MISSING
+
+    with transaction.atomic():
+        if not _insert_rsvp(event_id, user.pk):
+            return DUPLICATE
+        if _take_seat(event_id):
+            status = RSVP.CONFIRMED
+            stats.adjust("rsvp_count", 1)
+        elif event["waitlist"]:
+            status = RSVP.WAITLISTED
+            RSVP.objects.filter(event_id=event_id, user_id=user.pk).update(status=status)
+        else:
+            transaction.set_rollback(True)
+            return FULL
+        # The raw INSERT skips the post_save signals, so queue the email here
+        email = rsvp_email(user, event["name"], status)
+        if email:
+            enqueue_email(*email)
+    return status
+
+
+def promote_waitlist(event_id):
+    """Hand the free seats of the event to its oldest waitlisted RSVPs. Returns how many moved up."""
+    promoted = 0
+    with transaction.atomic():
+        while True:
+            waiting = (
+                RSVP.objects.select_for_update(skip_locked=True, of=("self",))
+                .filter(event_id=event_id, status=RSVP.WAITLISTED)
+                .select_related("user", "event")
+                .order_by("id")
+                .first()
+            )
+            if waiting is None or not _take_seat(event_id):
+                break
+            RSVP.objects.filter(pk=waiting.pk).update(status=RSVP.CONFIRMED, updated_at=Now())
+            stats.adjust("rsvp_count", 1)
+            if waiting.user.email:
+                enqueue_email(
+                    "You got a seat",
+                    f"Hi {waiting.user.username},\n\nA seat freed up for {waiting.event.name}, your RSVP is confirmed.",
+                    [waiting.user.email],
+                )
+            promoted += 1
+    return promoted
@@ -0,0 +1,184 @@
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import F, FloatField, Func, OuterRef, Q, Subquery, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast
+
+from events.models import Category, Event
+
+# Full-text search for events.
+# On Postgres every event carries a weighted `search_vector` (name > category/location
+# > description) backed by a GIN index. On SQLite the same document lives in the FTS5
+# table below. Both match the same way: every word of the keyword has to be there, the
+# last one as a prefix. Any other backend, or SQLite built without FTS5, falls back to
+# icontains.
+
+SEARCH_CONFIG = "english"
+FTS_TABLE = "events_event_fts"
+# bm25() weights of the FTS5 columns (name, description, location, category), the
+# ts_rank() defaults for the weights event_document() gives them on Postgres
+FTS_WEIGHTS = (1.0, 0.2, 0.4, 0.4)
+# Keyset ordering of ranked results, see keyset_ordering()
+RANK_ORDERING = ("-rank", "id")
+
+_fts_available = None
+
+
+def _backend():
+    if connection.vendor == "postgresql":
+        return "postgresql"
+    if connection.vendor == "sqlite" and _has_fts_table():
+        return "sqlite"
+    return None
+
+
+def _has_fts_table():
+    global _fts_available
+    if _fts_available is None:
+        _fts_available = FTS_TABLE in connection.introspection.table_names()
+    return _fts_available
+
+
+def event_document():
+    """Weighted tsvector expression for the event rows of an UPDATE."""
+    category_name = Subquery(Category.objects.filter(pk=OuterRef("category_id")).values("name")[:1])
+    return (
+        SearchVector("name", weight="A", config=SEARCH_CONFIG)
+        + SearchVector(category_name, weight="B", config=SEARCH_CONFIG)
+        + SearchVector("location", weight="B", config=SEARCH_CONFIG)
+        + SearchVector("description", weight="C", config=SEARCH_CONFIG)
+    )
+
+
+def _terms(keyword):
+    return re.findall(r"\w+", keyword)
+
+
+def _fts_match_expression(keyword):
+    # Quote every term so user input can't break FTS5 query syntax, and make the
+    # last one a prefix so "conf" finds "conference" as the user types.
+    terms = _terms(keyword)
+    if not terms:
+        return None
+    quoted = ['"%s"' % term for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def _tsquery_expression(keyword):
+    # The same query for to_tsquery(): every term has to match, the last one as a prefix
+    terms = _terms(keyword)
+    if not terms:
+        return None
+    return " & ".join(terms[:-1] + [f"{terms[-1]}:*"])
+
+
+class _FtsRank(Func):
+    """The event's FTS5 score for a MATCH expression, negated so that higher is better like on Postgres."""
+
+    output_field = FloatField()
+
+    def __init__(self, match):
+        # The id goes through the compiler, so the event table's alias is right inside subqueries too
+        super().__init__(Value(match), F("id"))
+
+    def as_sql(self, compiler, connection):
+        (match_sql, match_params), (id_sql, id_params) = (
+            compiler.compile(expression) for expression in self.get_source_expressions()
+        )
+        weights = ", ".join(str(weight) for weight in FTS_WEIGHTS)
+        sql = (
+            f"(SELECT -bm25({FTS_TABLE}, {weights}) FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH {match_sql} AND rowid = {id_sql})"
+        )
+        return sql, [*match_params, *id_params]
+
+
+def _sqlite_reindex(where="", params=()):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {FTS_TABLE} WHERE rowid IN (SELECT e.id FROM events_event e {where})", params
+        )
+        cursor.execute(
+            f"""INSERT INTO {FTS_TABLE} (rowid, name, description, location, category)
+                SELECT e.id, e.name, e.description, e.location, COALESCE(c.name, '')
+                FROM events_event e LEFT JOIN events_category c ON c.id = e.category_id {where}""",
+            params,
+        )
+
+
+def index_event(event):
+    backend = _backend()
+    if backend == "postgresql":
+        Event.objects.filter(pk=event.pk).update(search_vector=event_document())
+    elif backend == "sqlite":
+        _sqlite_reindex("WHERE e.id = %s", [event.pk])
+
+
+def index_category(category):
+    """Category names are part of the document, so renaming one re-indexes its events."""
+    backend = _backend()
+    if backend == "postgresql":
+        Event.objects.filter(category=category).update(search_vector=event_document())
+    elif backend == "sqlite":
+        _sqlite_reindex("WHERE e.category_id = %s", [category.pk])
+
+
+def unindex_event(event_id):
+    if _backend() == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [event_id])
+
+
+def rebuild_index():
+    backend = _backend()
+    if backend == "postgresql":
+        Event.objects.update(search_vector=event_document())
+    elif backend == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        _sqlite_reindex()
+    return backend
+
+
+def search_events(queryset, keyword):
+    """
+    Filter an Event queryset down to the events matching `keyword`, best match first.
+    Matching events are annotated with `rank` (higher is better).
+    """
+    keyword = (keyword or "").strip()
+    if not keyword:
+        return queryset
+
+    backend = _backend()
+    if backend == "postgresql":
+        expression = _tsquery_expression(keyword)
+        if expression is None:
+            return queryset.none()
+        query = SearchQuery(expression, config=SEARCH_CONFIG, search_type="raw")
+        return (
+            queryset.filter(search_vector=query)
+            # ts_rank() is a real, as a double its value round-trips through the page cursors
+            .annotate(rank=Cast(SearchRank(F("search_vector"), query), FloatField()))
+            .order_by(*RANK_ORDERING)
+        )
+
+    if backend == "sqlite":
+        match = _fts_match_expression(keyword)
+        if match is None:
+            return queryset.none()
+        matched_ids = RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", (match,))
+        return (
+            queryset.filter(id__in=matched_ids)
+            .annotate(rank=_FtsRank(match))
+            .order_by(*RANK_ORDERING)
+        )
+
+    return queryset.filter(Q(name__icontains=keyword) | Q(location__icontains=keyword))
+
+
+def keyset_ordering(queryset, default):
+    """The keyset ordering to page `queryset` on: best match first for ranked search results."""
+    return RANK_ORDERING if "rank" in queryset.query.annotations else default
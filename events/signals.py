@@ -1,8 +1,10 @@
 from django.dispatch import receiver
-from django.db.models.signals import post_save
-from events.models import RSVP
-from django.core.mail import send_mail
-from django.conf import settings
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.db.models import F, QuerySet
+from django.db.models.functions import Greatest, Now
+from events.models import RSVP, Event, Category, EventImage, User
+from events import rsvps, search, stats
+from core.outbox import enqueue_email
 
 @receiver(post_save, sender=RSVP)
 def send_confirmation_email(sender, instance, created, **kwargs):
@@ -11,8 +13,95 @@ def send_confirmation_email(sender, instance, created, **kwargs):
         message = f'Hi {instance.user.username},\n\nYou have created a new rsvp for the event {instance.event.name}'
         recipient_list = [instance.user.email]
 
-        try:
-            send_mail(subject, message,
-                      settings.EMAIL_HOST_USER, recipient_list)
-        except Exception as e:
-            print(f"Failed to send email to {instance.email}: {str(e)}")
+        # Queued in the RSVP's transaction, sent by the send_outbox_emails worker
+        enqueue_email(subject, message, recipient_list)
+
+# RSVP counter maintenance
+def _adjust_rsvp_count(event_id, delta):
+    Event.objects.filter(pk=event_id).update(rsvp_count=Greatest(F('rsvp_count') + delta, 0), updated_at=Now())
+
+@receiver(post_save, sender=RSVP)
+def update_rsvp_count_on_save(sender, instance, created, **kwargs):
+    previous_event_id = getattr(instance, '_loaded_event_id', None)
+    if instance.status != RSVP.CONFIRMED:
+        # Waitlisted RSVPs don't hold a seat
+        pass
+    elif created:
+        _adjust_rsvp_count(instance.event_id, 1)
+    elif previous_event_id is not None and previous_event_id != instance.event_id:
+        # RSVP moved to another event
+        _adjust_rsvp_count(previous_event_id, -1)
+        _adjust_rsvp_count(instance.event_id, 1)
+        rsvps.promote_waitlist(previous_event_id)
+    instance._loaded_event_id = instance.event_id
+
+def _deleted_directly(origin):
+    # False for RSVPs going with their event or their user, see the User handlers below
+    if origin is None:
+        return True
+    return isinstance(origin, RSVP) or (isinstance(origin, QuerySet) and origin.model is RSVP)
+
+@receiver(post_delete, sender=RSVP)
+def update_rsvp_count_on_delete(sender, instance, origin=None, **kwargs):
+    if instance.status == RSVP.CONFIRMED and _deleted_directly(origin):
+        _adjust_rsvp_count(instance.event_id, -1)
+        # The freed seat goes to the waitlist
+        rsvps.promote_waitlist(instance.event_id)
+
+@receiver(pre_delete, sender=User)
+def remember_rsvp_events(sender, instance, **kwargs):
+    # The user's RSVPs are deleted with them, their events are recounted once afterwards
+    instance._rsvp_event_ids = list(
+        RSVP.objects.filter(user=instance, status=RSVP.CONFIRMED).values_list("event_id", flat=True)
+    )
+
+@receiver(post_delete, sender=User)
+def recount_rsvps_after_user_delete(sender, instance, **kwargs):
+    event_ids = getattr(instance, "_rsvp_event_ids", None)
+    if not event_ids:
+        return
+    Event.objects.filter(pk__in=event_ids).refresh_rsvp_counts()
+    for event_id in Event.objects.filter(pk__in=event_ids, waitlist=True).values_list("id", flat=True):
+        rsvps.promote_waitlist(event_id)
+    stats.invalidate(stats.RSVP_STATS)
+
+# Search index maintenance
+@receiver(post_save, sender=Event)
+def update_event_search_index(sender, instance, **kwargs):
+    search.index_event(instance)
+
+@receiver(post_delete, sender=Event)
+def remove_event_search_index(sender, instance, **kwargs):
+    search.unindex_event(instance.pk)
+
+@receiver(post_save, sender=Category)
+def update_category_search_index(sender, instance, created, **kwargs):
+    if not created:
+        search.index_category(instance)
+
+# The cover image is part of the event for the page validators (events/conditional.py)
+@receiver(post_save, sender=EventImage)
+@receiver(post_delete, sender=EventImage)
+def touch_event_on_image_change(sender, instance, **kwargs):
+    Event.objects.filter(pk=instance.event_id).touch()
+
+# Dashboard statistics
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def invalidate_event_stats(sender, instance, **kwargs):
+    stats.invalidate(stats.EVENT_STATS)
+
+@receiver(post_save, sender=RSVP)
+def count_rsvp_in_stats(sender, instance, created, **kwargs):
+    if created and instance.status == RSVP.CONFIRMED:
+        stats.adjust('rsvp_count', 1)
+
+@receiver(post_delete, sender=Event)
+def invalidate_rsvp_stats(sender, instance, **kwargs):
+    # Its RSVPs go with it without adjusting the counter
+    stats.invalidate(stats.RSVP_STATS)
+
+@receiver(post_delete, sender=RSVP)
+def uncount_rsvp_in_stats(sender, instance, origin=None, **kwargs):
+    if instance.status == RSVP.CONFIRMED and _deleted_directly(origin):
+        stats.adjust('rsvp_count', -1)
@@ -0,0 +1,68 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
+from django.contrib.auth import get_user_model
+from django.utils.timezone import localdate
+
+from core import metrics
+from events.models import Event
+
+# Dashboard figures, cached per day.
+# The date is part of every key, so past/upcoming roll over on their own at midnight.
+# RSVP and user signals adjust their counters in place with cache.incr(); event changes
+# drop the event figures, which are recomputed (with everything else) on the next hit.
+# With the default per-process LocMemCache other workers only see a change once their
+# copy expires, so DASHBOARD_STATS_TIMEOUT bounds the staleness; use a shared cache
+# backend to make invalidation immediate everywhere.
+
+EVENT_STATS = ("total_events", "past_events", "upcoming_events")
+RSVP_STATS = ("rsvp_count",)
+USER_STATS = ("total_users",)
+ALL_STATS = EVENT_STATS + RSVP_STATS + USER_STATS
+
+
+def _timeout():
+    return getattr(settings, "DASHBOARD_STATS_TIMEOUT", 300)
+
+
+def _key(name):
+    return f"dashboard_stats:{localdate().isoformat()}:{name}"
+
+
+def compute_dashboard_stats():
+    today = localdate()
+    stats = Event.objects.aggregate(
+        total_events=Count('id'),
+        past_events=Count('id', filter=Q(event_date__lt=today)),
+        upcoming_events=Count('id', filter=Q(event_date__gt=today)),
+        rsvp_count=Coalesce(Sum('rsvp_count'), 0),
+    )
+    stats["total_users"] = get_user_model().objects.count()
+    return stats
+
+
+def get_dashboard_stats():
+    keys = {name: _key(name) for name in ALL_STATS}
+    cached = cache.get_many(keys.values())
+    metrics.cache_lookup("dashboard_stats", len(cached) == len(keys))
+    if len(cached) == len(keys):
+        stats = {name: cached[key] for name, key in keys.items()}
+    else:
+        stats = compute_dashboard_stats()
+        cache.set_many({keys[name]: stats[name] for name in ALL_STATS}, _timeout())
+    # Every RSVP is one participation, the organizer dashboard labels it that way
+    stats["total_participants"] = stats["rsvp_count"]
+    return stats
+
+
+def adjust(name, delta):
+    try:
+        cache.incr(_key(name), delta)
+    except ValueError:
+        # Not cached right now, the next read computes it from the database
+        pass
+
+
+def invalidate(names=ALL_STATS):
+    cache.delete_many([_key(name) for name in names])
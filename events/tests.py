@@ -1,3 +1,659 @@
-from django.test import TestCase
+import io
+import shutil
+import tempfile
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from PIL import Image
+
+from core import benchmark
+from core.models import OutboxEmail
+from core.querybudget import capture_queries
+from core.testing import QueryBudgetMixin
+from events import api, images, rsvp_import, rsvps, search, stats
+from events.rsvp_import import import_rsvps, import_rsvps_csv
+from events.search import search_events
+from events.images import VARIANT_FORMATS, VARIANT_WIDTHS
+from events.models import Event, EventImage, RSVP
+from events.uploads import save_event_images
+from events.views import BrowseEventsView
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    @property
+    def budget_urls(self):
+        event = Event.objects.order_by("id").first()
+        organizers = ["Organizer", "Admin"]
+        return [
+            ("/events/browse_event/", benchmark.ROLES),
+            ("/events/dashboard/organizer", organizers),
+            ("/events/dashboard/organizer?type=total_participants", organizers),
+            (f"/events/event_detail/?id={event.pk}", organizers),
+            ("/events/participants/", organizers),
+            ("/events/view_task/", organizers),
+            ("/events/api/events/", ["anonymous"]),
+            ("/events/api/categories/", ["anonymous"]),
+        ]
+
+
+class APITests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        benchmark.seed(users=5, events=7, rsvps=10, images=1)
+
+    def walk(self, url, limit):
+        ids = []
+        while url:
+            data = self.client.get(url).json()
+            self.assertEqual(set(data), {"results", "next", "previous"})
+            self.assertLessEqual(len(data["results"]), limit)
+            ids += [row["id"] for row in data["results"]]
+            url = data["next"]
+        return ids
+
+    def test_pages_walk_every_event_once(self):
+        expected = list(Event.objects.order_by("event_date", "id").values_list("id", flat=True))
+        self.assertEqual(self.walk("/events/api/events/?limit=3", 3), expected)
+
+    def test_search_filters(self):
+        event = Event.objects.order_by("id").first()
+        rows = self.client.get(
+            f"/events/api/events/?type=search&location={event.location}&start_date={event.event_date}&fields=location,date"
+        ).json()["results"]
+        expected = Event.objects.filter(location__icontains=event.location, event_date__gt=event.event_date).count()
+        self.assertEqual(len(rows), expected)
+        self.assertTrue(all(row["location"] == event.location and row["date"] > str(event.event_date) for row in rows))
+
+    def rank_events(self):
+        events = list(Event.objects.order_by("id"))[:5]
+        for i, event in enumerate(events):
+            # Two events per relevance level, ties go by id
+            event.name = "Festival " * (i // 2 + 1)
+            event.save()
+        return events
+
+    def test_search_pages_in_rank_order(self):
+        events = self.rank_events()
+        ids = self.walk("/events/api/events/?type=search&keyword=festival&limit=2", 2)
+        self.assertEqual(ids, list(search_events(Event.objects.all(), "festival").values_list("id", flat=True)))
+        self.assertEqual(sorted(ids), sorted(event.pk for event in events))
+        self.assertEqual(ids[0], events[4].pk)
+
+    def test_browse_search_pages_in_rank_order(self):
+        self.rank_events()
+        ids = []
+        query = "type=search&keyword=festival"
+        with mock.patch.object(BrowseEventsView, "paginate_by", 2):
+            while query:
+                page = self.client.get(f"/events/browse_event/?{query}").context["page_obj"]
+                self.assertLessEqual(len(page), 2)
+                ids += [event.pk for event in page]
+                query = page.next_query
+        self.assertEqual(ids, list(search_events(Event.objects.all(), "festival").values_list("id", flat=True)))
+
+    def test_previous_page(self):
+        first = self.client.get("/events/api/events/?limit=3").json()
+        self.assertIsNone(first["previous"])
+        second = self.client.get(first["next"]).json()
+        self.assertEqual(self.client.get(second["previous"]).json()["results"], first["results"])
+
+    def test_default_fields(self):
+        row = self.client.get("/events/api/events/").json()["results"][0]
+        self.assertEqual(list(row), list(api.EVENT_DEFAULT_FIELDS))
+
+    def test_chosen_fields(self):
+        event = Event.objects.order_by("event_date", "id").first()
+        data = self.client.get("/events/api/events/?fields=id,capacity,cover_image").json()
+        self.assertEqual(list(data["results"][0]), ["id", "capacity", "cover_image"])
+        self.assertEqual(data["results"][0]["id"], event.pk)
+        self.assertTrue(data["results"][0]["cover_image"].endswith(".png"))
+
+    def test_unknown_field(self):
+        response = self.client.get("/events/api/events/?fields=id,password")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("password", response.json()["error"])
+
+    def test_limit_is_capped(self):
+        self.assertEqual(api.per_page({"limit": "100000"}), api.MAX_PER_PAGE)
+        self.assertEqual(api.per_page({"limit": "x"}), api.PER_PAGE)
+
+    def test_detail(self):
+        event = Event.objects.first()
+        data = self.client.get(f"/events/api/events/{event.pk}/?fields=id,name").json()
+        self.assertEqual(data, {"id": event.pk, "name": event.name})
+        self.assertEqual(self.client.get("/events/api/events/0/").status_code, 404)
+
+    def test_categories(self):
+        data = self.client.get("/events/api/categories/?fields=name,event_count").json()
+        self.assertEqual(sum(row["event_count"] for row in data["results"]), Event.objects.count())
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        benchmark.seed(users=1, events=3, rsvps=0, images=0)
+
+    def setUp(self):
+        self.first, self.second, self.third = Event.objects.order_by("id")
+
+    def found(self, keyword):
+        return list(search_events(Event.objects.all(), keyword).values_list("id", flat=True))
+
+    def test_last_word_is_a_prefix(self):
+        self.first.name = "Jazz conference"
+        self.first.save()
+        self.assertEqual(self.found("jazz conf"), [self.first.pk])
+        # Only the last word
+        self.assertEqual(self.found("conf jazz"), [])
+        self.assertEqual(search._tsquery_expression("Jazz, conf!"), "Jazz & conf:*")
+        self.assertEqual(search._fts_match_expression("Jazz, conf!"), '"Jazz" "conf"*')
+
+    def test_name_outranks_description(self):
+        self.first.description = "Bring your saxophone"
+        self.first.save()
+        self.second.name = "Saxophone night"
+        self.second.save()
+        self.assertEqual(self.found("saxophone"), [self.second.pk, self.first.pk])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.first.name = "Chess club"
+        self.first.save()
+        self.assertEqual(self.found("chess"), [self.first.pk])
+
+        self.first.name = "Go club"
+        self.first.save()
+        self.assertEqual(self.found("chess"), [])
+
+        self.first.delete()
+        self.assertEqual(self.found("go club"), [])
+
+    def test_index_follows_category_rename(self):
+        category = self.first.category
+        category.name = "Astronomy"
+        category.save()
+        self.assertEqual(
+            sorted(self.found("astronomy")), sorted(Event.objects.filter(category=category).values_list("id", flat=True))
+        )
+
+    def test_fallback_without_full_text_search(self):
+        self.first.name = "Pottery workshop"
+        self.first.save()
+        with mock.patch("events.search._backend", return_value=None):
+            self.assertEqual(self.found("pottery"), [self.first.pk])
+            self.assertEqual(search.keyset_ordering(search_events(Event.objects.all(), "pottery"), ("id",)), ("id",))
+
+
+class DashboardStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        benchmark.seed(users=4, events=3, rsvps=0, images=0)
+        cls.users = list(get_user_model().objects.filter(username__startswith="bench_user_").order_by("id"))
+
+    def setUp(self):
+        stats.invalidate()
+        self.event = Event.objects.order_by("id").first()
+
+    def assert_current(self, queries=0):
+        """The cached figures match the database, and reading them took `queries` queries."""
+        with self.assertNumQueries(queries):
+            cached = stats.get_dashboard_stats()
+        fresh = stats.compute_dashboard_stats()
+        self.assertEqual({name: cached[name] for name in fresh}, fresh)
+
+    def test_cached_after_first_read(self):
+        self.assert_current(queries=2)
+        self.assert_current()
+
+    def test_rsvps_adjust_the_cached_count(self):
+        self.assert_current(queries=2)
+        rsvps.claim_seat(self.event.pk, self.users[0])
+        RSVP.objects.create(event=self.event, user=self.users[1])
+        self.assert_current()
+        RSVP.objects.get(event=self.event, user=self.users[0]).delete()
+        self.assert_current()
+
+    def test_event_changes_drop_the_figures(self):
+        self.assert_current(queries=2)
+        self.event.event_date = self.event.event_date.replace(year=self.event.event_date.year - 50)
+        self.event.save()
+        self.assert_current(queries=2)
+
+        rsvps.claim_seat(self.event.pk, self.users[0])
+        self.event.delete()
+        self.assert_current(queries=2)
+
+    def test_users_adjust_the_cached_count(self):
+        self.assert_current(queries=2)
+        user = get_user_model().objects.create_user("counted", "counted@example.com", "pw")
+        self.assert_current()
+        user.delete()
+        self.assert_current()
+
+    def test_import_drops_the_rsvp_count(self):
+        self.assert_current(queries=2)
+        import_rsvps([[user.username, str(self.event.pk)] for user in self.users])
+        self.assert_current(queries=2)
+
+
+def png(name="photo.png", width=800, height=600):
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), "orange").save(buffer, "PNG")
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+
+def use_temporary_media(test):
+    """Store uploads in a FileSystemStorage under a temporary MEDIA_ROOT for the test."""
+    media = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, media)
+    storages = {**settings.STORAGES, "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"}}
+    override = test.settings(STORAGES=storages, MEDIA_ROOT=media)
+    override.enable()
+    test.addCleanup(override.disable)
+    return EventImage._meta.get_field("image").storage
+
+
+class ImageVariantTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        benchmark.seed(users=1, events=1, rsvps=0, images=0)
+        cls.event = Event.objects.get()
+
+    def setUp(self):
+        self.storage = use_temporary_media(self)
+
+    def assertVariants(self, image, widths):
+        self.assertEqual(set(image.variants), set(VARIANT_FORMATS))
+        for fmt, names in image.variants.items():
+            self.assertEqual(names.keys(), {str(width) for width in widths})
+            for name in names.values():
+                self.assertTrue(self.storage.exists(name), name)
+
+    def test_bulk_upload(self):
+        created = save_event_images(self.event, [png("a.png"), png("b.png", width=2000, height=1000)])
+        self.assertEqual(len(created), 2)
+        stored = EventImage.objects.filter(event=self.event).order_by("id")
+        # Never wider than the original
+        self.assertVariants(stored[0], (320, 640))
+        self.assertVariants(stored[1], VARIANT_WIDTHS)
+
+    def test_model_save(self):
+        image = EventImage.objects.create(event=self.event, image=png(width=100, height=50))
+        # Smaller than every width: only the thumbnail
+        self.assertVariants(image, (320,))
+        self.assertIn("320w", image.srcset_webp)
+
+    def test_not_an_image(self):
+        upload = SimpleUploadedFile("notes.png", b"not an image", content_type="image/png")
+        with self.assertLogs("events.images", "WARNING"):
+            image = EventImage.objects.create(event=self.event, image=upload)
+        self.assertEqual(image.variants, {})
+
+    def test_generate_image_variants(self):
+        name = self.storage.save("occavue_images/old.png", png())
+        image = EventImage.objects.create(event=self.event, image=name)
+        self.assertEqual(image.variants, {})
+        call_command("generate_image_variants", stdout=io.StringIO())
+        image.refresh_from_db()
+        self.assertVariants(image, (320, 640))
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        benchmark.seed(users=5, events=30, rsvps=10, images=1)
+
+    def get(self, path, etag=None):
+        headers = {"HTTP_IF_NONE_MATCH": etag} if etag else {}
+        return self.client.get(path, **headers)
+
+    def test_unchanged_page_is_not_modified(self):
+        etag = self.get("/events/browse_event/")["ETag"]
+        self.assertEqual(self.get("/events/browse_event/", etag).status_code, 304)
+
+    def test_image_change_on_the_page(self):
+        path = "/events/api/events/?limit=5&fields=id,cover_image"
+        etag = self.get(path)["ETag"]
+        first = Event.objects.order_by("event_date", "id").first()
+        EventImage.objects.filter(event=first).delete()
+        self.assertEqual(self.get(path, etag).status_code, 200)
+
+    def test_change_on_another_page(self):
+        path = "/events/api/events/?limit=5"
+        etag = self.get(path)["ETag"]
+        last = Event.objects.order_by("event_date", "id").last()
+        Event.objects.filter(pk=last.pk).update(name="Renamed", updated_at=last.updated_at + timedelta(days=1))
+        self.assertEqual(self.get(path, etag).status_code, 304)
+
+    def test_validators_leave_images_out(self):
+        with capture_queries() as log:
+            self.get("/events/api/events/", 'W/"stale"')
+        self.assertFalse([sql for sql in log.statements if "events_eventimage" in sql])
+
+
+class DirectUploadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        benchmark.seed(users=1, events=1, rsvps=0, images=0)
+        cls.event = Event.objects.get()
+        cls.organizer = get_user_model().objects.get(username=benchmark.bench_username("Organizer"))
+
+    def setUp(self):
+        self.storage = use_temporary_media(self)
+        self.client.force_login(self.organizer)
+
+    def ticket(self, event):
+        return self.client.post(
+            "/events/uploads/ticket/", {"kind": "event_image", "event": event, "content_type": "image/png", "size": png().size}
+        )
+
+    def upload(self, ticket):
+        response = self.client.post("/events/uploads/local/", {"ticket": ticket["ticket"], "file": png()})
+        self.assertEqual(response.status_code, 200)
+        return self.client.post("/events/uploads/complete/", {"ticket": ticket["ticket"]})
+
+    def test_upload(self):
+        response = self.upload(self.ticket(self.event.pk).json())
+        self.assertEqual(response.status_code, 200)
+        image = EventImage.objects.get(event=self.event, pk=response.json()["id"])
+        self.assertEqual(set(image.variants), set(VARIANT_FORMATS))
+        for name in images.variant_names(image.variants):
+            self.assertTrue(self.storage.exists(name))
+
+    def test_not_an_image(self):
+        ticket = self.ticket(self.event.pk).json()
+        fake = SimpleUploadedFile("photo.png", b"x" * png().size, content_type="image/png")
+        response = self.client.post("/events/uploads/local/", {"ticket": ticket["ticket"], "file": fake})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(self.storage.exists(ticket["name"]))
+
+        # Written to the storage some other way, the callback rejects it too
+        self.storage.save(ticket["name"], ContentFile(b"x" * 100))
+        response = self.client.post("/events/uploads/complete/", {"ticket": ticket["ticket"]})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(self.storage.exists(ticket["name"]))
+        self.assertFalse(EventImage.objects.filter(event=self.event).exists())
+
+    def test_bad_event_id(self):
+        for event in ("x", "", "0", "1.5"):
+            with self.subTest(event=event):
+                response = self.ticket(event)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {"error": "Event images need an event."})
+
+    @override_settings(EVENT_IMAGE_MAX_COUNT=1)
+    def test_limit_checked_again_on_completion(self):
+        # Both tickets are issued while the event has no image yet
+        first, second = self.ticket(self.event.pk).json(), self.ticket(self.event.pk).json()
+        self.assertEqual(self.upload(first).status_code, 200)
+        response = self.upload(second)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(EventImage.objects.filter(event=self.event).count(), 1)
+        self.assertFalse(self.storage.exists(second["name"]))
+        # A replayed callback still finds its image
+        self.assertEqual(self.client.post("/events/uploads/complete/", {"ticket": first["ticket"]}).status_code, 200)
+
+
+class CapacityTests(TestCase):
+    """The admin paths that add RSVPs keep to the event's capacity too."""
+
+    @classmethod
+    def setUpTestData(cls):
+        benchmark.seed(users=5, events=1, rsvps=0, images=0)
+        cls.event = Event.objects.get()
+        cls.users = list(get_user_model().objects.filter(username__startswith="bench_user_").order_by("id"))
+
+    def full_event(self, waitlist):
+        Event.objects.filter(pk=self.event.pk).update(capacity=2, waitlist=waitlist)
+
+    def assert_seats(self, confirmed, waitlisted):
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.rsvp_count, confirmed)
+        statuses = Counter(RSVP.objects.filter(event=self.event).values_list("status", flat=True))
+        self.assertEqual(statuses, +Counter({RSVP.CONFIRMED: confirmed, RSVP.WAITLISTED: waitlisted}))
+
+    def test_import_rejects_overflow(self):
+        self.full_event(waitlist=False)
+        result = import_rsvps([[user.username, str(self.event.pk)] for user in self.users])
+        self.assertEqual(result, {"inserted": 2, "waitlisted": 0, "duplicates": 0, "full": 3, "invalid": 0})
+        self.assert_seats(confirmed=2, waitlisted=0)
+
+    def test_import_waitlists_overflow(self):
+        self.full_event(waitlist=True)
+        rsvps.claim_seat(self.event.pk, self.users[0])
+        result = import_rsvps([[user.username, str(self.event.pk)] for user in self.users])
+        self.assertEqual(result, {"inserted": 4, "waitlisted": 3, "duplicates": 1, "full": 0, "invalid": 0})
+        self.assert_seats(confirmed=2, waitlisted=3)
+
+    def test_form_keeps_to_capacity(self):
+        self.full_event(waitlist=False)
+        client = Client()
+        client.force_login(get_user_model().objects.get(username=benchmark.bench_username("Admin")))
+        for user in self.users:
+            client.post("/events/add_participant/", {"user": user.pk, "event": self.event.pk})
+        self.assert_seats(confirmed=2, waitlisted=0)
+
+        self.full_event(waitlist=True)
+        client.post("/events/add_participant/", {"user": self.users[-1].pk, "event": self.event.pk})
+        self.assert_seats(confirmed=2, waitlisted=1)
+
+
+class RSVPImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        benchmark.seed(users=4, events=2, rsvps=0, images=0)
+        cls.users = list(get_user_model().objects.filter(username__startswith="bench_user_").order_by("id"))
+
+    def setUp(self):
+        self.first, self.second = Event.objects.order_by("id")
+
+    def assert_counts_match_rsvps(self):
+        for event in Event.objects.with_actual_rsvp_count():
+            self.assertEqual(event.rsvp_count, event.actual_rsvp_count)
+
+    def test_csv(self):
+        RSVP.objects.create(event=self.first, user=self.users[0])
+        csv_file = io.StringIO(
+            "user,event\n"
+            f"{self.users[0].username},{self.first.pk}\n"  # already RSVP'd
+            f"{self.users[1].email},{self.first.pk}\n"  # by email
+            f"{self.users[1].username},{self.first.pk}\n"  # the same pair again
+            "\n"
+            f"{self.users[2].username},{self.second.pk}\n"
+            f"nobody,{self.first.pk}\n"
+            f"{self.users[3].username},0\n"
+            f"{self.users[3].username},abc\n"
+            f"{self.users[3].username}\n"
+        )
+        result = import_rsvps_csv(csv_file, batch_size=2)
+        self.assertEqual(result, {"inserted": 2, "waitlisted": 0, "duplicates": 2, "full": 0, "invalid": 4})
+        self.assertEqual(
+            set(RSVP.objects.values_list("event_id", "user_id")),
+            {(self.first.pk, self.users[0].pk), (self.first.pk, self.users[1].pk), (self.second.pk, self.users[2].pk)},
+        )
+        self.assert_counts_match_rsvps()
+        self.assertEqual(OutboxEmail.objects.count(), 1 + 2)
+
+    def test_pair_claimed_while_importing(self):
+        insert = rsvp_import._insert_rsvps
+
+        def racing(rows):
+            # The user clicks RSVP between the import's duplicate check and its INSERT
+            rsvps.claim_seat(self.first.pk, self.users[0])
+            return insert(rows)
+
+        with mock.patch("events.rsvp_import._insert_rsvps", racing):
+            result = import_rsvps([[user.username, str(self.first.pk)] for user in self.users[:2]])
+        self.assertEqual(result, {"inserted": 1, "waitlisted": 0, "duplicates": 1, "full": 0, "invalid": 0})
+        self.assertEqual(RSVP.objects.filter(event=self.first).count(), 2)
+        self.assert_counts_match_rsvps()
+
+    def test_command(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = f"{directory}/rsvps.csv"
+        with open(path, "w") as f:
+            f.write(f"{self.users[0].username},{self.first.pk}\nnobody,{self.first.pk}\n")
+        out = io.StringIO()
+        call_command("import_rsvps", path, stdout=out)
+        self.assertIn("Inserted 1 RSVP(s)", out.getvalue())
+        self.assertIn("1 invalid row(s)", out.getvalue())
+
+
+class RSVPCounterTests(TestCase):
+    """events.signals keeps Event.rsvp_count in step with the confirmed RSVPs."""
+
+    @classmethod
+    def setUpTestData(cls):
+        benchmark.seed(users=6, events=3, rsvps=0, images=0)
+        cls.users = list(get_user_model().objects.filter(username__startswith="bench_user_").order_by("id"))
+
+    def setUp(self):
+        self.first, self.second, self.third = Event.objects.order_by("id")
+
+    def counts(self):
+        return list(Event.objects.order_by("id").values_list("rsvp_count", flat=True))
+
+    def assert_counts_match_rsvps(self):
+        actual = list(Event.objects.order_by("id").with_actual_rsvp_count().values_list("actual_rsvp_count", flat=True))
+        self.assertEqual(self.counts(), actual)
+
+    def test_move_to_another_event(self):
+        Event.objects.filter(pk=self.first.pk).update(capacity=1, waitlist=True)
+        rsvps.claim_seat(self.first.pk, self.users[0])
+        rsvps.claim_seat(self.first.pk, self.users[1])
+        self.assertEqual(self.counts(), [1, 0, 0])
+
+        rsvp = RSVP.objects.get(event=self.first, user=self.users[0])
+        rsvp.event = self.second
+        rsvp.save()
+        # The seat it left goes to the waitlist
+        self.assertEqual(RSVP.objects.get(event=self.first, user=self.users[1]).status, RSVP.CONFIRMED)
+        self.assertEqual(self.counts(), [1, 1, 0])
+
+        # Saving it again without a move changes nothing
+        rsvp.save()
+        self.assertEqual(self.counts(), [1, 1, 0])
+        self.assert_counts_match_rsvps()
+
+    def delete_queries(self, rsvp_count):
+        event = Event.objects.create(
+            name="Doomed", description="", event_date=self.first.event_date, event_time=self.first.event_time,
+            location="", organizer=self.first.organizer,
+        )
+        for user in self.users[:rsvp_count]:
+            rsvps.claim_seat(event.pk, user)
+        with capture_queries() as log:
+            event.delete()
+        return log.count
+
+    def test_event_delete_does_not_recount_per_rsvp(self):
+        self.assertEqual(self.delete_queries(2), self.delete_queries(6))
+
+    def test_user_delete_recounts_their_events(self):
+        Event.objects.filter(pk=self.first.pk).update(capacity=1, waitlist=True)
+        leaving, waiting = self.users[0], self.users[1]
+        for event in (self.first, self.second, self.third):
+            rsvps.claim_seat(event.pk, leaving)
+        rsvps.claim_seat(self.first.pk, waiting)
+        rsvps.claim_seat(self.second.pk, self.users[2])
+        self.assertEqual(self.counts(), [1, 2, 1])
+
+        leaving.delete()
+
+        self.assertEqual(self.counts(), [1, 1, 0])
+        self.assertEqual(RSVP.objects.get(event=self.first, user=waiting).status, RSVP.CONFIRMED)
+        self.assert_counts_match_rsvps()
+
+
+class ConcurrentRSVPTests(TransactionTestCase):
+    """RSVP bursts on one event from several threads, each with its own connection."""
+
+    capacity = 10
+    threads = 8
+
+    def setUp(self):
+        if connection.vendor == "sqlite" and connection.is_in_memory_db():
+            # Threads share an in-memory database, where a busy table fails at once
+            self.skipTest("needs a database file or a server, set TEST NAME")
+        benchmark.seed(users=30, events=1, rsvps=0, images=0)
+        self.event = Event.objects.get()
+        Event.objects.filter(pk=self.event.pk).update(capacity=self.capacity, waitlist=True)
+        self.users = list(get_user_model().objects.filter(username__startswith="bench_user_").order_by("id"))
+
+    def in_threads(self, func, items):
+        results = Counter()
+        errors = []
+        start = threading.Barrier(self.threads)
+
+        def worker(chunk):
+            start.wait()
+            try:
+                for item in chunk:
+                    try:
+                        results[func(item)] += 1
+                    except Exception as e:
+                        errors.append(e)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.threads) as pool:
+            list(pool.map(worker, [items[i::self.threads] for i in range(self.threads)]))
+        self.assertEqual(errors, [])
+        return results
+
+    def statuses(self):
+        return Counter(RSVP.objects.filter(event=self.event).values_list("status", flat=True))
+
+    def test_never_overbooked(self):
+        # Every user clicks twice
+        results = self.in_threads(lambda user: rsvps.claim_seat(self.event.pk, user), self.users * 2)
+
+        self.assertEqual(results[RSVP.CONFIRMED], self.capacity)
+        self.assertEqual(results[RSVP.WAITLISTED], len(self.users) - self.capacity)
+        self.assertEqual(results[rsvps.DUPLICATE], len(self.users))
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.rsvp_count, self.capacity)
+        self.assertEqual(self.statuses()[RSVP.CONFIRMED], self.capacity)
+
+    def test_waitlist_moves_up_in_order(self):
+        self.in_threads(lambda user: rsvps.claim_seat(self.event.pk, user), self.users)
+        waiting = list(
+            RSVP.objects.filter(event=self.event, status=RSVP.WAITLISTED).order_by("id").values_list("id", flat=True)
+        )
+
+        cancelled = list(RSVP.objects.filter(event=self.event, status=RSVP.CONFIRMED)[:3])
+        for rsvp in cancelled:
+            rsvp.delete()
+
+        promoted = RSVP.objects.filter(pk__in=waiting, status=RSVP.CONFIRMED).values_list("id", flat=True)
+        self.assertEqual(sorted(promoted), waiting[:3])
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.rsvp_count, self.capacity)
+        self.assertEqual(self.statuses(), {RSVP.CONFIRMED: self.capacity, RSVP.WAITLISTED: len(waiting) - 3})
+
+    def test_import_and_clicks_never_overbook(self):
+        if connection.vendor == "sqlite":
+            # No select_for_update, the import's read-then-write transactions collide
+            self.skipTest("needs row locks")
+        # Half the users click RSVP while the other half are imported one row at a time
+        def rsvp(user):
+            if user.pk % 2:
+                return rsvps.claim_seat(self.event.pk, user)
+            return import_rsvps([[user.username, str(self.event.pk)]])["waitlisted"] and RSVP.WAITLISTED or RSVP.CONFIRMED
+
+        results = self.in_threads(rsvp, self.users)
+
+        self.assertEqual(results[RSVP.CONFIRMED], self.capacity)
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.rsvp_count, self.capacity)
+        self.assertEqual(self.statuses(), {RSVP.CONFIRMED: self.capacity, RSVP.WAITLISTED: len(self.users) - self.capacity})
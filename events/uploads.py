@@ -0,0 +1,88 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+
+from events.images import collect_variants, render_variants
+from events.models import Event, EventImage
+
+# Event image uploads.
+# Every stored file (an original or one of its resized variants) is a network round-trip
+# to remote storage, so the files of one form submission are pushed side by side on a
+# small thread pool, then all the EventImage rows are inserted with a single bulk_create.
+# The threads only talk to the storage, never to the database.
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_WORKERS = 8
+
+
+def max_images():
+    return getattr(settings, "EVENT_IMAGE_MAX_COUNT", 10)
+
+
+def max_image_size():
+    return getattr(settings, "EVENT_IMAGE_MAX_SIZE", 10 * 1024 * 1024)
+
+
+def upload_errors(files, existing=0):
+    """Messages for a batch of uploads that is too big, empty list when it's fine."""
+    errors = []
+    if existing + len(files) > max_images():
+        errors.append(f"An event can have at most {max_images()} images.")
+    limit_mb = max_image_size() // (1024 * 1024)
+    for f in files:
+        if f.size > max_image_size():
+            errors.append(f"{f.name} is larger than {limit_mb} MB.")
+    return errors
+
+
+def _store_original(instance, upload):
+    field = instance.image.field
+    name = field.storage.save(field.generate_filename(instance, upload.name), upload)
+    return name, render_variants(name, upload)
+
+
+def save_event_images(event, files, workers=UPLOAD_WORKERS):
+    """Upload `files` for `event` concurrently and insert their EventImage rows in one query."""
+    if not files:
+        return []
+    storage = EventImage._meta.get_field("image").storage
+    instances = [EventImage(event=event) for _ in files]
+    stored = []
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(files) * 7))) as pool:
+            originals = [pool.submit(_store_original, instance, upload) for instance, upload in zip(instances, files)]
+            variant_futures = []
+            for instance, future in zip(instances, originals):
+                instance.image, rendered = future.result()
+                stored.append(instance.image.name)
+                variant_futures.append([
+                    (fmt, width, pool.submit(storage.save, target, ContentFile(data)))
+                    for fmt, width, target, data in rendered
+                ])
+            for instance, futures in zip(instances, variant_futures):
+                saved = [(fmt, width, future.result()) for fmt, width, future in futures]
+                stored.extend(name for _, _, name in saved)
+                instance.variants = collect_variants(saved)
+
+        with transaction.atomic():
+            created = EventImage.objects.bulk_create(instances)
+            # bulk_create skips the signal that does this
+            Event.objects.filter(pk=event.pk).touch()
+            return created
+    except Exception:
+        # Don't leave half of a submission behind in storage
+        _delete_stored(storage, stored)
+        raise
+
+
+def _delete_stored(storage, names):
+    for name in names:
+        try:
+            storage.delete(name)
+        except Exception:
+            logger.warning("Could not delete %s after a failed upload", name)
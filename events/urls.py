@@ -1,11 +1,13 @@
 from django.urls import path
-from events.views import dashboard, create_event, show_event_detail, show_events, update_event, delete_event, show_participants, add_rsvp_using_form, add_rsvp_on_button_click, update_rsvp, delete_rsvp, update_user, delete_user, category, add_category, update_category, delete_category, browse_events, CreateEventView, BrowseEventsView, DeleteEventView
+from events.views import dashboard, create_event, show_event_detail, show_events, update_event, delete_event, show_participants, add_rsvp_using_form, add_rsvp_on_button_click, update_rsvp, delete_rsvp, update_user, delete_user, category, add_category, update_category, delete_category, browse_events, CreateEventView, BrowseEventsView, DeleteEventView, export_events, export_rsvps, import_rsvps, upload_ticket, upload_local, upload_complete, api_events, api_event, api_categories, ashow_event_detail, abrowse_events
+from django.conf import settings
 
 urlpatterns = [
     path('dashboard/organizer', dashboard, name='organizer-dashboard'),
     # path('dashboard/admin', dashboard, name='admin-dashboard'),
     path('create_event/', CreateEventView.as_view(), name='create-event'),
     path('add_participant/', add_rsvp_using_form, name='add-participant'),
+    path('import_participants/', import_rsvps, name='import-rsvps'),
     path('add_rsvp/', add_rsvp_on_button_click, name='add-rsvp'),
     path('add_category/', add_category, name='add-category'),
     path('update_event/<int:id>/', update_event, name='update-event'),
@@ -17,10 +19,19 @@ urlpatterns = [
     path('delete_category/<int:id>/', delete_category, name='delete-category'),
     path('delete_rsvp/<int:id>/', delete_rsvp, name='delete-rsvp'),
     path('view_task/', show_events, name='view-task'),
-    path('event_detail/', show_event_detail, name='event-detail'),
+    path('event_detail/', ashow_event_detail if settings.ASYNC_VIEWS else show_event_detail, name='event-detail'),
     path('participants/', show_participants, name='participants'),
     path('category/', category, name='category'),
-    path('browse_event/', BrowseEventsView.as_view(), name='browse-event'),
+    path('browse_event/', abrowse_events if settings.ASYNC_VIEWS else BrowseEventsView.as_view(), name='browse-event'),
+    path('export/events/', export_events, name='export-events'),
+    path('export/rsvps/', export_rsvps, name='export-rsvps'),
+    path('export/rsvps/<int:event_id>/', export_rsvps, name='export-event-rsvps'),
+    path('uploads/ticket/', upload_ticket, name='direct-upload-ticket'),
+    path('uploads/local/', upload_local, name='direct-upload-local'),
+    path('uploads/complete/', upload_complete, name='direct-upload-complete'),
+    path('api/events/', api_events, name='api-events'),
+    path('api/events/<int:id>/', api_event, name='api-event'),
+    path('api/categories/', api_categories, name='api-categories'),
     # path('search_events/', search_events, name='search-events'),
     # path('search_form/', search_form, name='search-form'),
 ]
\ No newline at end of file
@@ -1,11 +1,28 @@
+import io
 from django.shortcuts import render, redirect
 from django.urls import reverse_lazy
-from events.forms import EventModelForm, EventImageForm, CategoryModelForm, RSVPModelForm
+from events.forms import EventModelForm, EventImageForm, CategoryModelForm, RSVPModelForm, RSVPImportForm
 from django.contrib.auth.forms import UserChangeForm
 from events.models import Event, Category, EventImage, RSVP
+from events.search import keyset_ordering, search_events
+from events.conditional import conditional_page, event_page_validators, event_detail_validators
+from events.stats import get_dashboard_stats
+from events.filters import event_filters
+from events.exports import stream_export, EVENT_COLUMNS, RSVP_COLUMNS
+from events.rsvp_import import import_rsvps_csv
+from events.uploads import save_event_images
+from events import api, rsvps
+from events import direct_uploads
+from events.direct_uploads import UploadError
+from core.pagination import paginate, KeysetPaginationMixin, KeysetPaginator, AFTER_PARAM, BEFORE_PARAM
+from core.asyncviews import arender, async_user_passes_test
+from core.querybudget import query_budget
+from core.replicas import read_replica
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required, user_passes_test
-from django.db.models import Count, Sum, Q
+from django.views.decorators.http import require_POST
+from django.http import Http404, JsonResponse
+from django.db.models import Sum
 from django.views.generic.edit import CreateView
 from django.views.generic.list import ListView
 from django.views.generic import DeleteView
@@ -13,6 +30,7 @@ from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.utils.decorators import method_decorator
 from django.utils.timezone import localdate
 from users.views import is_admin
+from users.roles import has_role
 from users.forms import CustomUserChangeForm
 from django.contrib.auth import get_user_model
 
@@ -22,30 +40,27 @@ User = get_user_model()
 
 # test functions
 def is_organizer(user):
-    return user.groups.filter(name='Organizer').exists()
+    return has_role(user, 'Organizer')
 
 def organizer_or_admin(user):
-    roles = set(user.groups.values_list("name", flat=True))
-    return "Admin" in roles or "Organizer" in roles
+    return has_role(user, "Admin", "Organizer")
 
+@query_budget(7)
 @user_passes_test(organizer_or_admin, login_url='no-permission')
 def category(request):
     categories = Category.objects.all().order_by('id')
     context = {"categories":categories}
     return render(request, "Category/category.html", context)
 
+@query_budget(10)
+@read_replica
 @user_passes_test(is_organizer, login_url='no-permission')
 def dashboard(request):
     type = request.GET.get('type', 'today')
-    counts = Event.objects.aggregate(
-        total_events=Count('id', distinct=True),
-        past_events=Count('id', filter=Q(event_date__lt=localdate()), distinct=True),
-        upcoming_events=Count('id', filter=Q(event_date__gt=localdate()), distinct=True),
-        total_participants=Count('participants', distinct=True),
-    )
+    counts = get_dashboard_stats()
 
     # Retriving event data
-    base_query = Event.objects.select_related('category', 'organizer').prefetch_related('participants','images')
+    base_query = Event.objects.select_related('category').with_cover_image()
     participants=[]
     if type == 'past_events':
         events = base_query.filter(event_date__lt=localdate())
@@ -54,10 +69,9 @@ def dashboard(request):
         events = base_query.filter(event_date__gt=localdate())
         title = "Upcoming Events"
     elif type == 'total_participants':
-        participants = Event.objects.select_related("organizer").annotate(total_rsvps=Count('rsvp'))
+        participants = Event.objects.select_related("organizer")
         events = []
         title = "Participants"
-        print("hi:", participants)
     elif type == 'all':
         events = base_query.all()
         title = "All Events"
@@ -65,27 +79,15 @@ def dashboard(request):
         events = base_query.filter(event_date=localdate())
         title = "Today's Events"
     elif type == 'search':
-        category = request.GET.get('category')
-        start_date = request.GET.get('start_date')
-        end_date = request.GET.get('end_date')
-        location = request.GET.get('location')
-        filters = Q()
-        if category:
-            filters &= Q(category__name__icontains=category)
-        if location:
-            filters &= Q(location__icontains=location)
-        if start_date and end_date:
-            filters &= Q(event_date__range=[start_date, end_date]) 
-        if start_date and not end_date:
-            filters &= Q(event_date__gt=start_date)
-        if not start_date and end_date:
-            filters &= Q(event_date__lt=end_date)
-
-        events = base_query.filter(filters)
+        events = base_query.filter(event_filters(request.GET))
         title = "Search Results"
 
-    for event in events:
-        event.first_image = event.images.all()[0] if event.images.all() else None
+    if type == 'total_participants':
+        page = paginate(request, participants, ("event_date", "id"))
+        participants = page.object_list
+    else:
+        page = paginate(request, events, ("event_date", "id"))
+        events = page.object_list
 
     # category retrieval
     categories = Category.objects.all()
@@ -93,6 +95,7 @@ def dashboard(request):
     context = {
         "title": title,
         "events": events,
+        "page_obj": page,
         "counts": counts,
         "participants": participants,
         "participant_headers": ["Name", "Organized By", "Total RSVPs"],
@@ -100,6 +103,7 @@ def dashboard(request):
     }
     return render(request, "dashboard/organizer_dashboard.html", context)
 
+@query_budget(7)
 @user_passes_test(organizer_or_admin, login_url='no-permission')
 def create_event(request):
     event_form = EventModelForm()
@@ -107,18 +111,13 @@ def create_event(request):
     if request.method == "POST":
         event_form = EventModelForm(request.POST, request.FILES)
         image_form = EventImageForm(request.POST, request.FILES)
-        if event_form.is_valid():
+        if event_form.is_valid() and image_form.is_valid():
 
             """ For Model Form Data """
             event = event_form.save(commit=False)
-            print('organizer:',event.organizer," | ",request.user)
             event.organizer = request.user
             event.save()
-            print('organizer-after:',event.organizer," | ",request.user)
-            images = request.FILES.getlist("image")
-            for img in images:
-                image_instance = EventImage(image=img, event=event)
-                image_instance.save()
+            save_event_images(event, image_form.cleaned_data["image"])
 
             messages.success(request, "Event Created Successfully")
             return redirect('create-event')
@@ -128,6 +127,7 @@ def create_event(request):
 
 @method_decorator(user_passes_test(organizer_or_admin, login_url="no-permission"), name="dispatch")
 class CreateEventView(LoginRequiredMixin, CreateView):
+    query_budget = 7
     model = Event
     form_class = EventModelForm
     template_name = "event_form.html"
@@ -140,13 +140,14 @@ class CreateEventView(LoginRequiredMixin, CreateView):
         return context
 
     def form_valid(self, form):
+        image_form = EventImageForm(self.request.POST, self.request.FILES)
+        if not image_form.is_valid():
+            return self.render_to_response(self.get_context_data(form=form, image_form=image_form))
+
         event = form.save(commit=False)
         event.organizer = self.request.user
         event.save()
-
-        images = self.request.FILES.getlist("image")
-        for img in images:
-            EventImage.objects.create(image=img, event=event)
+        save_event_images(event, image_form.cleaned_data["image"])
 
         messages.success(self.request, "Event Created Successfully")
         return redirect("create-event")
@@ -155,33 +156,68 @@ class CreateEventView(LoginRequiredMixin, CreateView):
         context = self.get_context_data(form=form, image_form=EventImageForm(self.request.POST, self.request.FILES))
         return self.render_to_response(context)
 
+@query_budget(8)
 @user_passes_test(is_admin, login_url='no-permission')
 def add_rsvp_using_form(request):
     form = RSVPModelForm()
     if request.method == "POST":
         form = RSVPModelForm(request.POST)
-        if form.is_valid():            
-            form.save()
-            messages.success(request, "Participant added successfully!")
+        if form.is_valid():
+            # Takes a seat the same way the RSVP button does, so a full event isn't overbooked
+            result = rsvps.claim_seat(form.cleaned_data["event"].pk, form.cleaned_data["user"])
+            level, message = PARTICIPANT_MESSAGES[result]
+            messages.add_message(request, level, message)
         else:
             messages.warning(request, "The user has already RSVP'd for this event.")
-            print(form.errors)
         return redirect('add-participant')
     context = {"form": form, "form_title":"Add New Participant"}
     return render(request, "event_form.html", context)
 
+@query_budget(6)
+@user_passes_test(is_admin, login_url='no-permission')
+def import_rsvps(request):
+    form = RSVPImportForm()
+    if request.method == "POST":
+        form = RSVPImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            upload = io.TextIOWrapper(form.cleaned_data["file"].file, encoding="utf-8-sig", newline="")
+            try:
+                result = import_rsvps_csv(upload)
+            except UnicodeDecodeError:
+                messages.warning(request, "The file is not a UTF-8 CSV.")
+            else:
+                messages.success(request, f"Imported {result['inserted']} RSVP(s) ({result['waitlisted']} on a waitlist), skipped {result['duplicates']} duplicate(s), {result['full']} for full events and {result['invalid']} invalid row(s).")
+            return redirect('import-rsvps')
+    context = {"form": form, "form_title":"Import Participants"}
+    return render(request, "event_form.html", context)
+
+RSVP_MESSAGES = {
+    RSVP.CONFIRMED: (messages.SUCCESS, "You have successfully RSVP'd."),
+    RSVP.WAITLISTED: (messages.INFO, "The event is full, you are on the waitlist."),
+    rsvps.DUPLICATE: (messages.WARNING, "You already RSVP'd for this event."),
+    rsvps.FULL: (messages.WARNING, "Sorry, this event is full."),
+    rsvps.MISSING: (messages.WARNING, "This event doesn't exist anymore."),
+}
+
+PARTICIPANT_MESSAGES = {
+    RSVP.CONFIRMED: (messages.SUCCESS, "Participant added successfully!"),
+    RSVP.WAITLISTED: (messages.INFO, "The event is full, the participant is on the waitlist."),
+    rsvps.DUPLICATE: (messages.WARNING, "The user has already RSVP'd for this event."),
+    rsvps.FULL: (messages.WARNING, "The event is full and has no waitlist."),
+    rsvps.MISSING: (messages.WARNING, "This event doesn't exist anymore."),
+}
+
+@query_budget(4)
 @login_required
 def add_rsvp_on_button_click(request):
     if request.method == "POST":
-        form = RSVPModelForm(request.POST)
-        if form.is_valid():
-            form.save() 
-            messages.success(request, "You have successfully RSVP'd.")
-        else:
-            messages.warning(request, "You already RSVP'd for this event.")
-            print(form.errors)
-    return redirect(request.headers.get("REFERER"))
+        event_id = request.POST.get("event", "")
+        result = rsvps.claim_seat(int(event_id), request.user) if event_id.isdigit() else rsvps.MISSING
+        level, message = RSVP_MESSAGES[result]
+        messages.add_message(request, level, message)
+    return redirect(request.headers.get("REFERER") or "home")
 
+@query_budget(6)
 @user_passes_test(organizer_or_admin, login_url='no-permission')
 def add_category(request):
     form = CategoryModelForm()
@@ -199,30 +235,32 @@ def add_category(request):
     return render(request, "event_form.html", context)
 
 # Update Event
+@query_budget(9)
 @user_passes_test(organizer_or_admin, login_url='no-permission')
 def update_event(request, id):
-    event = Event.objects.prefetch_related("participants", "images").get(id=id)
+    event = Event.objects.get(id=id)
     images = event.images.all()
     image_form = EventImageForm()
     
     if request.method == "POST":
         event_form = EventModelForm(request.POST, instance=event)
-        if event_form.is_valid():
+        image_form = EventImageForm(request.POST, request.FILES, event=event)
+        if event_form.is_valid() and image_form.is_valid():
 
             """ For Model Form Data """
             event = event_form.save()
-            new_images = request.FILES.getlist("image")
-            for img in new_images:
-                image_instance = EventImage(image=img, event=event)
-                image_instance.save()
+            save_event_images(event, image_form.cleaned_data["image"])
+            # More seats, or a waitlist that was just turned on
+            rsvps.promote_waitlist(event.id)
 
             messages.success(request, "Event updated successfully!")
             return redirect('update-event', id)
     else: 
         event_form = EventModelForm(instance=event)
-    context = {"form": event_form,"image_form": image_form, "images":images, "form_title":"Update Event"}
+    context = {"event": event, "form": event_form,"image_form": image_form, "images":images, "form_title":"Update Event"}
     return render(request, "event_form.html", context)
 
+@query_budget(10)
 @user_passes_test(is_admin, login_url='no-permission')
 def update_user(request, id):
     user = User.objects.get(pk=id)
@@ -240,6 +278,7 @@ def update_user(request, id):
     context = {"form": form, "form_title":"Update Participant Info"}
     return render(request, "event_form.html", context)
 
+@query_budget(7)
 @user_passes_test(organizer_or_admin, login_url='no-permission')
 def update_category(request, id):
     category = Category.objects.get(id=id)
@@ -257,6 +296,7 @@ def update_category(request, id):
     context = {"form": form, "form_title":"Update Category"}
     return render(request, "event_form.html", context)
 
+@query_budget(9)
 @user_passes_test(is_admin, login_url='no-permission')
 def update_rsvp(request, id):
     rsvp = RSVP.objects.get(id=id)
@@ -276,12 +316,11 @@ def update_rsvp(request, id):
 
 
 # Delete Event
+@query_budget(6)
 @user_passes_test(organizer_or_admin, login_url='no-permission')
 def delete_event(request, id):
-    print("hello del!")
     if request.method == "POST":
         event = Event.objects.get(id=id)
-        print(event)
         event.delete()
         messages.success(request, "Event deleted successfully.")
     else:
@@ -290,6 +329,7 @@ def delete_event(request, id):
 
 @method_decorator(user_passes_test(organizer_or_admin, login_url="no-permission"), name="dispatch")
 class DeleteEventView(DeleteView):
+    query_budget = 6
     model = Event
     template_name = "info.html" 
     
@@ -304,6 +344,7 @@ class DeleteEventView(DeleteView):
         messages.error(request, "Something went wrong!")
         return render(request, self.template_name)
 
+@query_budget(6)
 @user_passes_test(is_admin, login_url='no-permission')
 def delete_user(request, id):
     if request.method == "POST":
@@ -314,6 +355,7 @@ def delete_user(request, id):
         messages.error(request, 'Something went wrong!')
     return render(request, "info.html")
 
+@query_budget(6)
 @user_passes_test(organizer_or_admin, login_url='no-permission')
 def delete_category(request, id):
     if request.method == "POST":
@@ -324,6 +366,7 @@ def delete_category(request, id):
         messages.error(request, 'Something went wrong!')
     return render(request, "info.html")
 
+@query_budget(6)
 @user_passes_test(is_admin, login_url='no-permission')
 def delete_rsvp(request, id):
     if request.method == "POST":
@@ -336,100 +379,166 @@ def delete_rsvp(request, id):
 
 
 # Show Events
+@query_budget(6)
 def show_events(request):
-    events = Event.objects.annotate(
-        num_events=Count('event')).order_by('num_events')
-    return render(request, "show_events.html", {"event_list": events})
+    events = Event.objects.select_related('category').with_cover_image()
+    page = paginate(request, events, ("event_date", "id"))
+    return render(request, "show_events.html", {"events": page.object_list, "page_obj": page, "title": "Events"})
+
+PARTICIPANT_PREVIEW = 50
 
+def event_detail_page_validators(request):
+    id = request.GET.get('id', '')
+    return event_detail_validators(request, id) if id.isdigit() else None
+
+@query_budget(11)
 @user_passes_test(organizer_or_admin, login_url='no-permission')
+@conditional_page(event_detail_page_validators)
 def show_event_detail(request):
     id = request.GET.get('id')
-    event = Event.objects.prefetch_related('participants','images').get(pk=id)
-    context = {"detail": event}
+    event = Event.objects.select_related('category').get(pk=id)
+    # The event can have thousands of RSVPs, only list the first ones
+    participants = event.participants.filter(rsvp__status=RSVP.CONFIRMED).only('username', 'first_name', 'last_name', 'email').order_by('rsvp__id')[:PARTICIPANT_PREVIEW]
+    context = {
+        "detail": event,
+        "images": event.images.all(),
+        "participants": participants,
+        "more_participants": max(event.rsvp_count - PARTICIPANT_PREVIEW, 0),
+    }
     return render(request, "event_detail.html", context)
 
+@query_budget(11)
+@async_user_passes_test(organizer_or_admin, login_url='no-permission')
+@conditional_page(event_detail_page_validators)
+async def ashow_event_detail(request):
+    """Async version of show_event_detail, served when ASYNC_VIEWS is on."""
+    id = request.GET.get('id')
+    event = await Event.objects.select_related('category').aget(pk=id)
+    participants = event.participants.filter(rsvp__status=RSVP.CONFIRMED).only('username', 'first_name', 'last_name', 'email').order_by('rsvp__id')[:PARTICIPANT_PREVIEW]
+    context = {
+        "detail": event,
+        "images": [image async for image in event.images.aiterator()],
+        "participants": [user async for user in participants.aiterator()],
+        "more_participants": max(event.rsvp_count - PARTICIPANT_PREVIEW, 0),
+    }
+    return await arender(request, "event_detail.html", context)
+
 # Show RSVPs
+@query_budget(7)
+@read_replica
 @user_passes_test(is_admin, login_url='no-permission')
 def show_participants(request):
     rsvps = RSVP.objects.select_related("user", "event__category", "event__organizer")
     context = {"rsvp_list":rsvps}
     return render(request, "admin/participants_list.html", context)
 
+# Exports
+@query_budget(7)
+@user_passes_test(is_admin, login_url='no-permission')
+def export_events(request):
+    events = Event.objects.filter(event_filters(request.GET))
+    return stream_export(events, EVENT_COLUMNS, "events", request.GET.get("format", "csv"))
+
+@query_budget(7)
+@user_passes_test(is_admin, login_url='no-permission')
+def export_rsvps(request, event_id=None):
+    rsvps = RSVP.objects.filter(event_filters(request.GET, prefix="event__"))
+    filename = "rsvps"
+    if event_id is not None:
+        rsvps = rsvps.filter(event_id=event_id)
+        filename = f"event_{event_id}_rsvps"
+    return stream_export(rsvps, RSVP_COLUMNS, filename, request.GET.get("format", "csv"))
+
+# Direct uploads: ticket -> the browser uploads to storage -> callback
+@query_budget(6)
+@require_POST
+@login_required
+def upload_ticket(request):
+    kind = request.POST.get("kind")
+    event = None
+    if kind == direct_uploads.EVENT_IMAGE:
+        if not organizer_or_admin(request.user):
+            return JsonResponse({"error": "You don't have permission to upload event images."}, status=403)
+        event_id = request.POST.get("event", "")
+        event = Event.objects.filter(id=event_id).first() if event_id.isdigit() else None
+    try:
+        size = int(request.POST.get("size", 0))
+        ticket = direct_uploads.issue_ticket(request.user, kind, request.POST.get("content_type"), size, event=event)
+    except (ValueError, UploadError) as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return JsonResponse(ticket)
+
+@query_budget(6)
+@require_POST
+@login_required
+def upload_local(request):
+    # Storage emulator, only used when the media storage isn't Cloudinary
+    if not isinstance(direct_uploads.backend_for(direct_uploads.EVENT_IMAGE), direct_uploads.LocalBackend):
+        raise Http404
+    upload = request.FILES.get("file")
+    if upload is None:
+        return JsonResponse({"error": "No file was submitted."}, status=400)
+    try:
+        return JsonResponse(direct_uploads.store_local_upload(request.POST.get("ticket", ""), request.user, upload))
+    except UploadError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+@query_budget(8)
+@require_POST
+@login_required
+def upload_complete(request):
+    try:
+        result = direct_uploads.complete_upload(request.POST.get("ticket", ""), request.user, request.POST)
+    except UploadError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    if isinstance(result, EventImage):
+        return JsonResponse({"id": result.id, "url": result.image.url})
+    return JsonResponse({"url": result.profile_image.url})
+
+@query_budget(8)
 def browse_events(request):
     type = request.GET.get("type", "all")
-    base_query = Event.objects.select_related('category').prefetch_related('images')
+    base_query = Event.objects.select_related('category').with_cover_image()
 
     if type=="search":
         keyword = request.GET.get("keyword")
-        category = request.GET.get('category')
-        start_date = request.GET.get('start_date')
-        end_date = request.GET.get('end_date')
-        location = request.GET.get('location')
-        filters = Q()
-        if keyword:
-            filters &= Q(name__icontains=keyword)|Q(location__icontains=keyword)
-        if category:
-            filters &= Q(category__name__icontains=category)
-        if location:
-            filters &= Q(location__icontains=location)
-        if start_date and end_date:
-            filters &= Q(event_date__range=[start_date, end_date]) 
-        if start_date and not end_date:
-            filters &= Q(event_date__gt=start_date)
-        if not start_date and end_date:
-            filters &= Q(event_date__lt=end_date)
-
-        events = base_query.filter(filters)
+        events = search_events(base_query.filter(event_filters(request.GET)), keyword)
         title="Search result"
     else:
         events = base_query.all()
         title = "All Events"
-    for event in events:
-        event.first_image = event.images.all()[0] if event.images.all() else None
     categories = Category.objects.all()
     context = {"events":events, "categories":categories, "title": title}
     return render(request, "browse_events.html", context)
 
-class BrowseEventsView(ListView):
+def browse_events_queryset(params):
+    """The events BrowseEventsView lists for the query `params`, and the page title."""
+    if params.get("type", "all") == "search":
+        keyword = params.get("keyword")
+        return search_events(Event.objects.filter(event_filters(params)), keyword), "Search result"
+    return Event.objects.all(), "All Events"
+
+def browse_events_validators(request, *args, **kwargs):
+    events = browse_events_queryset(request.GET)[0]
+    return event_page_validators(
+        request, events, keyset_ordering(events, BrowseEventsView.keyset_ordering), BrowseEventsView.paginate_by
+    )
+
+@method_decorator(conditional_page(browse_events_validators), name="get")
+class BrowseEventsView(KeysetPaginationMixin, ListView):
+    query_budget = 9
+    read_replica = True
     model = Event
     template_name = "browse_events.html"
     context_object_name = "events"
+    keyset_ordering = ("event_date", "id")
 
     def get_queryset(self):
-        type = self.request.GET.get("type", "all")
-        base_query = Event.objects.select_related("category").prefetch_related("images")
-
-        if type == "search":
-            keyword = self.request.GET.get("keyword")
-            category = self.request.GET.get("category")
-            start_date = self.request.GET.get("start_date")
-            end_date = self.request.GET.get("end_date")
-            location = self.request.GET.get("location")
-
-            filters = Q()
-            if keyword:
-                filters &= Q(name__icontains=keyword) | Q(location__icontains=keyword)
-            if category:
-                filters &= Q(category__name__icontains=category)
-            if location:
-                filters &= Q(location__icontains=location)
-            if start_date and end_date:
-                filters &= Q(event_date__range=[start_date, end_date])
-            elif start_date:
-                filters &= Q(event_date__gt=start_date)
-            elif end_date:
-                filters &= Q(event_date__lt=end_date)
-
-            queryset = base_query.filter(filters)
-            self.title = "Search result"
-        else:
-            queryset = base_query.all()
-            self.title = "All Events"
+        queryset, self.title = browse_events_queryset(self.request.GET)
+        return queryset.select_related("category").with_cover_image()
 
-        for event in queryset:
-            event.first_image = event.images.first()
-
-        return queryset
+    def get_keyset_ordering(self, queryset):
+        return keyset_ordering(queryset, self.keyset_ordering)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -437,6 +546,71 @@ class BrowseEventsView(ListView):
         context["title"] = getattr(self, "title", "All Events")
         return context
 
+class AsyncBrowseEventsView(BrowseEventsView):
+    """Async version of BrowseEventsView, served when ASYNC_VIEWS is on."""
+
+    async def get(self, request, *args, **kwargs):
+        self.object_list = self.get_queryset()
+        paginator = KeysetPaginator(self.object_list, self.get_keyset_ordering(self.object_list), self.paginate_by)
+        page = await paginator.aget_page(
+            after=request.GET.get(AFTER_PARAM), before=request.GET.get(BEFORE_PARAM), querydict=request.GET
+        )
+        context = {
+            "paginator": paginator,
+            "page_obj": page,
+            "is_paginated": page.has_other_pages(),
+            "object_list": page.object_list,
+            self.context_object_name: page.object_list,
+            "categories": [category async for category in Category.objects.aiterator()],
+            "title": self.title,
+            "view": self,
+        }
+        return await arender(request, self.template_name, context)
+
+# method_decorator can't wrap async methods before Django 5.0, decorate the view function instead
+abrowse_events = conditional_page(browse_events_validators)(AsyncBrowseEventsView.as_view())
+
+# JSON API
+API_EVENT_ORDERING = ("event_date", "id")
+
+def api_events_validators(request):
+    events = browse_events_queryset(request.GET)[0]
+    return event_page_validators(
+        request, events, keyset_ordering(events, API_EVENT_ORDERING), api.per_page(request.GET)
+    )
+
+@query_budget(5)
+@conditional_page(api_events_validators)
+def api_events(request):
+    try:
+        fields = api.parse_fields(request.GET, api.EVENT_FIELDS, api.EVENT_DEFAULT_FIELDS)
+    except api.FieldError as e:
+        return api.error_response(str(e))
+    events, _ = browse_events_queryset(request.GET)
+    ordering = keyset_ordering(events, API_EVENT_ORDERING)
+    return api.list_response(request, api.event_queryset(events, fields), fields, api.EVENT_FIELDS, ordering)
+
+def api_event_validators(request, id):
+    return event_detail_validators(request, id)
+
+@query_budget(6)
+@conditional_page(api_event_validators)
+def api_event(request, id):
+    try:
+        fields = api.parse_fields(request.GET, api.EVENT_FIELDS, api.EVENT_DEFAULT_FIELDS)
+    except api.FieldError as e:
+        return api.error_response(str(e))
+    return api.detail_response(api.event_queryset(Event.objects.filter(pk=id), fields), fields, api.EVENT_FIELDS)
+
+@query_budget(4)
+def api_categories(request):
+    try:
+        fields = api.parse_fields(request.GET, api.CATEGORY_FIELDS, api.CATEGORY_DEFAULT_FIELDS)
+    except api.FieldError as e:
+        return api.error_response(str(e))
+    categories = api.category_queryset(Category.objects.all(), fields)
+    return api.list_response(request, categories, fields, api.CATEGORY_FIELDS, ("id",))
+
 # search form
 # def search_form(request):
 #     categories = Category.objects.all()
@@ -0,0 +1,97 @@
+import uuid
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user
+from django.core.cache import cache
+from django.utils.crypto import constant_time_compare
+
+from core import metrics
+
+# Cached request.user.
+# The signed-in user is pickled into the cache under their id, next to the session auth
+# hash it was loaded for, together with their role names (`_cached_roles`) when the
+# request that loaded them needed them. A request whose session carries the same hash
+# gets the user from there instead of from the database. Only GET/HEAD requests fill
+# the cache, form submissions may change the user while they run. Every user also has
+# a generation token in the cache, which forget_users() replaces whenever the user row
+# is saved (profile edits, password changes, last_login) or deleted, and when their
+# roles change (users.roles.invalidate_roles). Entries are stamped with the token read
+# before the user was loaded and only match while it is current, so a request that
+# loaded the user before a change can't put the old copy back. A password change also
+# changes the hash, so other sessions can't match the entry.
+# The entries are only dropped in the cache the current process talks to, so this is off
+# (enabled() is False) unless the default cache is shared by every process (REDIS_URL).
+
+
+# Backends whose entries live inside one process
+PROCESS_LOCAL_CACHES = {"django.core.cache.backends.locmem.LocMemCache"}
+
+
+def enabled():
+    return settings.CACHES["default"]["BACKEND"] not in PROCESS_LOCAL_CACHES
+
+
+def _key(user_id):
+    return f"auth_user:{user_id}"
+
+
+def _generation_key(user_id):
+    return f"auth_user_generation:{user_id}"
+
+
+def _new_generation():
+    return uuid.uuid4().hex
+
+
+def _timeout():
+    return getattr(settings, "AUTH_USER_CACHE_TIMEOUT", 300)
+
+
+def get_cached_user(request):
+    session = request.session
+    user_id = session.get(SESSION_KEY)
+    backend_path = session.get(BACKEND_SESSION_KEY)
+    session_hash = session.get(HASH_SESSION_KEY)
+    if user_id is None or not session_hash or backend_path not in settings.AUTHENTICATION_BACKENDS:
+        return get_user(request)
+
+    values = cache.get_many([_key(user_id), _generation_key(user_id)])
+    entry = values.get(_key(user_id))
+    generation = values.get(_generation_key(user_id))
+    hit = (
+        entry is not None
+        and generation is not None
+        and entry[1] == generation
+        and constant_time_compare(entry[0], session_hash)
+    )
+    metrics.cache_lookup("auth_user", hit)
+    if hit:
+        user = entry[2]
+        user.backend = backend_path
+        return user
+
+    if generation is None:
+        cache.add(_generation_key(user_id), _new_generation(), timeout=None)
+        generation = cache.get(_generation_key(user_id))
+    user = get_user(request)
+    if user.is_authenticated and generation is not None:
+        # Stored once the response is ready (remember_user), with the roles the request loaded
+        request._uncached_user = user
+        request._user_generation = generation
+    return user
+
+
+def remember_user(request):
+    user = getattr(request, "_uncached_user", None)
+    if user is None or request.method not in ("GET", "HEAD"):
+        return
+    # get_user() may have rotated the session's hash, cache under the current one
+    session_hash = request.session.get(HASH_SESSION_KEY)
+    if not session_hash or str(request.session.get(SESSION_KEY)) != str(user.pk):
+        return
+    cache.set(_key(user.pk), (session_hash, request._user_generation, user), _timeout())
+
+
+def forget_users(user_ids):
+    cache.set_many({_generation_key(user_id): _new_generation() for user_id in user_ids}, timeout=None)
+    cache.delete_many([_key(user_id) for user_id in user_ids])
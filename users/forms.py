@@ -3,6 +3,7 @@ from django.contrib.auth.forms import UserCreationForm, UserChangeForm, Authenti
 from django.contrib.auth.models import Group, Permission
 import re
 from events.forms import StyledFormMixin
+from core.autocomplete import RemoteSelect, RemoteSelectMultiple
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -82,7 +83,7 @@ class CustomUserChangeForm(StyledFormMixin, UserChangeForm):
             queryset=Group.objects.only("name"),
             # empty_label="Select a Role",
             required=True,
-            widget=forms.Select(attrs={'class': 'form-select'})
+            widget=RemoteSelect('groups', attrs={'class': 'form-select'})
         )
         class Meta:
             model = User() 
@@ -114,8 +115,8 @@ class CustomUserChangeForm(StyledFormMixin, UserChangeForm):
 
 class CreateGroupForm(StyledFormMixin, forms.ModelForm):
     permissions = forms.ModelMultipleChoiceField(
-        queryset=Permission.objects.select_related("content_type").all(),
-        widget=forms.CheckboxSelectMultiple,
+        queryset=Permission.objects.all(),
+        widget=RemoteSelectMultiple('permissions'),
         required=False,
         label='Assign Permission'
     )
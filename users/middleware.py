@@ -0,0 +1,46 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.utils.functional import SimpleLazyObject
+
+from users import auth_cache
+from users.roles import session_scope
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """AuthenticationMiddleware that takes request.user from users.auth_cache when it can."""
+
+    def process_request(self, request):
+        super().process_request(request)
+        if auth_cache.enabled():
+            request.user = SimpleLazyObject(lambda: auth_cache.get_cached_user(request))
+
+    def process_response(self, request, response):
+        if auth_cache.enabled():
+            auth_cache.remember_user(request)
+        return response
+
+
+class RoleCacheMiddleware:
+    """
+    Lets users.roles cache the logged-in user's group names in their session.
+    Must come after SessionMiddleware and AuthenticationMiddleware.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with session_scope(getattr(request, "session", None)):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        # The context variable is copied into the threads sync_to_async runs code in
+        with session_scope(getattr(request, "session", None)):
+            return await self.get_response(request)
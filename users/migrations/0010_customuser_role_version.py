@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-18 19:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0009_alter_customuser_profile_image"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="customuser",
+            name="role_version",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.23 on 2026-10-18 19:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0010_customuser_role_version"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="customuser",
+            index=models.Index(fields=["email", "id"], name="user_email_sort_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="customuser",
+            index=models.Index(
+                fields=["first_name", "last_name", "id"], name="user_name_sort_idx"
+            ),
+        ),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser
 from phonenumber_field.modelfields import PhoneNumberField
 
@@ -9,6 +9,29 @@ class CustomUser(AbstractUser):
     profile_image = models.ImageField(
         upload_to='occavue_profile_images/', blank=True, default='media/occavue_profile_images/default_m4xs9f')
     phone = PhoneNumberField(blank=True)
+    # Bumped whenever the user's groups change, invalidates the roles cached in users.roles
+    role_version = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Sort orders of the admin users table (users/filters.py)
+            models.Index(fields=["email", "id"], name="user_email_sort_idx"),
+            models.Index(fields=["first_name", "last_name", "id"], name="user_name_sort_idx"),
+        ]
 
     def __str__(self):
         return self.username
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and not args and kwargs.get("update_fields") is None:
+            # role_version is only bumped with UPDATE statements (users.roles.invalidate_roles),
+            # writing back the copy loaded with the instance would undo a concurrent role change
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != "role_version"
+            ]
+        # post_save handlers queue the activation email and assign the default role,
+        # keep them in the same transaction as the user row
+        with transaction.atomic(using=kwargs.get("using")):
+            super().save(*args, **kwargs)
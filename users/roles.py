@@ -0,0 +1,75 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.contrib.auth import SESSION_KEY as AUTH_SESSION_KEY, get_user_model
+from django.db.models import F
+
+# Role (group name) resolution.
+# A user's group names are loaded once per request and cached on the user object, and
+# kept in the session between requests. The session copy is stamped with the user's
+# `role_version`, which users.signals bumps whenever their groups change, so a role
+# change made by an admin is picked up on that user's next request.
+
+ROLES_SESSION_KEY = "_user_roles"
+
+_current_session = ContextVar("current_session", default=None)
+
+
+def _session_for(user):
+    session = _current_session.get()
+    if session is None or str(session.get(AUTH_SESSION_KEY)) != str(user.pk):
+        return None
+    return session
+
+
+def get_roles(user):
+    if user is None or not user.is_authenticated:
+        return frozenset()
+
+    roles = getattr(user, "_cached_roles", None)
+    if roles is not None:
+        return roles
+
+    session = _session_for(user)
+    entry = session.get(ROLES_SESSION_KEY) if session is not None else None
+    if entry and entry.get("version") == user.role_version:
+        roles = frozenset(entry["roles"])
+    else:
+        roles = frozenset(user.groups.values_list("name", flat=True))
+        if session is not None:
+            session[ROLES_SESSION_KEY] = {"version": user.role_version, "roles": sorted(roles)}
+
+    user._cached_roles = roles
+    return roles
+
+
+def has_role(user, *names):
+    roles = get_roles(user)
+    return any(name in roles for name in names)
+
+
+def invalidate_roles(users=None, user_ids=None):
+    """Bump role_version for the given users so every cached copy of their roles is dropped."""
+    User = get_user_model()
+    ids = set(user_ids or [])
+    for user in users or []:
+        ids.add(user.pk)
+        user.__dict__.pop("_cached_roles", None)
+        # Keep the instance in step with the row, get_roles() compares against it
+        user.role_version += 1
+    if ids:
+        User.objects.filter(pk__in=ids).update(role_version=F("role_version") + 1)
+        # Imported here, users.auth_cache builds on this module
+        from users.auth_cache import forget_users
+
+        forget_users(ids)
+
+
+@contextmanager
+def session_scope(session):
+    """Let get_roles() cache into `session` for the duration of the block."""
+    token = _current_session.set(session)
+    try:
+        yield
+    finally:
+        _current_session.reset(token)
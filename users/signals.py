@@ -1,16 +1,18 @@
 from django.dispatch import receiver
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
 from django.contrib.auth.models import Group
 from django.contrib.auth.tokens import default_token_generator
-from django.core.mail import send_mail
+from core.outbox import enqueue_email
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from events import stats
+from users.roles import invalidate_roles
+from users.auth_cache import forget_users
 
 User = get_user_model()
 
 @receiver(post_save, sender=User)
 def send_activation_email(sender, instance, created, **kwargs):
-    print("actvation says:", created, "instance:", instance)
     if created:
         token = default_token_generator.make_token(instance)
         activation_url = f"{settings.FRONTEND_URL}/users/activate/{instance.id}/{token}/"
@@ -19,11 +21,8 @@ def send_activation_email(sender, instance, created, **kwargs):
         message = f'Hi {instance.username},\n\nPlease activate your account by clicking the link below:\n{activation_url}\n\nThank You!'
         recipient_list = [instance.email]
 
-        try:
-            send_mail(subject, message,
-                      settings.EMAIL_HOST_USER, recipient_list)
-        except Exception as e:
-            print(f"Failed to send email to {instance.email}: {str(e)}")
+        # Queued in the user's transaction, sent by the send_outbox_emails worker
+        enqueue_email(subject, message, recipient_list)
 
 @receiver(post_save, sender=User)
 def assign_role(sender, instance, created, **kwargs):
@@ -31,4 +30,34 @@ def assign_role(sender, instance, created, **kwargs):
         user_group, created = Group.objects.get_or_create(name='User')
         instance.groups.add(user_group)
         instance.save()
-        
\ No newline at end of file
+
+@receiver(post_save, sender=User)
+def count_user_in_stats(sender, instance, created, **kwargs):
+    if created:
+        stats.adjust('total_users', 1)
+
+@receiver(post_delete, sender=User)
+def uncount_user_in_stats(sender, instance, **kwargs):
+    stats.adjust('total_users', -1)
+
+# Cached request.user (users/auth_cache.py): profile edits, password changes, logins
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    forget_users([instance.pk])
+
+# Role cache invalidation
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_roles_on_group_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse and action in ("post_add", "post_remove", "post_clear"):
+        invalidate_roles(users=[instance])
+    elif reverse and action in ("post_add", "post_remove"):
+        invalidate_roles(user_ids=pk_set)
+    elif reverse and action == "pre_clear":
+        invalidate_roles(user_ids=instance.user_set.values_list("pk", flat=True))
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def invalidate_roles_on_group_rename(sender, instance, created=False, **kwargs):
+    if not created:
+        invalidate_roles(user_ids=instance.user_set.values_list("pk", flat=True))
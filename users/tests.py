@@ -1,3 +1,142 @@
-from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import QueryDict
+from django.test import RequestFactory, TestCase
 
-# Create your tests here.
+from core import benchmark
+from core.testing import QueryBudgetMixin
+from users import auth_cache
+from users.filters import NO_ROLE, sort_columns
+from users.roles import invalidate_roles
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    budget_urls = [
+        ("/users/user/dashboard/", ["User"]),
+        ("/users/admin/dashboard/", ["Admin"]),
+        ("/users/admin/dashboard/?type=rsvps", ["Admin"]),
+        ("/users/admin/events-list/", ["Admin"]),
+        ("/users/admin/group-list/", ["Admin"]),
+        ("/users/profile/", ["User", "Organizer", "Admin"]),
+    ]
+
+
+class AuthCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user("cached", "cached@example.com", "pw")
+        self.client.force_login(self.user)
+
+    def request(self):
+        request = RequestFactory().get("/")
+        request.session = self.client.session
+        # Read up front, so the assertNumQueries blocks only count the user's queries
+        request.session.items()
+        return request
+
+    def load(self, request=None):
+        request = request or self.request()
+        user = auth_cache.get_cached_user(request)
+        auth_cache.remember_user(request)
+        return user
+
+    def test_second_request_is_served_from_the_cache(self):
+        self.load()
+        request = self.request()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.load(request).pk, self.user.pk)
+
+    def test_change_while_loading_is_not_cached(self):
+        request = self.request()
+        auth_cache.get_cached_user(request)
+        # An admin changes the user's roles while the request runs
+        invalidate_roles(user_ids=[self.user.pk])
+        auth_cache.remember_user(request)
+
+        current = get_user_model().objects.get(pk=self.user.pk).role_version
+        self.assertEqual(self.load().role_version, current)
+        request = self.request()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.load(request).role_version, current)
+
+    def test_saving_the_user_forgets_them(self):
+        self.load()
+        get_user_model().objects.filter(pk=self.user.pk).update(first_name="Renamed")
+        self.user.refresh_from_db()
+        self.user.save()
+        self.assertEqual(self.load().first_name, "Renamed")
+
+
+class RoleVersionTests(TestCase):
+    def test_plain_save_keeps_a_concurrent_bump(self):
+        user = get_user_model().objects.create_user("editor", "editor@example.com", "pw")
+        stale = get_user_model().objects.get(pk=user.pk)
+        invalidate_roles(user_ids=[user.pk])
+
+        stale.first_name = "Edited"
+        stale.save()
+
+        fresh = get_user_model().objects.get(pk=user.pk)
+        self.assertEqual(fresh.first_name, "Edited")
+        self.assertEqual(fresh.role_version, stale.role_version + 1)
+
+
+class UserTableTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        benchmark.seed(users=20, events=0, rsvps=0, images=0)
+        User = get_user_model()
+        for i, user in enumerate(User.objects.filter(username__startswith="bench_user_").order_by("id")):
+            # Names and emails out of id order, with ties
+            User.objects.filter(pk=user.pk).update(first_name=f"First{i % 3}", email=f"{19 - i:02}@example.com")
+        cls.loner = User.objects.create_user("loner", "loner@example.com", "pw")
+        cls.loner.groups.clear()
+
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.get(username=benchmark.bench_username("Admin")))
+
+    def table(self, query):
+        """Every user the table lists for `query`, walking all its pages."""
+        rows = []
+        while query is not None:
+            page = self.client.get(f"/users/admin/dashboard/?{query}").context["page_obj"]
+            rows += [(user.pk, user.role) for user in page]
+            query = page.next_query or None
+        return rows
+
+    def expected(self, ordering, **filters):
+        users = get_user_model().objects.filter(**filters).order_by(*ordering)
+        return list(users.values_list("pk", flat=True))
+
+    def test_sorts(self):
+        for sort, ordering in [
+            ("", ("id",)),
+            ("email", ("email", "id")),
+            ("-email", ("-email", "-id")),
+            ("name", ("first_name", "last_name", "id")),
+            ("-username", ("-username", "-id")),
+            ("bogus", ("id",)),
+        ]:
+            with self.subTest(sort=sort):
+                self.assertEqual([pk for pk, _ in self.table(f"sort={sort}")], self.expected(ordering))
+
+    def test_sort_by_role(self):
+        rows = self.table("sort=role")
+        self.assertEqual(len(rows), get_user_model().objects.count())
+        self.assertEqual(rows, sorted(rows, key=lambda row: (row[1], row[0])))
+        self.assertIn((self.loner.pk, NO_ROLE), rows)
+
+    def test_filters(self):
+        self.assertEqual(
+            [pk for pk, _ in self.table("q=first1&sort=-id")],
+            self.expected(("-id",), first_name__icontains="first1"),
+        )
+        self.assertEqual([pk for pk, _ in self.table("role=Organizer")], self.expected(("id",), groups__name="Organizer"))
+        self.assertEqual(self.table(f"role={NO_ROLE}"), [(self.loner.pk, NO_ROLE)])
+
+    def test_sort_links_toggle(self):
+        columns = {column["label"]: column for column in sort_columns(QueryDict("sort=email&q=x&after=abc"))}
+        self.assertEqual(QueryDict(columns["Email"]["query"]).dict(), {"sort": "-email", "q": "x"})
+        self.assertEqual(columns["Email"]["direction"], "asc")
+        self.assertEqual(QueryDict(columns["Username"]["query"])["sort"], "username")
+        self.assertIsNone(columns["Action"]["query"])
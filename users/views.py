@@ -7,8 +7,9 @@ from django.urls import reverse_lazy
 from users.forms import CustomRegisterForm, LoginForm, CreateGroupForm, EditProfileForm, CustomPasswordChangeForm,CustomPasswordResetForm, CustomPasswordResetConfirmForm
 from django.contrib import messages
 from django.http import HttpResponse
-from django.db.models import Prefetch
-from events.models import Event, EventImage, RSVP, Category
+from events.models import Event, RSVP, Category
+from events.stats import get_dashboard_stats
+from events.filters import event_filters
 from django.db.models import Count, Q
 from django.utils.timezone import localdate
 from django.utils.safestring import mark_safe
@@ -17,10 +18,16 @@ from django.contrib.auth.views import PasswordChangeView, PasswordResetView, Pas
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.utils.decorators import method_decorator
 from django.contrib.auth import get_user_model
+from core.pagination import paginate, KeysetPaginationMixin
+from core.querybudget import query_budget
+from core.replicas import read_replica
+from users.roles import has_role
+from users.filters import user_table, sort_columns, NO_ROLE
 
 User = get_user_model()
 
 # Create your views here.
+@query_budget(6)
 def sign_up(request):
     if request.method == 'GET':
         form = CustomRegisterForm()
@@ -34,12 +41,11 @@ def sign_up(request):
             # messages.success(
             #     request, 'A Confirmation mail sent. Please check your email')
             # return redirect('sign-in')
-        else:
-            print("Form is not valid")
 
     return render(request, "registration/sign_up.html", {"form":form})
 
 class SignUpView(FormView):
+    query_budget = 6
     template_name = "registration/sign_up.html"
     form_class = CustomRegisterForm
     success_url = reverse_lazy("sign-in")
@@ -57,10 +63,7 @@ class SignUpView(FormView):
 
         return super().form_valid(form)
 
-    def form_invalid(self, form):
-        print("Form is not valid:", form.errors)
-        return super().form_invalid(form)
-
+@query_budget(6)
 def sign_in(request):
     if(request.method == 'GET'):
         form = LoginForm()
@@ -69,7 +72,6 @@ def sign_in(request):
         form = LoginForm(data=request.POST)
         if form.is_valid():
             user = form.get_user()
-            print("suer_cred:",user)
             login(request, user)
             return redirect('home')
         else:
@@ -77,13 +79,16 @@ def sign_in(request):
         
     return render(request, 'registration/sign_in.html', {"form": form})
 
+@query_budget(3)
 @login_required
 def sign_out(request):
     if(request.method == 'POST'):
         logout(request)
         return redirect('sign-in')
+    return redirect('home')
 
 # User account activation
+@query_budget(6)
 def activate_user(request, user_id, token):
     try:
         user = User.objects.get(id=user_id)
@@ -99,37 +104,23 @@ def activate_user(request, user_id, token):
 
 # Test functions  
 def is_admin(user):
-    return user.groups.filter(name='Admin').exists()
+    return has_role(user, 'Admin')
 
 def is_user(user):
-    return user.groups.filter(name='User').exists()
+    return has_role(user, 'User')
 
+@query_budget(10)
+@read_replica
 @user_passes_test(is_admin, login_url='no-permission')
 def admin_dashboard(request):
     type = request.GET.get("type", "all_users")
-    counts = Event.objects.select_related('category','organizer').prefetch_related('participants','images').aggregate(
-        total_events=Count('id', distinct=True),
-        upcoming_events=Count('id', filter=Q(event_date__gt=localdate()), distinct=True),
-    )
-    counts["rsvp_count"] = RSVP.objects.count()
-    admin_counts = User.objects.aggregate(
-        total_users=Count('id', distinct=True),
-    )
-    counts.update(admin_counts)
-    users = User.objects.prefetch_related(
-        Prefetch('groups', queryset=Group.objects.all(), to_attr='all_groups')
-    ).all()
-
-    print(users)
-
-    for user in users:
-        if user.all_groups:
-            user.group_name = user.all_groups[0].name
-        else:
-            user.group_name = 'No Group Assigned'
-    events=[]
+    counts = get_dashboard_stats()
+    users = []
+    events = []
+    columns = None
+    roles = []
     if type=="rsvps":
-        events = Event.objects.select_related('category','organizer').annotate(rsvp_count=Count("participants"))
+        events = Event.objects.select_related('category','organizer')
         title="RSVPs"
         head_list = ['SL', 'Event Name', 'Organized By', 'Total RSVPs']
     elif type=="upcoming":
@@ -142,59 +133,61 @@ def admin_dashboard(request):
         head_list = ['SL', 'Event Name', 'Organized By', 'Event date', 'Event time']
     else:
         title="All Users"
-        head_list = ['SL', 'Full name',	'Username',	'Email', 'User ID',	'Current Role',	'Action']
+        head_list = []
+        columns = sort_columns(request.GET)
+        roles = Group.objects.order_by('name').values_list('name', flat=True)
+
+    # Only the rows of the active table are fetched, one page at a time
+    if type in ("rsvps", "upcoming", "all"):
+        page = paginate(request, events, ("event_date", "id"))
+        events = page.object_list
+    else:
+        queryset, ordering = user_table(request.GET)
+        page = paginate(request, queryset, ordering)
+        users = page.object_list
+
     context={
         "users": users,
         "events": events,
+        "page_obj": page,
         "counts":counts,
         "title": title,
-        "head_list": head_list
+        "head_list": head_list,
+        "columns": columns,
+        "roles": roles,
+        "no_role": NO_ROLE,
     }
     return render(request, 'dashboard/admin_dashboard.html', context)
 
+@query_budget(9)
+@read_replica
 @user_passes_test(is_user, login_url='no-permission')
 def user_dashboard(request):
     user = request.user
     
-    base_query = user.rsvp_events.select_related('category', 'organizer').prefetch_related(
-            Prefetch('images', queryset=EventImage.objects.order_by('id'), to_attr='prefetched_images')
-        )
+    base_query = user.rsvp_events.select_related('category', 'organizer').with_cover_image()
     title="RSVP'd Events"
 
     # looking for search keys
     type = request.GET.get("type", "all")
     if(type == "search"):
-        category = request.GET.get('category')
-        start_date = request.GET.get('start_date')
-        end_date = request.GET.get('end_date')
-        location = request.GET.get('location')
-        filters = Q()
-        if category:
-            filters &= Q(category__name__icontains=category)
-        if location:
-            filters &= Q(location__icontains=location)
-        if start_date and end_date:
-            filters &= Q(event_date__range=[start_date, end_date]) 
-        if start_date and not end_date:
-            filters &= Q(event_date__gt=start_date)
-        if not start_date and end_date:
-            filters &= Q(event_date__lt=end_date)
-
-        events = base_query.filter(filters)
+        events = base_query.filter(event_filters(request.GET))
         title = "Search Results"
     else:
         events = base_query.all()
 
-    for event in events:
-        event.first_image = event.prefetched_images[0] if event.prefetched_images else None
+    total_rsvps = events.count()
+    page = paginate(request, events, ("event_date", "id"))
+    events = page.object_list
 
     # category retrieval
     categories = Category.objects.all()
 
-    context = {"rsvp_list":events, "total_rsvps":events.count(), "events":events, "title":title, "categories":categories}
+    context = {"rsvp_list":events, "total_rsvps":total_rsvps, "events":events, "page_obj":page, "title":title, "categories":categories}
     return render(request, "dashboard/user_dashboard.html", context)
 
 
+@query_budget(7)
 @user_passes_test(is_admin, login_url='no-permission')
 def create_group(request):
     form = CreateGroupForm()
@@ -208,12 +201,14 @@ def create_group(request):
 
     return render(request, 'Widgets/formModal.html', {'form': form})
 
+@query_budget(9)
 @user_passes_test(is_admin, login_url='no-permission')
 def group_list(request):
     form = CreateGroupForm()
     groups = Group.objects.prefetch_related('permissions').all()
     return render(request, 'admin/group_list.html', {'groups': groups, 'form':form})
 
+@query_budget(8)
 @user_passes_test(is_admin, login_url='no-permission')
 def delete_group(request, group_id):
     group = Group.objects.get(id=group_id)
@@ -224,36 +219,18 @@ def delete_group(request, group_id):
         messages.success(request, f'Group "{group.name}" has been deleted.')
     return redirect('group-list')
 
+@query_budget(8)
 @user_passes_test(is_admin, login_url='no-permission')
 def admin_events_list(request):
     type = request.GET.get("type", "all")
-    base_query = Event.objects.select_related('category').prefetch_related('participants','images')
+    base_query = Event.objects.select_related('category').with_cover_image()
     title="All Events"
     if(type == "search"):
-        category = request.GET.get('category')
-        start_date = request.GET.get('start_date')
-        end_date = request.GET.get('end_date')
-        location = request.GET.get('location')
-        filters = Q()
-        if category:
-            filters &= Q(category__name__icontains=category)
-        if location:
-            filters &= Q(location__icontains=location)
-        if start_date and end_date:
-            filters &= Q(event_date__range=[start_date, end_date]) 
-        if start_date and not end_date:
-            filters &= Q(event_date__gt=start_date)
-        if not start_date and end_date:
-            filters &= Q(event_date__lt=end_date)
-
-        events = base_query.filter(filters)
+        events = base_query.filter(event_filters(request.GET))
         title = "Search Results"
     else:
         events = base_query.all()
 
-    for event in events:
-        event.first_image = event.images.all()[0] if event.images.all() else None
-
     categories = Category.objects.all()
     context = {
         "title": title,
@@ -264,44 +241,28 @@ def admin_events_list(request):
     return render(request, "admin/events_list.html", context)
 
 @method_decorator(user_passes_test(is_admin, login_url="no-permission"), name="dispatch")
-class AdminEventsListView(LoginRequiredMixin, ListView):
+class AdminEventsListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
+    query_budget = 8
     model = Event
     template_name = "admin/events_list.html"
     context_object_name = "events"
+    keyset_ordering = ("event_date", "id")
 
     def test_func(self):
         return is_admin(self.request.user)
 
     def get_queryset(self):
         type = self.request.GET.get("type", "all")
-        base_query = Event.objects.select_related("category").prefetch_related("participants", "images")
+        base_query = Event.objects.select_related("category").with_cover_image()
 
         if type == "search":
-            category = self.request.GET.get("category")
-            start_date = self.request.GET.get("start_date")
-            end_date = self.request.GET.get("end_date")
-            location = self.request.GET.get("location")
-
-            filters = Q()
-            if category:
-                filters &= Q(category__name__icontains=category)
-            if location:
-                filters &= Q(location__icontains=location)
-            if start_date and end_date:
-                filters &= Q(event_date__range=[start_date, end_date])
-            elif start_date:
-                filters &= Q(event_date__gt=start_date)
-            elif end_date:
-                filters &= Q(event_date__lt=end_date)
-
-            queryset = base_query.filter(filters)
+            # Shared with the event exports, so an export matches what the list shows
+            queryset = base_query.filter(event_filters(self.request.GET))
             self.title = "Search Results"
         else:
             queryset = base_query.all()
             self.title = "All Events"
 
-        for event in queryset:
-            event.first_image = event.images.first()
         return queryset
 
     def get_context_data(self, **kwargs):
@@ -311,7 +272,8 @@ class AdminEventsListView(LoginRequiredMixin, ListView):
         return context
     
 # Profile
-class ProfileView(TemplateView):
+class ProfileView(LoginRequiredMixin, TemplateView):
+    query_budget = 6
     template_name = 'accounts/profile.html'
 
     def get_context_data(self, **kwargs):
@@ -328,7 +290,8 @@ class ProfileView(TemplateView):
         context['last_login'] = user.last_login
         return context
     
-class EditProfileView(UpdateView):
+class EditProfileView(LoginRequiredMixin, UpdateView):
+    query_budget = 6
     model = User
     form_class = EditProfileForm
     template_name = 'accounts/edit_profile_form.html'
@@ -343,11 +306,13 @@ class EditProfileView(UpdateView):
 
 # Change password
 class ChangePasswordView(PasswordChangeView):
+    query_budget = 6
     template_name = 'accounts/password_change.html'
     form_class = CustomPasswordChangeForm
 
 # Reset Password
 class CustomPasswordResetView(PasswordResetView):
+    query_budget = 7
     form_class = CustomPasswordResetForm
     template_name = 'registration/reset_password.html'
     success_url = reverse_lazy('sign-in')
@@ -357,7 +322,6 @@ class CustomPasswordResetView(PasswordResetView):
         context = super().get_context_data(**kwargs)
         context['protocol'] = 'https' if self.request.is_secure() else 'http'
         context['domain'] = self.request.get_host()
-        print('Reset bug: ',context)
         return context
 
     def form_valid(self, form):
@@ -367,6 +331,7 @@ class CustomPasswordResetView(PasswordResetView):
 
 
 class CustomPasswordResetConfirmView(PasswordResetConfirmView):
+    query_budget = 7
     form_class = CustomPasswordResetConfirmForm
     template_name = 'registration/reset_password.html'
     success_url = reverse_lazy('sign-in')